@@ -7,9 +7,10 @@ import sys
 import logging
 from dotenv import load_dotenv
 
-from livekit.agents import JobContext, WorkerOptions, cli
+from livekit.agents import JobContext, JobProcess, WorkerOptions, cli
 from core.call_processor import process_call
 from utils.logging_config import setup_logging, get_logger
+from utils.vad import get_vad
 
 # Load environment variables
 load_dotenv()
@@ -38,6 +39,12 @@ async def entrypoint(ctx: JobContext):
         raise
 
 
+def prewarm(proc: JobProcess):
+    """Load the shared VAD model before any job is assigned to this process."""
+    get_vad()
+    logger.info("PREWARM_COMPLETE | vad_loaded=True")
+
+
 def validate_environment():
     """Validate required environment variables."""
     required_vars = [
@@ -87,6 +94,7 @@ if __name__ == "__main__":
     # Run the agent with official CLI and timeout configuration
     worker_options = WorkerOptions(
         entrypoint_fnc=entrypoint, 
+        prewarm_fnc=prewarm,
         agent_name=agent_name,
         # Add timeout configuration to prevent AssignmentTimeoutError
         initialize_process_timeout=settings.assignment_timeout,  # Timeout for process initialization
@@ -3,6 +3,10 @@ from __future__ import annotations
 import datetime
 import logging
 import asyncio
+import base64
+import functools
+import hashlib
+import time
 from dataclasses import dataclass
 from typing import Protocol, Optional
 from zoneinfo import ZoneInfo
@@ -15,12 +19,27 @@ CAL_BOOKINGS_VERSION    = "2024-08-13"   # v2 bookings requires this header
 BASE_URL_V1 = "https://api.cal.com/v1/"
 BASE_URL_V2 = "https://api.cal.com/v2/"
 
+# Event type lengths rarely change; share them across calls in this worker so each
+# new CalComCalendar skips the event-types round-trip. Keyed by (api_key, event_type_id).
+EVENT_LENGTH_TTL = 600.0
+_event_length_cache: dict[tuple[str, str], tuple[float, int]] = {}
+
 
 class SlotUnavailableError(Exception):
     def __init__(self, message: str) -> None:
         super().__init__(message)
 
 
+@functools.lru_cache(maxsize=1024)
+def _slot_hash(start_iso: str, duration_min: int) -> str:
+    # Slot ids are re-derived on every listing and selection lookup; the same
+    # handful of slots come back turn after turn, so hash each one once
+    # (keyed by the ISO string: equal instants in different zones hash differently)
+    raw = f"{start_iso}|{duration_min}".encode()
+    digest = hashlib.blake2s(raw, digest_size=5).digest()
+    return f"CS_{base64.b32encode(digest).decode().rstrip('=').lower()}"
+
+
 @dataclass
 class AvailableSlot:
     start_time: datetime.datetime
@@ -28,10 +47,7 @@ class AvailableSlot:
 
     @property
     def unique_hash(self) -> str:
-        import hashlib, base64
-        raw = f"{self.start_time.isoformat()}|{self.duration_min}".encode()
-        digest = hashlib.blake2s(raw, digest_size=5).digest()
-        return f"CS_{base64.b32encode(digest).decode().rstrip('=').lower()}"
+        return _slot_hash(self.start_time.isoformat(), self.duration_min)
 
 
 @dataclass
@@ -128,6 +144,13 @@ class CalComCalendar(Calendar):
             self._log.info("Cal.com: initialize skipped (no event_type_id). Default 30 min length.")
             return
 
+        cache_key = (self._api_key, str(self._event_type_id))
+        cached = _event_length_cache.get(cache_key)
+        if cached is not None and time.monotonic() - cached[0] < EVENT_LENGTH_TTL:
+            self._event_length = cached[1]
+            self._log.debug("Cal.com: event length %d minutes (cached)", self._event_length)
+            return
+
         url = f"{BASE_URL_V2}event-types/{self._event_type_id}"
         self._log.info(f"Cal.com: Fetching event type from {url}")
         
@@ -184,10 +207,12 @@ class CalComCalendar(Calendar):
                         self._log.error("Cal.com: event type response not JSON: %s", txt)
                         raise Exception("Cal.com event type response not valid JSON")
 
-                self._log.info("Cal.com: Event type data received: %s", data)
+                # Full event type payload is only useful when debugging
+                self._log.debug("Cal.com: Event type data received: %s", data)
                 length = (data.get("data") or {}).get("lengthInMinutes")
                 if isinstance(length, int) and length > 0:
                     self._event_length = length
+                    _event_length_cache[cache_key] = (time.monotonic(), length)
                     self._log.info("Cal.com: event length set to %d minutes", self._event_length)
                 else:
                     self._log.warning("Cal.com: no valid length found, using default 30 minutes")
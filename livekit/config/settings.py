@@ -2,9 +2,20 @@
 Configuration settings for the LiveKit voice agent.
 """
 
+import logging
 import os
 from typing import Optional
 
+logger = logging.getLogger(__name__)
+
+
+# Agent columns the workers read (keep narrow to cut PostgREST payload)
+AGENT_CONFIG_COLUMNS = (
+    "id,user_id,name,prompt,first_message,sms_prompt,knowledge_base_id,"
+    "cal_api_key,cal_event_type_id,cal_event_type_slug,cal_timezone,elevenlabs_api_key,"
+    "transfer_enabled,transfer_phone_number,transfer_country_code,transfer_sentence,transfer_condition"
+)
+
 
 class SupabaseSettings:
     """Supabase configuration."""
@@ -85,6 +96,14 @@ class Settings:
         # LiveKit worker timeout settings
         self.assignment_timeout: float = float(os.getenv("ASSIGNMENT_TIMEOUT", "30.0"))  # Timeout for job assignment acceptance
         self.job_timeout: float = float(os.getenv("JOB_TIMEOUT", "300.0"))  # Timeout for job execution
+        
+        # Call history batching: rows from calls ending together share one insert.
+        # Larger batches/longer waits trade shutdown latency for fewer round-trips; when
+        # the queue is full, shutdown callbacks wait for room instead of piling
+        # unbounded work onto Supabase during a burst of hang-ups
+        self.call_insert_batch_size: int = max(1, int(os.getenv("CALL_INSERT_BATCH_SIZE", "50")))
+        self.call_insert_max_wait: float = max(0.0, float(os.getenv("CALL_INSERT_MAX_WAIT_SECONDS", "0.5")))
+        self.call_insert_queue_max: int = max(1, int(os.getenv("CALL_INSERT_QUEUE_MAX", "1024")))
 
 
 # Global settings instance
@@ -96,11 +115,10 @@ def get_settings() -> Settings:
     global _settings
     if _settings is None:
         # Debug: Check environment variables before creating settings
-        import os
-        print(f"DEBUG: SUPABASE_URL = {os.getenv('SUPABASE_URL', 'NOT SET')}")
-        print(f"DEBUG: SUPABASE_SERVICE_ROLE = {os.getenv('SUPABASE_SERVICE_ROLE', 'NOT SET')}")
-        print(f"DEBUG: SUPABASE_SERVICE_ROLE_KEY = {os.getenv('SUPABASE_SERVICE_ROLE_KEY', 'NOT SET')}")
-        print(f"DEBUG: SUPABASE_ANON_KEY = {os.getenv('SUPABASE_ANON_KEY', 'NOT SET')}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("SUPABASE_URL = %s", os.getenv('SUPABASE_URL', 'NOT SET'))
+            for name in ('SUPABASE_SERVICE_ROLE', 'SUPABASE_SERVICE_ROLE_KEY', 'SUPABASE_ANON_KEY'):
+                logger.debug("%s = %s", name, 'set' if os.getenv(name) else 'NOT SET')
         
         _settings = Settings()
     return _settings
\ No newline at end of file
@@ -12,6 +12,7 @@ from livekit.agents import JobContext, AgentSession
 from config.settings import get_settings
 from core.inbound_handler import InboundCallHandler
 from core.outbound_handler import OutboundCallHandler
+from utils.metadata import parse_metadata
 from utils.logging_config import setup_logging, get_logger
 from utils.latency_logger import (
     measure_latency, measure_latency_context, 
@@ -101,31 +102,25 @@ class CallProcessor:
         """
         try:
             # Check job metadata for outbound call indicators
-            metadata = getattr(ctx.job, 'metadata', None)
-            if metadata:
-                try:
-                    dial_info = json.loads(metadata)
-                    phone_number = dial_info.get("phone_number")
-                    agent_id = dial_info.get("agentId")
-                    
-                    if phone_number and agent_id:
-                        self.logger.info(f"CALL_TYPE_DETERMINED | type=outbound | phone={phone_number} | agent_id={agent_id}")
-                        return "outbound"
-                except json.JSONDecodeError as e:
-                    self.logger.warning(f"CALL_TYPE_PARSE_ERROR | metadata_invalid | error={str(e)}")
-                except Exception as e:
-                    self.logger.warning(f"CALL_TYPE_PARSE_ERROR | unexpected_error | error={str(e)}")
+            job_metadata = getattr(ctx.job, 'metadata', None)
+            dial_info = parse_metadata(job_metadata)
+            if job_metadata and not dial_info:
+                self.logger.warning("CALL_TYPE_PARSE_ERROR | metadata_invalid | metadata=%.200s", job_metadata)
+            phone_number = dial_info.get("phone_number")
+            agent_id = dial_info.get("agentId")
+            
+            if phone_number and agent_id:
+                self.logger.info(f"CALL_TYPE_DETERMINED | type=outbound | phone={phone_number} | agent_id={agent_id}")
+                return "outbound"
             
             # Check room metadata as fallback
             room_metadata = getattr(ctx.room, 'metadata', None)
-            if room_metadata:
-                try:
-                    room_info = json.loads(room_metadata)
-                    if room_info.get("call_type") == "outbound":
-                        self.logger.info("CALL_TYPE_DETERMINED | type=outbound | from_room_metadata")
-                        return "outbound"
-                except (json.JSONDecodeError, Exception) as e:
-                    self.logger.warning(f"CALL_TYPE_ROOM_METADATA_ERROR | error={str(e)}")
+            room_info = parse_metadata(room_metadata)
+            if room_metadata and not room_info:
+                self.logger.warning("CALL_TYPE_ROOM_METADATA_ERROR | metadata_invalid | metadata=%.200s", room_metadata)
+            if room_info.get("call_type") == "outbound":
+                self.logger.info("CALL_TYPE_DETERMINED | type=outbound | from_room_metadata")
+                return "outbound"
             
         except Exception as e:
             self.logger.error(f"CALL_TYPE_DETERMINATION_ERROR | error={str(e)}", exc_info=True)
@@ -180,8 +175,7 @@ class CallProcessor:
                 # Create a simple fallback agent with TTS
                 from livekit.agents import Agent
                 from livekit.plugins import openai
-                import os
-                
+
                 # Create simple TTS for fallback
                 fallback_tts = create_tts_instance(self.settings)
                 
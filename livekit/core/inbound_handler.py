@@ -3,22 +3,50 @@ Inbound call handler with enhanced error handling and logging.
 """
 
 import logging
-import json
+import re
 import asyncio
+import functools
 from typing import Optional, Dict, Any
 from livekit.agents import JobContext, AgentSession, AutoSubscribe, RoomInputOptions, RoomOutputOptions
 from livekit import api
 
 from config.settings import Settings
-from services.rag_assistant import RAGAssistant
+from services.rag_assistant import RAGAssistant, rag_assistant_kwargs
 from cal_calendar_api import Calendar, CalComCalendar
+from utils.metadata import (
+    parse_metadata, metadata_agent_id, metadata_dict, first_value,
+    attributes_call_sid, room_name_call_sid, CALL_SID_METADATA_KEYS,
+)
 from utils.logging_config import get_logger
+from utils.supabase_client import get_supabase_client, fetch_agent_config
+from utils.vad import get_vad
+from utils.transcript import transcript_from_history
+from utils.call_batcher import get_call_insert_batcher
 from utils.latency_logger import (
     measure_latency, measure_latency_context, 
     measure_room_connection, measure_participant_wait,
     get_tracker, clear_tracker
 )
-from livekit.plugins import silero, openai
+from livekit.plugins import openai
+
+
+# Phone numbers embedded in room names
+_PHONE_RE = re.compile(r'(\+?\d{10,15})')
+
+# Which conversation record AgentSession exposes depends on the SDK version, not the call
+_SESSION_HISTORY_ATTR = (
+    'transcript' if hasattr(AgentSession, 'transcript')
+    else 'history' if hasattr(AgentSession, 'history')
+    else None
+)
+
+
+class _CallHistoryState:
+    """Per-call state for the shutdown callback, so history is saved once per session."""
+    __slots__ = ("saved",)
+
+    def __init__(self) -> None:
+        self.saved = False
 
 
 def create_tts_instance(settings: Settings):
@@ -42,24 +70,15 @@ class InboundCallHandler:
         self.settings = settings
         self.logger = get_logger(__name__)
         
-        # Initialize Supabase client
+        # Shared per-process Supabase client (reuses one HTTPS connection pool across calls)
         try:
-            from supabase import create_client, Client
-            
             # Debug logging for Supabase configuration
             self.logger.info(f"INBOUND_HANDLER_INIT | supabase_url={'SET' if settings.supabase.url else 'NOT SET'}")
             self.logger.info(f"INBOUND_HANDLER_INIT | supabase_service_role_key={'SET' if settings.supabase.service_role_key else 'NOT SET'}")
             
-            if not settings.supabase.url or not settings.supabase.service_role_key:
+            self.supabase = get_supabase_client(settings)
+            if self.supabase is None:
                 self.logger.error("INBOUND_HANDLER_INIT_ERROR | supabase_key is required")
-                self.supabase = None
-                return
-            
-            self.supabase: Optional[Client] = create_client(
-                settings.supabase.url,
-                settings.supabase.service_role_key
-            )
-            self.logger.info("INBOUND_HANDLER_INIT | supabase_client_created")
         except Exception as e:
             self.logger.error(f"INBOUND_HANDLER_INIT_ERROR | supabase_error={str(e)}")
             self.supabase = None
@@ -74,7 +93,7 @@ class InboundCallHandler:
         call_id = getattr(ctx.job, 'id', 'unknown')
         room_name = getattr(ctx.room, 'name', 'unknown')
         
-        self.logger.info(f"INBOUND_CALL_START | call_id={call_id} | room={room_name}")
+        self.logger.info("INBOUND_CALL_START | call_id=%s | room=%s", call_id, room_name)
         
         # Track room connection latency
         async with measure_latency_context(
@@ -83,30 +102,34 @@ class InboundCallHandler:
             room_name=room_name,
             metadata={"room_name": room_name, "call_type": "inbound"}
         ):
+            # Join the room while the assistant config is fetched; neither depends on the other
+            connect_task = asyncio.create_task(ctx.connect(auto_subscribe=AutoSubscribe.AUDIO_ONLY))
             try:
                 # Resolve assistant configuration
                 assistant_config = await self._resolve_assistant_config_safe(ctx)
                 
                 if not assistant_config:
-                    await self._handle_no_assistant_config(ctx)
+                    await self._handle_no_assistant_config(ctx, connect_task)
                     return
                 
-                self.logger.info(f"ASSISTANT_CONFIG_RESOLVED | assistant_id={assistant_config.get('id')}")
+                self.logger.info("ASSISTANT_CONFIG_RESOLVED | assistant_id=%s", assistant_config.get('id'))
                 
                 # Create and configure agent
                 agent = await self._create_agent_safe(assistant_config)
                 
                 if not agent:
-                    await self._handle_agent_creation_failure(ctx)
+                    await self._handle_agent_creation_failure(ctx, connect_task)
                     return
                 
                 # Start session with call history saving
-                await self._start_session_with_history_saving(ctx, agent)
+                await self._start_session_with_history_saving(ctx, agent, connect_task)
                 
-                self.logger.info(f"INBOUND_CALL_SUCCESS | call_id={call_id}")
+                self.logger.info("INBOUND_CALL_SUCCESS | call_id=%s", call_id)
                 
             except Exception as e:
-                self.logger.error(f"INBOUND_CALL_ERROR | call_id={call_id} | error={str(e)}", exc_info=True)
+                self.logger.error("INBOUND_CALL_ERROR | call_id=%s | error=%s", call_id, e, exc_info=True)
+                if not connect_task.done():
+                    connect_task.cancel()
                 await self._handle_inbound_error(ctx, e)
                 raise
     
@@ -122,21 +145,16 @@ class InboundCallHandler:
         """
         try:
             room_name = getattr(ctx.room, 'name', '')
-            job_metadata = getattr(ctx.job, 'metadata', None)
+            # Parsed once; reused for the phone-number fallback below
+            dial_info = parse_metadata(getattr(ctx.job, 'metadata', None))
             
             self.logger.info(f"RESOLVING_ASSISTANT_CONFIG | room_name={room_name}")
             
             # Method 1: Check job metadata for assistantId (like sass-livekit)
-            if job_metadata:
-                try:
-                    dial_info = json.loads(job_metadata)
-                    assistant_id = dial_info.get("assistantId") or dial_info.get("assistant_id") or dial_info.get("agentId")
-                    
-                    if assistant_id:
-                        self.logger.info(f"ASSISTANT_ID_FROM_JOB_METADATA | assistant_id={assistant_id}")
-                        return await self._get_assistant_by_id(assistant_id)
-                except Exception as e:
-                    self.logger.warning(f"JOB_METADATA_PARSE_ERROR | error={str(e)}")
+            assistant_id = metadata_agent_id(dial_info)
+            if assistant_id:
+                self.logger.info(f"ASSISTANT_ID_FROM_JOB_METADATA | assistant_id={assistant_id}")
+                return await self._get_assistant_by_id(assistant_id)
             
             # Method 2: Extract DID from room name and look up assistant
             called_did = self._extract_did_from_room(room_name)
@@ -145,7 +163,7 @@ class InboundCallHandler:
                 return await self._get_assistant_by_phone(called_did)
             
             # Method 3: Try to get phone number from job metadata as fallback
-            phone_from_metadata = self._extract_phone_from_job_metadata(ctx)
+            phone_from_metadata = self._extract_phone_from_job_metadata(dial_info)
             if phone_from_metadata:
                 self.logger.info(f"INBOUND_LOOKUP_FROM_METADATA | looking up assistant for phone={phone_from_metadata}")
                 return await self._get_assistant_by_phone(phone_from_metadata)
@@ -226,28 +244,19 @@ class InboundCallHandler:
             self.logger.error(f"DID_EXTRACTION_ERROR | room_name={room_name} | error={str(e)}")
             return None
 
-    def _extract_phone_from_job_metadata(self, ctx: JobContext) -> Optional[str]:
-        """Extract phone number from job metadata as fallback."""
+    def _extract_phone_from_job_metadata(self, metadata: Dict[str, Any]) -> Optional[str]:
+        """Extract phone number from already-parsed job metadata as fallback."""
         try:
-            job_metadata = getattr(ctx.job, 'metadata', None)
-            if not job_metadata:
-                return None
+            # Try different possible keys for phone number
+            phone_number = (metadata.get("phone_number") or 
+                          metadata.get("phone") or 
+                          metadata.get("called_number") or 
+                          metadata.get("to") or
+                          metadata.get("To"))
             
-            try:
-                metadata = json.loads(job_metadata)
-                # Try different possible keys for phone number
-                phone_number = (metadata.get("phone_number") or 
-                              metadata.get("phone") or 
-                              metadata.get("called_number") or 
-                              metadata.get("to") or
-                              metadata.get("To"))
-                
-                if phone_number:
-                    self.logger.info(f"PHONE_FROM_JOB_METADATA | phone_number={phone_number}")
-                    return phone_number
-                    
-            except json.JSONDecodeError as e:
-                self.logger.warning(f"JOB_METADATA_JSON_PARSE_ERROR | error={str(e)}")
+            if phone_number:
+                self.logger.info(f"PHONE_FROM_JOB_METADATA | phone_number={phone_number}")
+                return phone_number
             
             return None
         except Exception as e:
@@ -261,17 +270,16 @@ class InboundCallHandler:
                 self.logger.error("SUPABASE_CLIENT_NOT_AVAILABLE")
                 return None
                 
-            assistant_result = self.supabase.table("agents").select("*").eq("id", assistant_id).execute()
+            assistant_data = await fetch_agent_config(self.supabase, assistant_id)
             
-            if assistant_result.data and len(assistant_result.data) > 0:
-                assistant_data = assistant_result.data[0]
-                self.logger.info(f"ASSISTANT_FOUND_BY_ID | assistant_id={assistant_id}")
+            if assistant_data:
+                self.logger.info("ASSISTANT_FOUND_BY_ID | assistant_id=%s", assistant_id)
                 return assistant_data
             
-            self.logger.warning(f"No assistant found for ID: {assistant_id}")
+            self.logger.warning("No assistant found for ID: %s", assistant_id)
             return None
         except Exception as e:
-            self.logger.error(f"DATABASE_ERROR | assistant_id={assistant_id} | error={str(e)}")
+            self.logger.error("DATABASE_ERROR | assistant_id=%s | error=%s", assistant_id, e)
             return None
 
     async def _get_assistant_by_phone(self, phone_number: str) -> Optional[Dict[str, Any]]:
@@ -284,7 +292,9 @@ class InboundCallHandler:
             self.logger.info(f"LOOKING_UP_ASSISTANT_BY_PHONE | phone_number={phone_number}")
             
             # First, find the assistant_id for this phone number
-            phone_result = self.supabase.table("phone_number").select("inbound_assistant_id").eq("number", phone_number).execute()
+            phone_result = await asyncio.to_thread(
+                lambda: self.supabase.table("phone_number").select("inbound_assistant_id").eq("number", phone_number).execute()
+            )
             
             self.logger.info(f"PHONE_QUERY_RESULT | phone_number={phone_number} | result_count={len(phone_result.data) if phone_result.data else 0}")
             
@@ -293,7 +303,9 @@ class InboundCallHandler:
                 
                 # Try to see what phone numbers exist in the database for debugging
                 try:
-                    all_phones = self.supabase.table("phone_number").select("number, inbound_assistant_id").execute()
+                    all_phones = await asyncio.to_thread(
+                        lambda: self.supabase.table("phone_number").select("number, inbound_assistant_id").execute()
+                    )
                     if all_phones.data:
                         self.logger.info(f"AVAILABLE_PHONE_NUMBERS | count={len(all_phones.data)}")
                         for phone in all_phones.data[:5]:  # Show first 5 for debugging
@@ -319,7 +331,9 @@ class InboundCallHandler:
         """Get assistant configuration by trunk ID. For per-assistant trunks."""
         try:
             # Look up phone number by trunk_id to find the associated agent
-            phone_result = self.supabase.table("phone_number").select("inbound_assistant_id").eq("trunk_sid", trunk_id).execute()
+            phone_result = await asyncio.to_thread(
+                lambda: self.supabase.table("phone_number").select("inbound_assistant_id").eq("trunk_sid", trunk_id).execute()
+            )
             
             if not phone_result.data or len(phone_result.data) == 0:
                 self.logger.warning(f"No phone number found for trunk: {trunk_id}")
@@ -328,11 +342,11 @@ class InboundCallHandler:
             assistant_id = phone_result.data[0]["inbound_assistant_id"]
             
             # Now fetch the assistant configuration
-            assistant_result = self.supabase.table("agents").select("*").eq("id", assistant_id).execute()
+            assistant_data = await fetch_agent_config(self.supabase, assistant_id)
             
-            if assistant_result.data and len(assistant_result.data) > 0:
+            if assistant_data:
                 self.logger.info(f"ASSISTANT_FOUND_BY_TRUNK | trunk_id={trunk_id} | assistant_id={assistant_id}")
-                return assistant_result.data[0]
+                return assistant_data
 
             return None
         except Exception as e:
@@ -346,7 +360,9 @@ class InboundCallHandler:
                 return None
                 
             # Use your existing phone_number table structure
-            response = self.supabase.table('phone_number').select('inbound_assistant_id').eq('number', phone_number).execute()
+            response = await asyncio.to_thread(
+                lambda: self.supabase.table('phone_number').select('inbound_assistant_id').eq('number', phone_number).execute()
+            )
             
             if response.data and len(response.data) > 0:
                 assistant_id = response.data[0].get('inbound_assistant_id')
@@ -365,7 +381,9 @@ class InboundCallHandler:
             if not self.supabase:
                 return None
                 
-            response = self.supabase.table('agents').select('id').eq('name', assistant_name).execute()
+            response = await asyncio.to_thread(
+                lambda: self.supabase.table('agents').select('id').eq('name', assistant_name).execute()
+            )
             
             if response.data and len(response.data) > 0:
                 return response.data[0].get('id')
@@ -386,17 +404,19 @@ class InboundCallHandler:
             Created agent or None if creation failed
         """
         try:
-            assistant_id = assistant_config.get('id')
-            instructions = assistant_config.get('prompt', 'You are a helpful assistant.')
-            knowledge_base_id = assistant_config.get('knowledge_base_id')
-            company_id = assistant_config.get('company_id')
+            agent_kwargs = rag_assistant_kwargs(assistant_config)
+            assistant_id = agent_kwargs['assistant_id']
+            knowledge_base_id = agent_kwargs['knowledge_base_id']
+            company_id = agent_kwargs['company_id']
             
             # If company_id is None but we have a knowledge_base_id, fetch it from the knowledge base
             if not company_id and knowledge_base_id:
                 try:
-                    kb_response = self.supabase.table('knowledge_bases').select('company_id').eq('id', knowledge_base_id).single().execute()
-                    if kb_response.data:
-                        company_id = kb_response.data.get('company_id')
+                    kb_response = await asyncio.to_thread(
+                        lambda: self.supabase.table('knowledge_bases').select('company_id').eq('id', knowledge_base_id).maybe_single().execute()
+                    )
+                    if kb_response is not None and kb_response.data:
+                        company_id = agent_kwargs['company_id'] = kb_response.data.get('company_id')
                         self.logger.info(f"FETCHED_COMPANY_ID | kb_id={knowledge_base_id} | company_id={company_id}")
                 except Exception as e:
                     self.logger.warning(f"FAILED_TO_FETCH_COMPANY_ID | kb_id={knowledge_base_id} | error={str(e)}")
@@ -407,17 +427,7 @@ class InboundCallHandler:
             calendar = await self._create_calendar_safe(assistant_config)
             
             # Create RAG assistant
-            first_message = assistant_config.get('first_message')
-            agent = RAGAssistant(
-                instructions=instructions,
-                calendar=calendar,
-                knowledge_base_id=knowledge_base_id,
-                company_id=company_id,
-                supabase=self.supabase,
-                first_message=first_message,
-                assistant_id=assistant_id,
-                user_id=assistant_config.get('user_id')  # Get user_id from config if available
-            )
+            agent = RAGAssistant(calendar=calendar, supabase=self.supabase, **agent_kwargs)
             
             self.logger.info(f"AGENT_CREATED | assistant_id={assistant_id}")
             return agent
@@ -468,107 +478,43 @@ class InboundCallHandler:
             return None
         
         # Try to extract phone number from room name patterns
-        import re
-        phone_match = re.search(r'(\+?\d{10,15})', room_name)
+        phone_match = _PHONE_RE.search(room_name)
         return phone_match.group(1) if phone_match else None
     
     def _extract_call_sid(self, ctx: JobContext, participant) -> Optional[str]:
         """Extract call_sid from various sources like in sass-livekit implementation."""
-        call_sid = None
-        
-        try:
-            # Try to get call_sid from participant attributes
-            if hasattr(participant, 'attributes') and participant.attributes:
-                if hasattr(participant.attributes, 'get'):
-                    # Try multiple attribute keys
-                    call_sid = (participant.attributes.get('sip.twilio.callSid') or 
-                               participant.attributes.get('sip.twilio.call_sid') or
-                               participant.attributes.get('twilio.callSid') or
-                               participant.attributes.get('twilio.call_sid') or
-                               participant.attributes.get('callSid') or
-                               participant.attributes.get('call_sid'))
-                    if call_sid:
-                        self.logger.info(f"CALL_SID_FROM_PARTICIPANT_ATTRIBUTES | call_sid={call_sid}")
-                        return call_sid
-                
-                # Try SIP attributes if not found
-                if not call_sid and hasattr(participant.attributes, 'sip'):
-                    sip_attrs = participant.attributes.sip
-                    if hasattr(sip_attrs, 'twilio'):
-                        twilio_attrs = sip_attrs.twilio
-                        call_sid = (getattr(twilio_attrs, 'callSid', None) or 
-                                   getattr(twilio_attrs, 'call_sid', None))
-                        if call_sid:
-                            self.logger.info(f"CALL_SID_FROM_SIP_ATTRIBUTES | call_sid={call_sid}")
-                            return call_sid
-        except Exception as e:
-            self.logger.warning(f"Failed to get call_sid from participant attributes: {str(e)}")
-
-        # Try room metadata if not found
-        if not call_sid and hasattr(ctx.room, 'metadata') and ctx.room.metadata:
-            try:
-                import json
-                room_meta = json.loads(ctx.room.metadata) if isinstance(ctx.room.metadata, str) else ctx.room.metadata
-                call_sid = (room_meta.get('call_sid') or 
-                           room_meta.get('CallSid') or 
-                           room_meta.get('provider_id') or
-                           room_meta.get('twilio_call_sid') or
-                           room_meta.get('twilioCallSid'))
-                if call_sid:
-                    self.logger.info(f"CALL_SID_FROM_ROOM_METADATA | call_sid={call_sid}")
-                    return call_sid
-            except Exception as e:
-                self.logger.warning(f"Failed to parse room metadata for call_sid: {str(e)}")
-
-        # Try participant metadata if not found
-        if not call_sid and hasattr(participant, 'metadata') and participant.metadata:
-            try:
-                import json
-                participant_meta = json.loads(participant.metadata) if isinstance(participant.metadata, str) else participant.metadata
-                call_sid = (participant_meta.get('call_sid') or 
-                           participant_meta.get('CallSid') or 
-                           participant_meta.get('provider_id') or
-                           participant_meta.get('twilio_call_sid') or
-                           participant_meta.get('twilioCallSid'))
-                if call_sid:
-                    self.logger.info(f"CALL_SID_FROM_PARTICIPANT_METADATA | call_sid={call_sid}")
-                    return call_sid
-            except Exception as e:
-                self.logger.warning(f"Failed to parse participant metadata for call_sid: {str(e)}")
-
-        # Try to extract from room name as last resort
-        if not call_sid and hasattr(ctx.room, 'name') and ctx.room.name:
+        # Probed lazily in order; once a source has the SID the later ones (and their metadata parsing) are skipped
+        sources = (
+            ("PARTICIPANT_ATTRIBUTES", lambda: attributes_call_sid(getattr(participant, 'attributes', None))),
+            ("ROOM_METADATA", lambda: first_value(metadata_dict(getattr(ctx.room, 'metadata', None)), CALL_SID_METADATA_KEYS)),
+            ("PARTICIPANT_METADATA", lambda: first_value(metadata_dict(getattr(participant, 'metadata', None)), CALL_SID_METADATA_KEYS)),
+            ("ROOM_NAME", lambda: room_name_call_sid(getattr(ctx.room, 'name', None))),
+        )
+        for source, probe in sources:
             try:
-                import re
-                # Look for Twilio call SID pattern (CA followed by 32 hex characters)
-                call_sid_match = re.search(r'CA[a-fA-F0-9]{32}', ctx.room.name)
-                if call_sid_match:
-                    call_sid = call_sid_match.group(0)
-                    self.logger.info(f"CALL_SID_FROM_ROOM_NAME | call_sid={call_sid}")
-                    return call_sid
+                call_sid = probe()
             except Exception as e:
-                self.logger.warning(f"Failed to extract call_sid from room name: {str(e)}")
+                self.logger.warning("CALL_SID_PROBE_FAILED | source=%s | error=%s", source, e)
+                continue
+            if call_sid:
+                self.logger.info("CALL_SID_FROM_%s | call_sid=%s", source, call_sid)
+                return call_sid
 
-        if not call_sid:
-            self.logger.warning("CALL_SID_NOT_FOUND | no call_sid available from any source")
-        
-        return call_sid
+        self.logger.warning("CALL_SID_NOT_FOUND | no call_sid available from any source")
+        return None
     
     def _extract_transcription(self, session: AgentSession) -> list:
         """Extract transcription from session."""
         try:
-            transcription = []
-            
-            # Try to get session history
-            if hasattr(session, 'history') and session.history:
-                for message in session.history:
-                    if hasattr(message, 'role') and hasattr(message, 'content'):
-                        transcription.append({
-                            'role': message.role,
-                            'content': str(message.content)
-                        })
-            
-            return transcription
+            history = getattr(session, 'history', None)
+            if not history:
+                return []
+            
+            return [
+                {'role': message.role, 'content': str(message.content)}
+                for message in history
+                if hasattr(message, 'role') and hasattr(message, 'content')
+            ]
         except Exception:
             return []
     
@@ -585,48 +531,47 @@ class InboundCallHandler:
     async def _save_to_backend(self, call_data: dict) -> None:
         """Save call data directly to Supabase database."""
         try:
-            from supabase import create_client, Client
-            import os
-            
-            # Get Supabase credentials
-            supabase_url = os.getenv('SUPABASE_URL')
-            supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
-            
-            if not supabase_url or not supabase_key:
+            supabase = self.supabase
+            if supabase is None:
                 self.logger.error("SUPABASE_CREDENTIALS_MISSING | cannot save call history")
                 return
             
-            # Create Supabase client
-            supabase: Client = create_client(supabase_url, supabase_key)
-            
             # Log the call data being saved
             self.logger.info(f"SAVING_CALL_DATA_TO_DB | agent_id={call_data.get('agent_id')} | user_id={call_data.get('user_id')} | contact_phone={call_data.get('contact_phone')} | call_sid={call_data.get('call_sid')}")
             
-            # Save to calls table
-            result = supabase.table('calls').insert(call_data).execute()
+            # Rows from calls ending at the same time share one insert (written off the event loop)
+            row = await get_call_insert_batcher(self.settings).insert(supabase, call_data)
             
-            if result.data:
-                db_id = result.data[0].get('id')
+            if row:
+                db_id = row.get('id')
                 self.logger.info(f"CALL_HISTORY_SAVED_TO_DB | agent_id={call_data['agent_id']} | db_id={db_id}")
             else:
-                self.logger.error(f"CALL_HISTORY_DB_SAVE_FAILED | agent_id={call_data['agent_id']} | result={result}")
+                self.logger.error(f"CALL_HISTORY_DB_SAVE_FAILED | agent_id={call_data['agent_id']} | no row returned")
                         
         except Exception as e:
             self.logger.error(f"CALL_HISTORY_DB_SAVE_ERROR | error={str(e)}", exc_info=True)
     
-    async def _start_session_with_history_saving(self, ctx: JobContext, agent) -> None:
+    async def _ensure_connected(self, ctx: JobContext, connect_task: Optional[asyncio.Task] = None) -> None:
+        """Wait for the room connection started by handle_call, or connect now if none was started."""
+        if connect_task is not None:
+            await connect_task
+        else:
+            await ctx.connect(auto_subscribe=AutoSubscribe.AUDIO_ONLY)
+    
+    async def _start_session_with_history_saving(self, ctx: JobContext, agent, connect_task: Optional[asyncio.Task] = None) -> None:
         """
         Start session with proper call history saving on shutdown.
         
         Args:
             ctx: LiveKit job context
             agent: Agent instance
+            connect_task: Room connection already in flight, if any
         """
         try:
             self.logger.info("STARTING_SESSION_WITH_HISTORY_SAVING")
             
             # Connect to room with more permissive audio settings
-            await ctx.connect(auto_subscribe=AutoSubscribe.AUDIO_ONLY)
+            await self._ensure_connected(ctx, connect_task)
             self.logger.info("ROOM_CONNECTED | audio_subscription=AUDIO_ONLY")
             
             # Wait for participant with longer timeout and better error handling
@@ -641,14 +586,15 @@ class InboundCallHandler:
                 # Try to start session anyway - sometimes participants connect after timeout
                 participant = None
             
-            # Create session
-            from livekit.plugins import silero, openai
-            import os
+            # The call SID is fixed for the call, so resolve it once while the participant is fresh
+            call_sid = self._extract_call_sid(ctx, participant)
             
+            # Create session
+            from livekit.plugins import openai
+
             # Create session components
-            openai_api_key = os.getenv("OPENAI_API_KEY")
             session = AgentSession(
-                vad=silero.VAD.load(),
+                vad=get_vad(),
                 stt=openai.STT(model="whisper-1"),
                 llm=openai.LLM(model="gpt-4o-mini", temperature=0.1),
                 tts=create_tts_instance(self.settings),
@@ -669,43 +615,9 @@ class InboundCallHandler:
             self.logger.info("AGENT_SESSION_STARTED | session_active=True")
             
             # Set up call history saving on session shutdown (primary method like sass-livekit)
-            call_saved = False
-            
-            async def save_call_history_on_shutdown():
-                nonlocal call_saved
-                try:
-                    self.logger.info("AGENT_SESSION_COMPLETED")
-                    self.logger.info("SAVING_CALL_HISTORY_VIA_SHUTDOWN_CALLBACK")
-                    
-                    if not call_saved:
-                        # Extract session history
-                        session_history = []
-                        try:
-                            if hasattr(session, 'transcript') and session.transcript:
-                                transcript_dict = session.transcript.to_dict()
-                                session_history = transcript_dict.get("items", [])
-                                self.logger.info(f"SHUTDOWN_TRANSCRIPT_FROM_SESSION | items={len(session_history)}")
-                            elif hasattr(session, 'history') and session.history:
-                                history_dict = session.history.to_dict()
-                                session_history = history_dict.get("items", [])
-                                self.logger.info(f"SHUTDOWN_HISTORY_FROM_SESSION | items={len(session_history)}")
-                            else:
-                                self.logger.warning("NO_SHUTDOWN_SESSION_TRANSCRIPT_AVAILABLE")
-                        except Exception as e:
-                            self.logger.error(f"SHUTDOWN_SESSION_HISTORY_READ_FAILED | error={str(e)}")
-                            session_history = []
-                        
-                        # Save call history
-                        await self._save_call_history_safe(ctx, agent, session, session_history, participant)
-                        call_saved = True
-                    else:
-                        self.logger.info("CALL_HISTORY_ALREADY_SAVED | skipping shutdown callback")
-                    
-                except Exception as e:
-                    self.logger.error(f"SHUTDOWN_CALL_HISTORY_SAVE_ERROR | error={str(e)}", exc_info=True)
-            
-            # Register shutdown callback
-            ctx.add_shutdown_callback(save_call_history_on_shutdown)
+            ctx.add_shutdown_callback(
+                functools.partial(self._save_call_history_on_shutdown, ctx, agent, session, participant, _CallHistoryState(), call_sid)
+            )
             self.logger.info("SHUTDOWN_CALLBACK_REGISTERED")
             
             # Wait for participant to disconnect with call duration timeout
@@ -735,6 +647,48 @@ class InboundCallHandler:
             self.logger.error(f"SESSION_START_ERROR | error={str(e)}", exc_info=True)
             raise
 
+    async def _save_call_history_on_shutdown(self, ctx: JobContext, agent, session, participant, state: "_CallHistoryState", call_sid: Optional[str] = None) -> None:
+        """Shutdown callback: save the call history once per session."""
+        try:
+            self.logger.info("AGENT_SESSION_COMPLETED")
+            self.logger.info("SAVING_CALL_HISTORY_VIA_SHUTDOWN_CALLBACK")
+            
+            if state.saved:
+                self.logger.info("CALL_HISTORY_ALREADY_SAVED | skipping shutdown callback")
+                return
+            
+            # Extract session history
+            session_history = []
+            try:
+                history = getattr(session, _SESSION_HISTORY_ATTR, None) if _SESSION_HISTORY_ATTR else None
+                history_items = getattr(history, 'items', None) if history else None
+                if isinstance(history_items, list):
+                    # Read chat messages straight off the ChatContext instead of
+                    # serializing every item (tool calls included) with to_dict()
+                    session_history = [
+                        {'role': item.role, 'content': [c for c in item.content if isinstance(c, str)]}
+                        for item in history_items
+                        if getattr(item, 'type', None) == 'message'
+                    ]
+                    self.logger.info("SHUTDOWN_%s_FROM_ITEMS | items=%d", _SESSION_HISTORY_ATTR.upper(), len(session_history))
+                elif history:
+                    # Serialize off the event loop; long calls have hundreds of items
+                    history_dict = await asyncio.to_thread(history.to_dict)
+                    session_history = history_dict.pop("items", [])
+                    self.logger.info("SHUTDOWN_%s_FROM_SESSION | items=%d", _SESSION_HISTORY_ATTR.upper(), len(session_history))
+                else:
+                    self.logger.warning("NO_SHUTDOWN_SESSION_TRANSCRIPT_AVAILABLE")
+            except Exception as e:
+                self.logger.error(f"SHUTDOWN_SESSION_HISTORY_READ_FAILED | error={str(e)}")
+                session_history = []
+            
+            # Save call history
+            await self._save_call_history_safe(ctx, agent, session, session_history, participant, call_sid)
+            state.saved = True
+            
+        except Exception as e:
+            self.logger.error(f"SHUTDOWN_CALL_HISTORY_SAVE_ERROR | error={str(e)}", exc_info=True)
+
     async def _wait_for_session_completion(self, session, ctx: JobContext) -> None:
         """Wait for the session to complete naturally."""
         try:
@@ -745,7 +699,7 @@ class InboundCallHandler:
             self.logger.warning(f"SESSION_COMPLETION_WAIT_FAILED | room={ctx.room.name} | error={str(e)}")
             raise
 
-    async def _save_call_history_safe(self, ctx: JobContext, agent, session, session_history: list, participant) -> None:
+    async def _save_call_history_safe(self, ctx: JobContext, agent, session, session_history: list, participant, call_sid: Optional[str] = None) -> None:
         """
         Safely save call history with comprehensive error handling.
         
@@ -755,6 +709,7 @@ class InboundCallHandler:
             session: Completed session
             session_history: List of conversation items
             participant: Participant instance
+            call_sid: Call SID resolved at call start, if any
         """
         try:
             self.logger.info("SAVING_CALL_HISTORY")
@@ -764,12 +719,12 @@ class InboundCallHandler:
             user_id = agent.user_id
             
             if not agent_id:
-                self.logger.warning(f"CALL_HISTORY_SKIPPED | missing_agent_id | agent_id={agent_id} | user_id={user_id}")
+                self.logger.warning("CALL_HISTORY_SKIPPED | missing_agent_id | agent_id=%s | user_id=%s", agent_id, user_id)
                 return
             
             # Extract call data from session and room
             contact_phone = self._extract_phone_from_room(ctx.room.name)
-            call_sid = self._extract_call_sid(ctx, participant)
+            call_sid = call_sid or self._extract_call_sid(ctx, participant)
             duration_seconds = self._calculate_call_duration(ctx.room.creation_time if hasattr(ctx.room, 'creation_time') else None, session.end_time if hasattr(session, 'end_time') else None)
             started_at = ctx.room.creation_time.isoformat() if hasattr(ctx.room, 'creation_time') and ctx.room.creation_time else None
             ended_at = session.end_time.isoformat() if hasattr(session, 'end_time') and session.end_time else None
@@ -793,7 +748,11 @@ class InboundCallHandler:
             }
             
             # Log call data for debugging
-            self.logger.info(f"CALL_DATA_EXTRACTED | agent_id={agent_id} | user_id={user_id} | contact_phone={contact_phone} | call_sid={call_sid} | duration={duration_seconds} | started_at={started_at} | ended_at={ended_at} | transcription_items={len(transcription) if transcription else 0}")
+            if self.logger.isEnabledFor(logging.INFO):
+                self.logger.info(
+                    "CALL_DATA_EXTRACTED | agent_id=%s | user_id=%s | contact_phone=%s | call_sid=%s | duration=%s | started_at=%s | ended_at=%s | transcription_items=%d",
+                    agent_id, user_id, contact_phone, call_sid, duration_seconds, started_at, ended_at, len(transcription) if transcription else 0,
+                )
             
             # Save to database via backend API
             await self._save_to_backend(call_data)
@@ -801,32 +760,14 @@ class InboundCallHandler:
             self.logger.info("CALL_HISTORY_SAVED_SUCCESSFULLY")
             
         except Exception as e:
-            self.logger.error(f"CALL_HISTORY_SAVE_ERROR | error={str(e)}", exc_info=True)
+            self.logger.error("CALL_HISTORY_SAVE_ERROR | error=%s", e, exc_info=True)
 
 
     def _extract_transcription_from_history(self, session_history: list) -> list:
         """Extract transcription from session history."""
         try:
-            transcription = []
-            for item in session_history:
-                if isinstance(item, dict) and "role" in item and "content" in item:
-                    content = item["content"]
-                    # Handle different content formats
-                    if isinstance(content, list):
-                        content_parts = []
-                        for c in content:
-                            if c and str(c).strip():
-                                content_parts.append(str(c).strip())
-                        content = " ".join(content_parts)
-                    elif not isinstance(content, str):
-                        content = str(content)
-                    
-                    # Only add non-empty content
-                    if content and content.strip():
-                        transcription.append({
-                            "role": item["role"],
-                            "content": content.strip()
-                        })
+            # Only items with non-empty content are kept
+            transcription = transcript_from_history(session_history)
             
             self.logger.info(f"TRANSCRIPTION_EXTRACTED | items={len(transcription)}")
             return transcription
@@ -834,7 +775,7 @@ class InboundCallHandler:
             self.logger.error(f"TRANSCRIPTION_EXTRACTION_ERROR | error={str(e)}")
             return []
 
-    async def _handle_no_assistant_config(self, ctx: JobContext) -> None:
+    async def _handle_no_assistant_config(self, ctx: JobContext, connect_task: Optional[asyncio.Task] = None) -> None:
         """Handle case where no assistant configuration is found."""
         try:
             self.logger.warning("NO_ASSISTANT_CONFIG | creating_fallback_session")
@@ -842,8 +783,7 @@ class InboundCallHandler:
             # Create a simple fallback agent with TTS
             from livekit.agents import Agent
             from livekit.plugins import openai
-            import os
-            
+
             # Create simple TTS for fallback
             fallback_tts = create_tts_instance(self.settings)
             
@@ -853,7 +793,7 @@ class InboundCallHandler:
             )
             
             # Use proper session management like sass-livekit
-            await ctx.connect(auto_subscribe=AutoSubscribe.AUDIO_ONLY)
+            await self._ensure_connected(ctx, connect_task)
             
             # Wait for participant with longer timeout
             try:
@@ -868,9 +808,8 @@ class InboundCallHandler:
                 participant = None
             
             # Create session with proper configuration
-            from livekit.plugins import silero
             session = AgentSession(
-                vad=silero.VAD.load(),
+                vad=get_vad(),
                 stt=openai.STT(model="whisper-1"),
                 llm=openai.LLM(model="gpt-4o-mini", temperature=0.1),
                 tts=fallback_tts,
@@ -899,7 +838,7 @@ class InboundCallHandler:
             self.logger.error(f"FALLBACK_SESSION_ERROR | error={str(e)}", exc_info=True)
             raise
     
-    async def _handle_agent_creation_failure(self, ctx: JobContext) -> None:
+    async def _handle_agent_creation_failure(self, ctx: JobContext, connect_task: Optional[asyncio.Task] = None) -> None:
         """Handle agent creation failure."""
         try:
             self.logger.warning("AGENT_CREATION_FAILED | creating_error_session")
@@ -907,8 +846,7 @@ class InboundCallHandler:
             # Create a simple fallback agent with TTS
             from livekit.agents import Agent
             from livekit.plugins import openai
-            import os
-            
+
             # Create simple TTS for fallback
             fallback_tts = create_tts_instance(self.settings)
             
@@ -918,7 +856,7 @@ class InboundCallHandler:
             )
             
             # Use proper session management
-            await ctx.connect(auto_subscribe=AutoSubscribe.AUDIO_ONLY)
+            await self._ensure_connected(ctx, connect_task)
             
             # Wait for participant with longer timeout
             try:
@@ -933,9 +871,8 @@ class InboundCallHandler:
                 participant = None
             
             # Create session with proper configuration
-            from livekit.plugins import silero
             session = AgentSession(
-                vad=silero.VAD.load(),
+                vad=get_vad(),
                 stt=openai.STT(model="whisper-1"),
                 llm=openai.LLM(model="gpt-4o-mini", temperature=0.1),
                 tts=fallback_tts,
@@ -980,10 +917,9 @@ class InboundCallHandler:
                 # Create a simple fallback agent with TTS
                 from livekit.agents import Agent
                 from livekit.plugins import openai
-                import os
-                
+
                 # Create simple TTS for fallback
-                openai_api_key = os.getenv("OPENAI_API_KEY")
+                openai_api_key = self.settings.openai.api_key or None
                 fallback_tts = openai.TTS(model="tts-1", voice="alloy", api_key=openai_api_key)
                 
                 fallback_agent = Agent(
@@ -992,9 +928,8 @@ class InboundCallHandler:
                 )
                 
                 # Create session with proper configuration
-                from livekit.plugins import silero
                 session = AgentSession(
-                    vad=silero.VAD.load(),
+                    vad=get_vad(),
                     stt=openai.STT(model="whisper-1"),
                     llm=openai.LLM(model="gpt-4o-mini", temperature=0.1),
                     tts=fallback_tts,
@@ -3,7 +3,7 @@ Outbound call handler for processing outgoing calls.
 """
 
 import logging
-import json
+import re
 import asyncio
 from typing import Optional, Dict, Any, List
 from livekit.agents import JobContext, AgentSession, AutoSubscribe, RoomInputOptions, RoomOutputOptions
@@ -11,9 +11,16 @@ from livekit import api
 from livekit.plugins import openai
 
 from config.settings import Settings
-from services.rag_assistant import RAGAssistant
+from services.rag_assistant import RAGAssistant, rag_assistant_kwargs
 from services.call_outcome_service import CallOutcomeService
+from utils.metadata import (
+    parse_metadata, metadata_agent_id, metadata_dict, first_value,
+    attributes_call_sid, room_name_call_sid, CALL_SID_METADATA_KEYS,
+)
 from utils.logging_config import get_logger
+from utils.supabase_client import get_supabase_client, fetch_agent_config
+from utils.vad import get_vad
+from utils.call_batcher import get_call_insert_batcher
 from utils.latency_logger import (
     measure_latency, measure_latency_context, 
     measure_room_connection, measure_call_processing,
@@ -21,6 +28,10 @@ from utils.latency_logger import (
 )
 
 
+# Phone numbers embedded in room names
+_PHONE_RE = re.compile(r'(\+?\d{10,15})')
+
+
 def create_tts_instance(settings: Settings):
     """Create TTS instance using Eleven Labs TTS."""
     logger = get_logger(__name__)
@@ -43,24 +54,15 @@ class OutboundCallHandler:
         self.logger = get_logger(__name__)
         self.call_outcome_service = CallOutcomeService()
         
-        # Initialize Supabase client
+        # Shared per-process Supabase client (reuses one HTTPS connection pool across calls)
         try:
-            from supabase import create_client, Client
-            
             # Debug logging for Supabase configuration
             self.logger.info(f"OUTBOUND_HANDLER_INIT | supabase_url={'SET' if settings.supabase.url else 'NOT SET'}")
             self.logger.info(f"OUTBOUND_HANDLER_INIT | supabase_service_role_key={'SET' if settings.supabase.service_role_key else 'NOT SET'}")
             
-            if not settings.supabase.url or not settings.supabase.service_role_key:
+            self.supabase = get_supabase_client(settings)
+            if self.supabase is None:
                 self.logger.error("OUTBOUND_HANDLER_INIT_ERROR | supabase_key is required")
-                self.supabase = None
-                return
-            
-            self.supabase: Optional[Client] = create_client(
-                settings.supabase.url,
-                settings.supabase.service_role_key
-            )
-            self.logger.info("OUTBOUND_HANDLER_INIT | supabase_client_created")
         except Exception as e:
             self.logger.error(f"OUTBOUND_HANDLER_INIT_ERROR | supabase_error={str(e)}")
             self.supabase = None
@@ -75,7 +77,7 @@ class OutboundCallHandler:
         call_id = getattr(ctx.job, 'id', 'unknown')
         room_name = getattr(ctx.room, 'name', 'unknown')
         
-        self.logger.info(f"OUTBOUND_CALL_START | call_id={call_id} | room={room_name}")
+        self.logger.info("OUTBOUND_CALL_START | call_id=%s | room=%s", call_id, room_name)
         
         # Track room connection latency
         async with measure_latency_context(
@@ -84,26 +86,28 @@ class OutboundCallHandler:
             room_name=room_name,
             metadata={"room_name": room_name, "call_type": "outbound"}
         ):
+            # Join the room while metadata is parsed and the assistant config is fetched
+            connect_task = asyncio.create_task(ctx.connect(auto_subscribe=AutoSubscribe.AUDIO_ONLY))
             try:
-                # Connect to room
-                await ctx.connect(auto_subscribe=AutoSubscribe.AUDIO_ONLY)
-                self.logger.info(f"OUTBOUND_CALL_CONNECTED | room={room_name}")
-                
                 # Extract call metadata
                 metadata = await self._extract_call_metadata_safe(ctx)
                 
+                # Resolve assistant configuration
+                assistant_config = await self._resolve_assistant_config_safe(metadata) if metadata else None
+                
+                # Connect to room
+                await connect_task
+                self.logger.info("OUTBOUND_CALL_CONNECTED | room=%s", room_name)
+                
                 if not metadata:
                     await self._handle_no_metadata(ctx)
                     return
                 
-                # Resolve assistant configuration
-                assistant_config = await self._resolve_assistant_config_safe(metadata)
-                
                 if not assistant_config:
                     await self._handle_no_assistant_config(ctx)
                     return
                 
-                self.logger.info(f"ASSISTANT_CONFIG_RESOLVED | assistant_id={assistant_config.get('id')}")
+                self.logger.info("ASSISTANT_CONFIG_RESOLVED | assistant_id=%s", assistant_config.get('id'))
                 
                 # Create SIP participant for outbound call
                 await self._create_sip_participant_safe(ctx, metadata)
@@ -114,7 +118,10 @@ class OutboundCallHandler:
                     timeout=30.0
                 )
                 
-                self.logger.info(f"OUTBOUND_PARTICIPANT_CONNECTED | phone={metadata.get('phone_number')}")
+                self.logger.info("OUTBOUND_PARTICIPANT_CONNECTED | phone=%s", metadata.get('phone_number'))
+                
+                # The call SID is fixed for the call, so resolve it once now rather than at save time
+                call_sid = self._extract_call_sid(ctx)
                 
                 # Create and configure agent
                 agent = await self._create_agent_safe(assistant_config)
@@ -124,12 +131,14 @@ class OutboundCallHandler:
                     return
                 
                 # Start session
-                await self._start_session_safe(ctx, agent)
+                await self._start_session_safe(ctx, agent, call_sid)
                 
-                self.logger.info(f"OUTBOUND_CALL_SUCCESS | call_id={call_id}")
+                self.logger.info("OUTBOUND_CALL_SUCCESS | call_id=%s", call_id)
                 
             except Exception as e:
-                self.logger.error(f"OUTBOUND_CALL_ERROR | call_id={call_id} | error={str(e)}", exc_info=True)
+                self.logger.error("OUTBOUND_CALL_ERROR | call_id=%s | error=%s", call_id, e, exc_info=True)
+                if not connect_task.done():
+                    connect_task.cancel()
                 await self._handle_outbound_error(ctx, e)
                 raise
     
@@ -138,13 +147,12 @@ class OutboundCallHandler:
         try:
             metadata = getattr(ctx.job, 'metadata', None)
             if metadata:
-                try:
-                    dial_info = json.loads(metadata)
+                dial_info = parse_metadata(metadata)
+                if dial_info:
                     self.logger.info(f"OUTBOUND_METADATA_EXTRACTED | metadata={dial_info}")
                     return dial_info
-                except json.JSONDecodeError as e:
-                    self.logger.error(f"OUTBOUND_METADATA_PARSE_ERROR | error={str(e)}")
-                    return None
+                self.logger.error("OUTBOUND_METADATA_PARSE_ERROR | metadata is not a JSON object")
+                return None
             else:
                 self.logger.warning("OUTBOUND_NO_METADATA")
                 return None
@@ -155,36 +163,36 @@ class OutboundCallHandler:
     async def _resolve_assistant_config_safe(self, metadata: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Safely resolve assistant configuration from metadata."""
         try:
-            assistant_id = metadata.get("agentId") or metadata.get("assistant_id")
+            assistant_id = metadata_agent_id(metadata)
             
             if not assistant_id:
                 self.logger.warning("OUTBOUND_NO_ASSISTANT_ID")
                 return None
             
-            self.logger.info(f"OUTBOUND_ASSISTANT_ID | assistant_id={assistant_id}")
+            self.logger.info("OUTBOUND_ASSISTANT_ID | assistant_id=%s", assistant_id)
             
             # Fetch assistant configuration from Supabase
             if self.supabase:
                 try:
-                    response = self.supabase.table('agents').select('*').eq('id', assistant_id).execute()
+                    config = await fetch_agent_config(self.supabase, assistant_id)
                     
-                    if response.data and len(response.data) > 0:
-                        config = response.data[0]
-                        self.logger.info(f"OUTBOUND_ASSISTANT_CONFIG_FETCHED | config_keys={list(config.keys())}")
+                    if config:
+                        if self.logger.isEnabledFor(logging.INFO):
+                            self.logger.info("OUTBOUND_ASSISTANT_CONFIG_FETCHED | config_keys=%s", list(config.keys()))
                         return config
                     else:
-                        self.logger.warning(f"OUTBOUND_ASSISTANT_NOT_FOUND | assistant_id={assistant_id}")
+                        self.logger.warning("OUTBOUND_ASSISTANT_NOT_FOUND | assistant_id=%s", assistant_id)
                         return None
                         
                 except Exception as e:
-                    self.logger.error(f"OUTBOUND_ASSISTANT_FETCH_ERROR | assistant_id={assistant_id} | error={str(e)}")
+                    self.logger.error("OUTBOUND_ASSISTANT_FETCH_ERROR | assistant_id=%s | error=%s", assistant_id, e)
                     return None
             else:
                 self.logger.error("OUTBOUND_SUPABASE_CLIENT_NOT_AVAILABLE")
                 return None
                 
         except Exception as e:
-            self.logger.error(f"OUTBOUND_ASSISTANT_CONFIG_RESOLUTION_ERROR | error={str(e)}")
+            self.logger.error("OUTBOUND_ASSISTANT_CONFIG_RESOLUTION_ERROR | error=%s", e)
             return None
     
     async def _create_sip_participant_safe(self, ctx: JobContext, metadata: Dict[str, Any]) -> None:
@@ -217,22 +225,18 @@ class OutboundCallHandler:
     async def _create_agent_safe(self, assistant_config: Dict[str, Any]) -> Optional[RAGAssistant]:
         """Safely create agent with error handling."""
         try:
-            assistant_id = assistant_config.get('id')
-            instructions = assistant_config.get('prompt', 'You are a helpful assistant.')
-            knowledge_base_id = assistant_config.get('knowledge_base_id')
-            company_id = assistant_config.get('company_id')
+            agent_kwargs = rag_assistant_kwargs(assistant_config)
+            # Outbound calls keep the default greeting
+            agent_kwargs.pop('first_message')
+            assistant_id = agent_kwargs['assistant_id']
             
-            self.logger.info(f"OUTBOUND_CREATING_AGENT | assistant_id={assistant_id} | has_kb={bool(knowledge_base_id)}")
+            self.logger.info(f"OUTBOUND_CREATING_AGENT | assistant_id={assistant_id} | has_kb={bool(agent_kwargs['knowledge_base_id'])}")
             
             # Create RAG assistant
             agent = RAGAssistant(
-                instructions=instructions,
                 calendar=None,  # Can be added later if needed
-                knowledge_base_id=knowledge_base_id,
-                company_id=company_id,
                 supabase=self.supabase,
-                assistant_id=assistant_id,
-                user_id=assistant_config.get('user_id')  # Get user_id from config if available
+                **agent_kwargs
             )
             
             self.logger.info(f"OUTBOUND_AGENT_CREATED | assistant_id={assistant_id}")
@@ -242,17 +246,16 @@ class OutboundCallHandler:
             self.logger.error(f"OUTBOUND_AGENT_CREATION_ERROR | error={str(e)}", exc_info=True)
             return None
     
-    async def _start_session_safe(self, ctx: JobContext, agent: RAGAssistant) -> None:
+    async def _start_session_safe(self, ctx: JobContext, agent: RAGAssistant, call_sid: Optional[str] = None) -> None:
         """Safely start agent session."""
         try:
             self.logger.info("OUTBOUND_STARTING_AGENT_SESSION")
             
             # Create session with proper configuration
-            from livekit.plugins import silero, openai
-            import os
-            
+            from livekit.plugins import openai
+
             session = AgentSession(
-                vad=silero.VAD.load(),
+                vad=get_vad(),
                 stt=openai.STT(model="whisper-1"),
                 llm=openai.LLM(model="gpt-4o-mini", temperature=0.1),
                 tts=create_tts_instance(self.settings),
@@ -272,7 +275,7 @@ class OutboundCallHandler:
             self.logger.info("OUTBOUND_AGENT_SESSION_STARTED")
             
             # Save call history after session completion
-            await self._save_call_history_safe(ctx, agent, session)
+            await self._save_call_history_safe(ctx, agent, session, call_sid)
             
         except Exception as e:
             self.logger.error(f"OUTBOUND_SESSION_START_ERROR | error={str(e)}", exc_info=True)
@@ -286,8 +289,7 @@ class OutboundCallHandler:
             # Create a simple fallback agent with TTS
             from livekit.agents import Agent
             from livekit.plugins import openai
-            import os
-            
+
             # Create simple TTS for fallback
             fallback_tts = create_tts_instance(self.settings)
             
@@ -297,9 +299,8 @@ class OutboundCallHandler:
             )
             
             # Create session with proper configuration
-            from livekit.plugins import silero
             session = AgentSession(
-                vad=silero.VAD.load(),
+                vad=get_vad(),
                 stt=openai.STT(model="whisper-1"),
                 llm=openai.LLM(model="gpt-4o-mini", temperature=0.1),
                 tts=fallback_tts,
@@ -335,8 +336,7 @@ class OutboundCallHandler:
             # Create a simple fallback agent with TTS
             from livekit.agents import Agent
             from livekit.plugins import openai
-            import os
-            
+
             # Create simple TTS for fallback
             fallback_tts = create_tts_instance(self.settings)
             
@@ -346,9 +346,8 @@ class OutboundCallHandler:
             )
             
             # Create session with proper configuration
-            from livekit.plugins import silero
             session = AgentSession(
-                vad=silero.VAD.load(),
+                vad=get_vad(),
                 stt=openai.STT(model="whisper-1"),
                 llm=openai.LLM(model="gpt-4o-mini", temperature=0.1),
                 tts=fallback_tts,
@@ -384,8 +383,7 @@ class OutboundCallHandler:
             # Create a simple fallback agent with TTS
             from livekit.agents import Agent
             from livekit.plugins import openai
-            import os
-            
+
             # Create simple TTS for fallback
             fallback_tts = create_tts_instance(self.settings)
             
@@ -395,9 +393,8 @@ class OutboundCallHandler:
             )
             
             # Create session with proper configuration
-            from livekit.plugins import silero
             session = AgentSession(
-                vad=silero.VAD.load(),
+                vad=get_vad(),
                 stt=openai.STT(model="whisper-1"),
                 llm=openai.LLM(model="gpt-4o-mini", temperature=0.1),
                 tts=fallback_tts,
@@ -435,10 +432,9 @@ class OutboundCallHandler:
                 # Create a simple fallback agent with TTS
                 from livekit.agents import Agent
                 from livekit.plugins import openai
-                import os
-                
+
                 # Create simple TTS for fallback
-                openai_api_key = os.getenv("OPENAI_API_KEY")
+                openai_api_key = self.settings.openai.api_key or None
                 fallback_tts = openai.TTS(model="tts-1", voice="alloy", api_key=openai_api_key)
                 
                 fallback_agent = Agent(
@@ -447,9 +443,8 @@ class OutboundCallHandler:
                 )
                 
                 # Create session with proper configuration
-                from livekit.plugins import silero
                 session = AgentSession(
-                    vad=silero.VAD.load(),
+                    vad=get_vad(),
                     stt=openai.STT(model="whisper-1"),
                     llm=openai.LLM(model="gpt-4o-mini", temperature=0.1),
                     tts=fallback_tts,
@@ -479,7 +474,7 @@ class OutboundCallHandler:
         except Exception as recovery_exception:
             self.logger.error(f"OUTBOUND_ERROR_RECOVERY_EXCEPTION | error={str(recovery_exception)}")
     
-    async def _save_call_history_safe(self, ctx: JobContext, agent: RAGAssistant, session: AgentSession) -> None:
+    async def _save_call_history_safe(self, ctx: JobContext, agent: RAGAssistant, session: AgentSession, call_sid: Optional[str] = None) -> None:
         """
         Safely save call history to database after session completion.
         
@@ -487,6 +482,7 @@ class OutboundCallHandler:
             ctx: LiveKit job context
             agent: Agent instance
             session: Completed session
+            call_sid: Call SID resolved at call start, if any
         """
         try:
             self.logger.info("OUTBOUND_SAVING_CALL_HISTORY")
@@ -496,7 +492,7 @@ class OutboundCallHandler:
             user_id = agent.user_id
             
             if not agent_id:
-                self.logger.warning(f"OUTBOUND_CALL_HISTORY_SKIPPED | missing_agent_id | agent_id={agent_id} | user_id={user_id}")
+                self.logger.warning("OUTBOUND_CALL_HISTORY_SKIPPED | missing_agent_id | agent_id=%s | user_id=%s", agent_id, user_id)
                 return
             
             # Extract call data from session and room
@@ -517,7 +513,7 @@ class OutboundCallHandler:
                 'duration_seconds': self._calculate_call_duration(ctx.room.creation_time if hasattr(ctx.room, 'creation_time') else None, session.end_time if hasattr(session, 'end_time') else None),
                 'outcome': analysis_results.get('call_outcome', 'completed'),
                 'notes': None,
-                'call_sid': self._extract_call_sid(ctx),
+                'call_sid': call_sid or self._extract_call_sid(ctx),
                 'started_at': ctx.room.creation_time.isoformat() if hasattr(ctx.room, 'creation_time') and ctx.room.creation_time else None,
                 'ended_at': session.end_time.isoformat() if hasattr(session, 'end_time') and session.end_time else None,
                 'success': analysis_results.get('call_success', True),
@@ -531,7 +527,7 @@ class OutboundCallHandler:
             self.logger.info("OUTBOUND_CALL_HISTORY_SAVED_SUCCESSFULLY")
             
         except Exception as e:
-            self.logger.error(f"OUTBOUND_CALL_HISTORY_SAVE_ERROR | error={str(e)}", exc_info=True)
+            self.logger.error("OUTBOUND_CALL_HISTORY_SAVE_ERROR | error=%s", e, exc_info=True)
     
     async def _perform_call_analysis(
         self, 
@@ -590,78 +586,45 @@ class OutboundCallHandler:
             return None
         
         # Try to extract phone number from room name patterns
-        import re
-        phone_match = re.search(r'(\+?\d{10,15})', room_name)
+        phone_match = _PHONE_RE.search(room_name)
         return phone_match.group(1) if phone_match else None
     
-    def _extract_call_sid(self, ctx: JobContext) -> str:
+    def _extract_call_sid(self, ctx: JobContext) -> Optional[str]:
         """Extract call SID from room metadata or participants."""
-        call_sid = None
-        
-        try:
-            # Try room metadata first
-            if ctx.room.metadata:
-                import json
-                try:
-                    metadata = json.loads(ctx.room.metadata)
-                    call_sid = (metadata.get('call_sid') or 
-                               metadata.get('CallSid') or 
-                               metadata.get('provider_id') or
-                               metadata.get('twilio_call_sid') or
-                               metadata.get('twilioCallSid'))
-                    if call_sid:
-                        self.logger.info(f"OUTBOUND_CALL_SID_FROM_ROOM_METADATA | call_sid={call_sid}")
-                        return call_sid
-                except json.JSONDecodeError:
-                    pass
-            
-            # Try participants
-            for participant in ctx.room.remote_participants.values():
-                if participant.attributes:
-                    # Try multiple attribute keys
-                    call_sid = (participant.attributes.get('sip.twilio.callSid') or 
-                               participant.attributes.get('sip.twilio.call_sid') or
-                               participant.attributes.get('twilio.callSid') or
-                               participant.attributes.get('twilio.call_sid') or
-                               participant.attributes.get('callSid') or
-                               participant.attributes.get('call_sid'))
-                    if call_sid:
-                        self.logger.info(f"OUTBOUND_CALL_SID_FROM_PARTICIPANT | call_sid={call_sid}")
-                        return call_sid
-            
-            # Try to extract from room name as last resort
-            if not call_sid and hasattr(ctx.room, 'name') and ctx.room.name:
-                import re
-                # Look for Twilio call SID pattern (CA followed by 32 hex characters)
-                call_sid_match = re.search(r'CA[a-fA-F0-9]{32}', ctx.room.name)
-                if call_sid_match:
-                    call_sid = call_sid_match.group(0)
-                    self.logger.info(f"OUTBOUND_CALL_SID_FROM_ROOM_NAME | call_sid={call_sid}")
-                    return call_sid
-            
-            if not call_sid:
-                self.logger.warning("OUTBOUND_CALL_SID_NOT_FOUND | no call_sid available from any source")
-            
-            return call_sid
-        except Exception as e:
-            self.logger.warning(f"OUTBOUND_CALL_SID_EXTRACTION_ERROR | error={str(e)}")
-            return None
+        # Probed lazily in order; once a source has the SID the later ones are skipped
+        sources = (
+            ("ROOM_METADATA", lambda: first_value(metadata_dict(ctx.room.metadata), CALL_SID_METADATA_KEYS)),
+            ("PARTICIPANT", lambda: next(
+                (sid for p in ctx.room.remote_participants.values() if (sid := attributes_call_sid(p.attributes))),
+                None,
+            )),
+            ("ROOM_NAME", lambda: room_name_call_sid(getattr(ctx.room, 'name', None))),
+        )
+        for source, probe in sources:
+            try:
+                call_sid = probe()
+            except Exception as e:
+                self.logger.warning("OUTBOUND_CALL_SID_EXTRACTION_ERROR | source=%s | error=%s", source, e)
+                continue
+            if call_sid:
+                self.logger.info("OUTBOUND_CALL_SID_FROM_%s | call_sid=%s", source, call_sid)
+                return call_sid
+
+        self.logger.warning("OUTBOUND_CALL_SID_NOT_FOUND | no call_sid available from any source")
+        return None
     
     def _extract_transcription(self, session: AgentSession) -> list:
         """Extract transcription from session."""
         try:
-            transcription = []
-            
-            # Try to get session history
-            if hasattr(session, 'history') and session.history:
-                for message in session.history:
-                    if hasattr(message, 'role') and hasattr(message, 'content'):
-                        transcription.append({
-                            'role': message.role,
-                            'content': str(message.content)
-                        })
-            
-            return transcription
+            history = getattr(session, 'history', None)
+            if not history:
+                return []
+            
+            return [
+                {'role': message.role, 'content': str(message.content)}
+                for message in history
+                if hasattr(message, 'role') and hasattr(message, 'content')
+            ]
         except Exception:
             return []
     
@@ -678,25 +641,16 @@ class OutboundCallHandler:
     async def _save_to_backend(self, call_data: dict) -> None:
         """Save call data directly to Supabase database."""
         try:
-            from supabase import create_client, Client
-            import os
-            
-            # Get Supabase credentials
-            supabase_url = os.getenv('SUPABASE_URL')
-            supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
-            
-            if not supabase_url or not supabase_key:
+            supabase = self.supabase
+            if supabase is None:
                 self.logger.error("SUPABASE_CREDENTIALS_MISSING | cannot save call history")
                 return
             
-            # Create Supabase client
-            supabase: Client = create_client(supabase_url, supabase_key)
-            
-            # Save to calls table
-            result = supabase.table('calls').insert(call_data).execute()
+            # Rows from calls ending at the same time share one insert (written off the event loop)
+            row = await get_call_insert_batcher(self.settings).insert(supabase, call_data)
             
-            if result.data:
-                self.logger.info(f"OUTBOUND_CALL_HISTORY_SAVED_TO_DB | agent_id={call_data['agent_id']} | db_id={result.data[0].get('id')}")
+            if row:
+                self.logger.info(f"OUTBOUND_CALL_HISTORY_SAVED_TO_DB | agent_id={call_data['agent_id']} | db_id={row.get('id')}")
             else:
                 self.logger.error(f"OUTBOUND_CALL_HISTORY_DB_SAVE_FAILED | agent_id={call_data['agent_id']}")
                         
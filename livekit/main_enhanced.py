@@ -9,23 +9,24 @@ from __future__ import annotations
 from dotenv import load_dotenv
 load_dotenv()
 
-import json
-import urllib.request
-import urllib.parse
 import logging
 import datetime
 import asyncio
 import sys
-from typing import Optional, Tuple, Iterable, Dict, Any
-import base64
+from typing import Optional, Tuple, Iterable, Dict, Any, List
 import os
 import re
+import functools
 import hashlib
+import time
 import uuid
 from zoneinfo import ZoneInfo
 import aiohttp
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from types import MappingProxyType
 
-from livekit import agents, api
+from livekit import agents, api, rtc
 from livekit.agents.voice import Agent, AgentSession, RunContext
 from livekit.agents import function_tool, cli, JobContext, WorkerOptions, RoomInputOptions, RoomOutputOptions
 from livekit.protocol.sip import TransferSIPParticipantRequest
@@ -33,7 +34,8 @@ from cal_calendar_api import CalComCalendar, AvailableSlot, CalendarResult, Cale
 
 # ⬇️ OpenAI + VAD plugins
 from livekit.plugins import openai as lk_openai  # LLM, TTS
-from livekit.plugins import silero              # VAD
+import openai                                     # shared AsyncClient for lk_openai.LLM
+import httpx
 from livekit.plugins import deepgram            # Deepgram STT
 from livekit.plugins import elevenlabs          # Eleven Labs TTS
 
@@ -43,8 +45,134 @@ from services.call_outcome_service import CallOutcomeService, CallOutcomeAnalysi
 # ⬇️ Booking Agent
 from services.booking_agent import BookingAgent
 
+
+# Phone numbers embedded in SIP room names (e.g. did-_+17164194270_... or inbound_+17164194270)
+ROOM_PHONE_RE = re.compile(r'\+?\d{10,15}', re.ASCII)
+TRANSFER_ROOM_PHONE_RE = re.compile(r'\+?\d{10,}', re.ASCII)
+# strftime formats for dates/times read back to callers
+DAY_FMT = "%A, %B %d"
+TIME_FMT = "%I:%M %p"
+DAY_TIME_FMT = "%A, %B %d at %I:%M %p"
+
+# Spoken slot times: 8am, 8:30am, 3:00 pm, 10:15 A M
+TIME_STRING_RE = re.compile(r'\s*(\d{1,2})\s*(?::\s*(\d{2}))?\s*([ap])\s*m', re.ASCII | re.IGNORECASE)
+
+# Lookup tables and patterns for UnifiedAgent._parse_day_query
+TOMORROW_WORDS = frozenset({"tomorrow", "tmrw", "tomorow", "tommorow"})
+WEEKDAY_INDEX = {
+    "mon": 0, "monday": 0, "tue": 1, "tues": 1, "tuesday": 1,
+    "wed": 2, "wednesday": 2, "thu": 3, "thur": 3, "thurs": 3, "thursday": 3,
+    "fri": 4, "friday": 4, "sat": 5, "saturday": 5, "sun": 6, "sunday": 6
+}
+MONTH_INDEX = {m.lower(): i for i, m in enumerate(
+    ["January", "February", "March", "April", "May", "June",
+     "July", "August", "September", "October", "November", "December"], 1)}
+MONTH_ABBR_INDEX = {k[:3]: v for k, v in MONTH_INDEX.items()}
+ORDINAL_DAYS = {
+    "first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5,
+    "sixth": 6, "seventh": 7, "eighth": 8, "ninth": 9, "tenth": 10,
+    "eleventh": 11, "twelfth": 12, "thirteenth": 13, "fourteenth": 14, "fifteenth": 15,
+    "sixteenth": 16, "seventeenth": 17, "eighteenth": 18, "nineteenth": 19, "twentieth": 20,
+    "twenty-first": 21, "twenty-second": 22, "twenty-third": 23, "twenty-fourth": 24, "twenty-fifth": 25,
+    "twenty-sixth": 26, "twenty-seventh": 27, "twenty-eighth": 28, "twenty-ninth": 29, "thirtieth": 30, "thirty-first": 31
+}
+# MM/DD, DD/MM, MM-DD, DD-MM, MM DD, DD MM
+NUMERIC_DATE_RE = re.compile(r"^\s*(\d{1,2})[\/\-\s](\d{1,2})\s*$")
+ORDINAL_SUFFIX_RE = re.compile(r'(\d+)(st|nd|rd|th)')
+WHITESPACE_RE = re.compile(r"\s+")
+
+# Knowledge-base answers remembered per call (LRU), so a repeated question skips the RAG round-trip
+KB_CACHE_MAX = 128
+
+# Placeholder names/addresses callers (or the LLM) fill in instead of real ones
+FAKE_NAMES = frozenset({'john doe', 'jane doe', 'test user', 'example', 'demo', 'sample'})
+FAKE_EMAILS = frozenset({'johndoe@example.com', 'test@example.com', 'demo@example.com', 'sample@example.com'})
+FAKE_PHONES = frozenset({'1234567890', '5555555555', '0000000000', '1111111111'})
+# Everything that is not a digit, stripped from spoken phone numbers in one C-level pass
+NON_DIGIT_RE = re.compile(r'\D')
+
+
+def looks_like_email(email: str) -> bool:
+    """Cheap shape check: an '@' with a dot somewhere after the last one."""
+    _, at, domain = email.rpartition('@')
+    return bool(at) and '.' in domain
+
+
+@dataclass(frozen=True)
+class EnvConfig:
+    """Environment configuration captured once at import (after load_dotenv)."""
+    supabase_url: Optional[str]
+    supabase_key: Optional[str]
+    backend_url: str
+    backend_service_token: Optional[str]
+    livekit_url: Optional[str]
+    livekit_api_key: Optional[str]
+    livekit_api_secret: Optional[str]
+    openai_api_key: Optional[str]
+    deepgram_api_key: Optional[str]
+    elevenlabs_api_key: Optional[str]
+    openai_llm_model: str
+    agent_instructions: str
+    agent_first_message: Optional[str]
+    agent_sms_prompt: Optional[str]
+    knowledge_base_id: Optional[str]
+    cal_api_key: Optional[str]
+    cal_event_type_id: Optional[str]
+    cal_event_type_slug: Optional[str]
+    cal_timezone: str
+    force_first_message: bool
+    cache_first_message_audio: bool
+    web_participant_timeout: float
+    participant_timeout: float
+    agent_name: str
+
+    @classmethod
+    def from_env(cls) -> "EnvConfig":
+        return cls(
+            supabase_url=os.getenv("SUPABASE_URL"),
+            supabase_key=os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_SERVICE_ROLE"),
+            backend_url=os.getenv("BACKEND_URL", "http://localhost:4000").rstrip("/"),
+            backend_service_token=os.getenv("BACKEND_SERVICE_TOKEN") or os.getenv("BACKEND_API_KEY"),
+            livekit_url=os.getenv("LIVEKIT_URL"),
+            livekit_api_key=os.getenv("LIVEKIT_API_KEY"),
+            livekit_api_secret=os.getenv("LIVEKIT_API_SECRET"),
+            openai_api_key=os.getenv("OPENAI_API_KEY"),
+            deepgram_api_key=os.getenv("DEEPGRAM_API_KEY"),
+            elevenlabs_api_key=os.getenv("ELEVENLABS_API_KEY"),
+            openai_llm_model=os.getenv("OPENAI_LLM_MODEL", "gpt-4o-mini"),
+            agent_instructions=os.getenv("AGENT_INSTRUCTIONS", "You are a helpful assistant. You can help users book appointments and answer questions."),
+            agent_first_message=os.getenv("AGENT_FIRST_MESSAGE"),
+            agent_sms_prompt=os.getenv("AGENT_SMS_PROMPT"),
+            knowledge_base_id=os.getenv("KNOWLEDGE_BASE_ID"),
+            cal_api_key=os.getenv("CAL_API_KEY"),
+            cal_event_type_id=os.getenv("CAL_EVENT_TYPE_ID"),
+            cal_event_type_slug=os.getenv("CAL_EVENT_TYPE_SLUG"),
+            cal_timezone=os.getenv("CAL_TIMEZONE", "UTC"),
+            force_first_message=os.getenv("FORCE_FIRST_MESSAGE", "true").lower() != "false",
+            cache_first_message_audio=os.getenv("CACHE_FIRST_MESSAGE_AUDIO", "true").lower() != "false",
+            web_participant_timeout=float(os.getenv("WEB_PARTICIPANT_TIMEOUT_SECONDS", "60.0")),
+            participant_timeout=float(os.getenv("PARTICIPANT_TIMEOUT_SECONDS", "35.0")),
+            agent_name=os.getenv("LK_AGENT_NAME", "ai"),
+        )
+
+
+CFG = EnvConfig.from_env()
+
 # ========== UNIFIED AGENT CLASS ==========
 
+@dataclass(**({"slots": True} if sys.version_info >= (3, 10) else {}))
+class BookingState:
+    """Details collected by the booking tools for the appointment in progress."""
+    name: Optional[str] = None
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    notes: str = ""
+    date: Optional[str] = None  # Display form of the day whose slots were listed
+    time: Optional[str] = None
+    selected_slot: Optional[AvailableSlot] = None
+    available_slots: List[AvailableSlot] = field(default_factory=list)
+    available_slot_strings: List[str] = field(default_factory=list)
+
 class UnifiedAgent(Agent):
     """
     Unified agent that combines calendar booking and data collection capabilities.
@@ -62,7 +190,13 @@ class UnifiedAgent(Agent):
         self.first_message = first_message
         self.sms_prompt = sms_prompt
         self.knowledge_base_id = knowledge_base_id
+        # Knowledge-base context already fetched this call, least recently used first
+        self._kb_cache: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
         self.calendar = calendar
+        # Calendar availability, decided once when the agent is built
+        self.has_calendar = calendar is not None
+        # Calendar timezone (or configured fallback) resolved once for every date/slot helper
+        self._tz = getattr(calendar, 'tz', None) or zone_for(CFG.cal_timezone)
         
         # Initialize Call Outcome Service
         self.call_outcome_service = CallOutcomeService()
@@ -78,55 +212,36 @@ class UnifiedAgent(Agent):
         self._room = None  # Store room context for tools
         
         # Initialize booking state (following sass-livekit pattern)
-        self.booking_state = {
-            'name': None,
-            'email': None,
-            'phone': None,
-            'date': None,
-            'time': None,
-            'selected_slot': None,
-            'available_slots': [],
-            'available_slot_strings': []
-        }
+        self.booking_state = BookingState()
         
         # Store slots in map for selection (following sass-livekit pattern)
         self._slots_map: Dict[str, Any] = {}
         
         # Initialize calendar if provided
-        if self.calendar:
+        if self.has_calendar:
             asyncio.create_task(self.calendar.initialize())
             
-    async def _save_call_to_database(self, ctx: JobContext, session: AgentSession, outcome: str, success: bool, notes: str, transcription: list, contact_phone: Optional[str] = None, call_sid: Optional[str] = None, analysis: Optional[Any] = None, start_time: Optional[datetime.datetime] = None, end_time: Optional[datetime.datetime] = None, call_type: Optional[str] = None):
+    async def _save_call_to_database(self, ctx: JobContext, session: AgentSession, outcome: str, success: bool, notes: str, transcription: list, contact_phone: Optional[str] = None, call_sid: Optional[str] = None, analysis: Optional[Any] = None, start_time: Optional[datetime.datetime] = None, end_time: Optional[datetime.datetime] = None, call_type: Optional[str] = None, job_metadata: Optional[Dict[str, Any]] = None):
         """Save call data directly to Supabase database (following sass-livekit pattern)."""
         try:
-            from supabase import create_client, Client
-            import os
-            
-            # Get Supabase credentials
-            supabase_url = os.getenv('SUPABASE_URL')
-            supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
-            
-            if not supabase_url or not supabase_key:
+            # Shared Supabase client (the insert batcher is bound to it)
+            supabase = get_supabase_client()
+            if supabase is None:
                 self.logger.error("SUPABASE_CREDENTIALS_MISSING | cannot save call history")
                 return False
             
-            # Create Supabase client
-            supabase: Client = create_client(supabase_url, supabase_key)
-            
             # Extract metadata from job/room
             agent_id = None
             user_id = None
             room_name = ctx.room.name
             call_id = room_name  # Use room name as call ID
             
-            # Try to get agent_id and user_id from job metadata
-            if ctx.job.metadata:
-                try:
-                    job_metadata = json.loads(ctx.job.metadata)
-                    agent_id = job_metadata.get('agentId') or job_metadata.get('assistantId')
-                    user_id = job_metadata.get('userId')
-                except:
-                    pass
+            # Try to get agent_id and user_id from job metadata (the entrypoint passes
+            # the dict it already parsed; parse here only when called without it)
+            if job_metadata is None:
+                job_metadata = parse_metadata(ctx.job.metadata)
+            agent_id = metadata_agent_id(job_metadata)
+            user_id = job_metadata.get('userId')
             
             if not agent_id:
                 self.logger.warning(f"CALL_SAVE_SKIPPED | missing_agent_id | room={room_name}")
@@ -135,11 +250,10 @@ class UnifiedAgent(Agent):
             # If user_id is not in metadata, query agents table to get it
             if not user_id and agent_id:
                 try:
-                    import asyncio
                     agent_result = await asyncio.to_thread(
-                        lambda: supabase.table('agents').select('user_id').eq('id', agent_id).single().execute()
+                        lambda: supabase.table('agents').select('user_id').eq('id', agent_id).maybe_single().execute()
                     )
-                    if agent_result.data and agent_result.data.get('user_id'):
+                    if agent_result is not None and agent_result.data and agent_result.data.get('user_id'):
                         user_id = agent_result.data.get('user_id')
                         self.logger.info(f"USER_ID_FROM_AGENT | agent_id={agent_id} | user_id={user_id}")
                 except Exception as agent_query_error:
@@ -156,60 +270,41 @@ class UnifiedAgent(Agent):
             else:
                 call_duration = 0
             
-            # Determine call status from outcome (map to database status field)
-            # Status should be something like "completed", "qualified", "not_qualified", etc.
-            if outcome:
-                # Map outcome to status
-                if outcome.lower() in ["booked appointment", "qualified"]:
-                    status = "completed"
-                elif outcome.lower() == "not qualified":
-                    status = "completed"  # Still completed, just not qualified
-                else:
-                    status = "completed"  # Default to completed
-            else:
-                status = "completed"
-            
             # Determine call_type if not provided
             if not call_type:
                 # Try to determine from context
                 call_type = "inbound"  # default
-                if ctx.job.metadata:
-                    try:
-                        job_metadata = json.loads(ctx.job.metadata)
-                        if (job_metadata.get("source") == "web" or 
-                            job_metadata.get("callType") == "web" or 
-                            job_metadata.get("callType") == "webcall"):
-                            call_type = "web"
-                        elif job_metadata.get("source") == "outbound" or job_metadata.get("callType") == "outbound":
-                            call_type = "outbound"
-                    except:
-                        pass
+                if (job_metadata.get("source") == "web" or 
+                    job_metadata.get("callType") == "web" or 
+                    job_metadata.get("callType") == "webcall"):
+                    call_type = "web"
+                elif job_metadata.get("source") == "outbound" or job_metadata.get("callType") == "outbound":
+                    call_type = "outbound"
                 
                 # Check room metadata
                 if call_type == "inbound" and ctx.room.metadata:
-                    try:
-                        room_metadata = json.loads(ctx.room.metadata)
-                        if room_metadata.get("call_type") == "outbound":
-                            call_type = "outbound"
-                        elif room_metadata.get("call_type") == "web":
-                            call_type = "web"
-                    except:
-                        pass
-            
-            # Prepare call data (matching database schema exactly)
-            call_data = {
-                "agent_id": agent_id,  # Use agent_id, not assistant_id
-                "user_id": user_id,  # Can be None for web calls
-                "status": status,  # Use status, not call_status
-                "contact_name": "Voice Call",  # Default for web calls
+                    room_metadata = parse_metadata(ctx.room.metadata)
+                    if room_metadata.get("call_type") == "outbound":
+                        call_type = "outbound"
+                    elif room_metadata.get("call_type") == "web":
+                        call_type = "web"
+            
+            # Serialize timestamps once; a missing bound falls back to a single "now"
+            now_iso = None if start_time and end_time else datetime.datetime.now().isoformat()
+            
+            # Prepare call data (matching database schema exactly, see CALL_ROW_TEMPLATE).
+            # Every outcome maps to the "completed" status; the outcome field carries the distinction
+            call_data = CALL_ROW_TEMPLATE | {
+                "agent_id": agent_id,
+                "user_id": user_id,
                 "contact_phone": contact_phone,  # Extract from participant if available
-                "duration_seconds": call_duration,  # Use duration_seconds, not call_duration
-                "outcome": outcome if outcome else "completed",  # Use outcome field
-                "notes": notes if notes else None,
-                "started_at": start_time.isoformat() if start_time else datetime.datetime.now().isoformat(),  # Use started_at, not start_time
-                "ended_at": end_time.isoformat() if end_time else datetime.datetime.now().isoformat(),  # Use ended_at, not end_time
-                "success": success,  # Use success (bool), not success_evaluation
-                "transcription": transcription if transcription else [],  # JSONB array
+                "duration_seconds": call_duration,
+                "outcome": outcome or "completed",
+                "notes": notes or None,
+                "started_at": start_time.isoformat() if start_time else now_iso,
+                "ended_at": end_time.isoformat() if end_time else now_iso,
+                "success": success,
+                "transcription": transcription or [],  # JSONB array
                 "call_sid": call_sid,  # Extract from SIP attributes if available
                 "call_type": call_type,  # Save call type: inbound, outbound, or web
             }
@@ -218,23 +313,16 @@ class UnifiedAgent(Agent):
             
             self.logger.info(f"SAVING_CALL_TO_DB | agent_id={agent_id} | user_id={user_id} | room={room_name} | transcript_items={len(transcription)} | duration={call_duration}s")
             
-            # Save to calls table (using async-safe insert like sass-livekit)
-            try:
-                import asyncio
-                result = await asyncio.to_thread(
-                    lambda: supabase.table('calls').insert(call_data).execute()
-                )
-            except Exception as thread_error:
-                # Fallback to synchronous insert
-                self.logger.warning(f"ASYNC_INSERT_FAILED | error={thread_error} | using sync insert")
-                result = supabase.table('calls').insert(call_data).execute()
+            # Save to calls table off the event loop (like sass-livekit); concurrent sessions
+            # in this process share one insert, errors surface as CALL_DB_SAVE_ERROR
+            row = await get_call_insert_batcher().insert(supabase, call_data)
             
-            if result.data:
-                db_id = result.data[0].get('id') if isinstance(result.data, list) and len(result.data) > 0 else None
+            if row:
+                db_id = row.get('id')
                 self.logger.info(f"CALL_SAVED_TO_DB | db_id={db_id} | agent_id={agent_id} | duration={call_duration}s | transcript_items={len(transcription)}")
                 return True
             else:
-                self.logger.error(f"CALL_DB_SAVE_FAILED | agent_id={agent_id} | result={result}")
+                self.logger.error(f"CALL_DB_SAVE_FAILED | agent_id={agent_id} | no row returned")
                 return False
                         
         except Exception as e:
@@ -250,11 +338,10 @@ class UnifiedAgent(Agent):
         """
         try:
             # Get backend URL from env
-            backend_url = os.getenv("BACKEND_URL", "http://localhost:4000")
-            api_url = f"{backend_url}/api/v1/calls/update-outcome"
+            api_url = f"{CFG.backend_url}/api/v1/calls/update-outcome"
             
             # Check if we have a service token for server-to-server authentication
-            service_token = os.getenv("BACKEND_SERVICE_TOKEN") or os.getenv("BACKEND_API_KEY")
+            service_token = CFG.backend_service_token
             
             # Prepare payload
             payload = {
@@ -282,17 +369,17 @@ class UnifiedAgent(Agent):
                 
             self.logger.info(f"SENDING_OUTCOME_TO_API | url={api_url}")
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(api_url, json=payload, headers=headers) as response:
-                    if response.status >= 200 and response.status < 300:
-                        self.logger.info(f"OUTCOME_SENT_SUCCESS | status={response.status}")
-                        return True
-                    else:
-                        resp_text = await response.text()
-                        # Log as warning instead of error since DB save is the primary method
-                        self.logger.warning(f"OUTCOME_API_FAILED | status={response.status} | error={resp_text} | data already saved to DB")
-                        return False
-                        
+            session = await get_http_session()
+            async with session.post(api_url, json=payload, headers=headers) as response:
+                if response.status >= 200 and response.status < 300:
+                    self.logger.info(f"OUTCOME_SENT_SUCCESS | status={response.status}")
+                    return True
+                else:
+                    resp_text = await response.text()
+                    # Log as warning instead of error since DB save is the primary method
+                    self.logger.warning(f"OUTCOME_API_FAILED | status={response.status} | error={resp_text} | data already saved to DB")
+                    return False
+                    
         except Exception as e:
             # Log as warning instead of error since DB save is the primary method
             self.logger.warning(f"OUTCOME_API_ERROR | error={str(e)} | data already saved to DB")
@@ -306,7 +393,7 @@ class UnifiedAgent(Agent):
     
     def _require_calendar(self) -> Optional[str]:
         """Check if calendar is available (following sass-livekit pattern)."""
-        if not self.calendar:
+        if not self.has_calendar:
             self.logger.warning("_require_calendar FAILED | calendar is None")
             return "Calendar service is not available."
         self.logger.info(f"_require_calendar SUCCESS | calendar type={type(self.calendar).__name__}")
@@ -394,8 +481,7 @@ class UnifiedAgent(Agent):
             # Last resort: try to extract from room name
             if not participant_identity:
                 # Room names for SIP calls often contain phone numbers
-                import re
-                phone_match = re.search(r'\+?\d{10,}', room_name)
+                phone_match = TRANSFER_ROOM_PHONE_RE.search(room_name)
                 if phone_match:
                     phone_number_extract = phone_match.group()
                     participant_identity = f"sip_{phone_number_extract}"
@@ -422,9 +508,9 @@ class UnifiedAgent(Agent):
         # Perform the actual LiveKit transfer
         try:
             # Get LiveKit credentials from environment
-            livekit_url = os.getenv("LIVEKIT_URL")
-            livekit_api_key = os.getenv("LIVEKIT_API_KEY")
-            livekit_api_secret = os.getenv("LIVEKIT_API_SECRET")
+            livekit_url = CFG.livekit_url
+            livekit_api_key = CFG.livekit_api_key
+            livekit_api_secret = CFG.livekit_api_secret
             
             if not all([livekit_url, livekit_api_key, livekit_api_secret]):
                 self.logger.error("TRANSFER_MISSING_CREDENTIALS | LiveKit credentials not configured")
@@ -462,13 +548,13 @@ class UnifiedAgent(Agent):
         try:
             # Check if we have all required information
             missing_fields = []
-            if not self.booking_state.get('selected_slot'):
+            if not self.booking_state.selected_slot:
                 missing_fields.append("time slot")
-            if not self.booking_state.get('name'):
+            if not self.booking_state.name:
                 missing_fields.append("name")
-            if not self.booking_state.get('email'):
+            if not self.booking_state.email:
                 missing_fields.append("email")
-            if not self.booking_state.get('phone'):
+            if not self.booking_state.phone:
                 missing_fields.append("phone")
             
             if missing_fields:
@@ -488,21 +574,18 @@ class UnifiedAgent(Agent):
     async def provide_name(self, ctx: RunContext, name: str) -> str:
         """Provide the customer's name for the appointment."""
         try:
-            if not hasattr(self, 'booking_state'):
-                return "Let's start by booking an appointment. What's your name?"
-            
-            if not name or len(name.strip()) < 2:
+            name = (name or "").strip()
+            if len(name) < 2:
                 return "Please tell me your full name."
             
             # Reject common fake/test names
-            fake_names = ['john doe', 'jane doe', 'test user', 'example', 'demo', 'sample']
-            if name.lower().strip() in fake_names:
+            if name.lower() in FAKE_NAMES:
                 return "Please provide your real name, not a placeholder name."
             
-            self.booking_state['name'] = name.strip()
-            self.logger.info(f"NAME_COLLECTED | name={name.strip()}")
+            self.booking_state.name = name
+            self.logger.info(f"NAME_COLLECTED | name={name}")
             
-            return f"Nice to meet you, {name.strip()}! What's your email address?"
+            return f"Nice to meet you, {name}! What's your email address?"
             
         except Exception as e:
             self.logger.error(f"NAME_COLLECTION_ERROR | error={str(e)}")
@@ -512,22 +595,22 @@ class UnifiedAgent(Agent):
     async def provide_email(self, ctx: RunContext, email: str) -> str:
         """Provide the customer's email for the appointment."""
         try:
-            if not hasattr(self, 'booking_state') or not self.booking_state.get('name'):
+            if not self.booking_state.name:
                 return "Let's start by booking an appointment. What's your name?"
             
             # Basic email validation
-            if not email or '@' not in email or '.' not in email.split('@')[-1]:
+            if not email or not looks_like_email(email):
                 return "That email doesn't look valid. Could you repeat it?"
             
             # Reject common fake/test emails
-            fake_emails = ['johndoe@example.com', 'test@example.com', 'demo@example.com', 'sample@example.com']
-            if email.lower().strip() in fake_emails:
+            email = email.strip()
+            if email.lower() in FAKE_EMAILS:
                 return "Please provide your real email address, not a placeholder email."
             
-            self.booking_state['email'] = email.strip()
-            self.logger.info(f"EMAIL_COLLECTED | email={email.strip()}")
+            self.booking_state.email = email
+            self.logger.info(f"EMAIL_COLLECTED | email={email}")
             
-            return f"Thank you, {self.booking_state['name']}. What's your phone number?"
+            return f"Thank you, {self.booking_state.name}. What's your phone number?"
             
         except Exception as e:
             self.logger.error(f"EMAIL_COLLECTION_ERROR | error={str(e)}")
@@ -537,133 +620,140 @@ class UnifiedAgent(Agent):
     async def provide_phone(self, ctx: RunContext, phone: str) -> str:
         """Provide the customer's phone number for the appointment."""
         try:
-            if not hasattr(self, 'booking_state') or not self.booking_state.get('name') or not self.booking_state.get('email'):
+            if not self.booking_state.name or not self.booking_state.email:
                 return "Let's start by booking an appointment. What's your name?"
             
             # Check if we already have a phone number
-            if self.booking_state.get('phone'):
-                return f"Thank you, {self.booking_state['name']}. What date would you like to schedule your appointment? Please tell me the date like 'tomorrow', 'next Monday', or 'October 20th'."
+            if self.booking_state.phone:
+                return f"Thank you, {self.booking_state.name}. What date would you like to schedule your appointment? Please tell me the date like 'tomorrow', 'next Monday', or 'October 20th'."
             
             # Basic phone validation - just check it has some digits
-            digits = ''.join(filter(str.isdigit, phone))
+            digits = NON_DIGIT_RE.sub('', phone)
             if not digits or len(digits) < 7:
                 return "That phone number doesn't look right. Please say it with digits."
             
             # Reject common fake/test phone numbers
-            fake_phones = ['1234567890', '5555555555', '0000000000', '1111111111']
-            if phone.strip() in fake_phones:
+            phone = phone.strip()
+            if phone in FAKE_PHONES:
                 return "Please provide your real phone number, not a placeholder number."
             
-            self.booking_state['phone'] = phone.strip()
-            self.logger.info(f"PHONE_COLLECTED | phone={phone.strip()}")
+            self.booking_state.phone = phone
+            self.logger.info(f"PHONE_COLLECTED | phone={phone}")
             
             # If we have all fields including selected slot, auto-book (following sass-livekit pattern)
-            if self.booking_state.get('selected_slot') and self.booking_state.get('name') and self.booking_state.get('email'):
+            if self.booking_state.selected_slot and self.booking_state.name and self.booking_state.email:
                 self.logger.info("AUTO_BOOKING_TRIGGERED_FROM_PHONE | all fields available")
                 return await self._complete_booking()
             
-            return f"Perfect! What date would you like to schedule your appointment, {self.booking_state['name']}? Please tell me the date like 'tomorrow', 'next Monday', or 'October 20th'."
+            return f"Perfect! What date would you like to schedule your appointment, {self.booking_state.name}? Please tell me the date like 'tomorrow', 'next Monday', or 'October 20th'."
             
         except Exception as e:
             self.logger.error(f"PHONE_COLLECTION_ERROR | error={str(e)}")
             return "I'm sorry, I didn't catch that. Could you please tell me your phone number again?"
     
-    def _parse_date(self, date_str: str) -> str:
+    def _parse_date(self, date_str: str, today: Optional[datetime.date] = None) -> str:
         """Parse natural language date to a readable format."""
         if not date_str:
             return date_str
         
         # Use the comprehensive date parsing logic
-        parsed_date = self._parse_day_comprehensive(date_str)
+        parsed_date = self._parse_day_comprehensive(date_str, today=today)
         if parsed_date:
-            return parsed_date.strftime("%A, %B %d")
+            return parsed_date.strftime(DAY_FMT)
         
         # If we can't parse it, return the original string
         return date_str.strip()
 
-    def _parse_day_comprehensive(self, day_query: str) -> Optional[datetime.date]:
-        """Comprehensive date parsing that handles all common formats."""
+    def _today(self) -> datetime.date:
+        """Today's date in the calendar timezone (timezone-aware like sass-livekit)."""
+        return datetime.datetime.now(self._tz).date()
+
+    def _parse_day_comprehensive(self, day_query: str, today: Optional[datetime.date] = None) -> Optional[datetime.date]:
+        """
+        Comprehensive date parsing that handles all common formats.
+        Pass `today` to resolve several queries in one turn against the same
+        date without re-reading the clock.
+        """
         if not day_query:
             return None
         
         q = day_query.strip().lower()
         
         # Get timezone from calendar if available, otherwise use UTC
-        tz = None
-        if self.calendar and hasattr(self.calendar, 'tz'):
-            tz = self.calendar.tz
-        else:
-            # Try to get timezone from calendar config
-            cal_timezone = os.getenv("CAL_TIMEZONE", "UTC")
-            try:
-                tz = ZoneInfo(cal_timezone)
-            except Exception:
-                tz = ZoneInfo("UTC")
+        tz = self._tz
+        if today is None:
+            today = self._today()
         
-        # Use timezone-aware date like sass-livekit
-        today = datetime.datetime.now(tz).date()
-        
-        self.logger.info(f"DATE_PARSING_DEBUG | input='{day_query}' | normalized='{q}' | today={today} | timezone={tz}")
+        self.logger.debug("DATE_PARSING_DEBUG | input='%s' | normalized='%s' | today=%s | timezone=%s", day_query, q, today, tz)
+        return self._parse_day_query(q, today)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def _parse_day_query(q: str, today: datetime.date) -> Optional[datetime.date]:
+        """
+        Resolve a normalized day query against `today`.
+        Pure for a given (query, day), so repeated queries are dict hits and
+        the cache rolls over with the date on its own.
+        """
+        logger = logging.getLogger(__name__)
         
         # Relative dates
         if q in {"today"}:
-            self.logger.info(f"DATE_PARSING_DEBUG | matched: today")
+            logger.debug("DATE_PARSING_DEBUG | matched: today")
             return today
-        if q in {"tomorrow", "tmrw", "tomorow", "tommorow"}:
-            self.logger.info(f"DATE_PARSING_DEBUG | matched: tomorrow")
+        if q in TOMORROW_WORDS:
+            logger.debug("DATE_PARSING_DEBUG | matched: tomorrow")
             return today + datetime.timedelta(days=1)
         
         # Weekdays
-        wk = {
-            "mon": 0, "monday": 0, "tue": 1, "tues": 1, "tuesday": 1, 
-            "wed": 2, "wednesday": 2, "thu": 3, "thur": 3, "thurs": 3, "thursday": 3, 
-            "fri": 4, "friday": 4, "sat": 5, "saturday": 5, "sun": 6, "sunday": 6
-        }
-        if q in wk:
-            delta = (wk[q] - today.weekday()) % 7
-            if delta == 0:  # If it's today, use next week
-                delta = 7
+        weekday = WEEKDAY_INDEX.get(q)
+        if weekday is not None:
+            delta = (weekday - today.weekday() - 1) % 7 + 1  # 1..7: today's weekday means next week
             result = today + datetime.timedelta(days=delta)
-            self.logger.info(f"DATE_PARSING_DEBUG | matched weekday: {q} -> {result}")
+            logger.debug("DATE_PARSING_DEBUG | matched weekday: %s -> %s", q, result)
             return result
         
+        # ISO (YYYY-MM-DD) and numeric (MM/DD) inputs start with a digit; everything
+        # else ("next monday", "november 1st") skips the fromisoformat exception and regex
+        leading_digit = q[:1].isdigit()
+        
         # ISO format (YYYY-MM-DD)
-        try:
-            parsed_date = datetime.date.fromisoformat(q)
-            
-            # CRITICAL: If the date is from a past year (more than 1 year ago), it's likely wrong
-            # This handles cases where LLM generates old dates like "2023-10-04" when it's 2026
-            if parsed_date.year < today.year - 1:
-                self.logger.warning(f"DATE_PARSING_FIX | LLM provided old date '{q}' (year {parsed_date.year}), adjusting to current year {today.year}")
-                # Update to current year
-                parsed_date = datetime.date(today.year, parsed_date.month, parsed_date.day)
-                # If still in the past, move to next year
-                if parsed_date < today:
-                    parsed_date = datetime.date(today.year + 1, parsed_date.month, parsed_date.day)
-                    self.logger.info(f"DATE_PARSING_FIX | adjusted to next year: {parsed_date}")
-                else:
-                    self.logger.info(f"DATE_PARSING_FIX | adjusted to current year: {parsed_date}")
-            # If the parsed date is in the past (within last year), update to current year or next occurrence
-            elif parsed_date < today:
-                # If it's a different year, update to current year
-                if parsed_date.year < today.year:
+        if leading_digit:
+            try:
+                parsed_date = datetime.date.fromisoformat(q)
+            
+                # CRITICAL: If the date is from a past year (more than 1 year ago), it's likely wrong
+                # This handles cases where LLM generates old dates like "2023-10-04" when it's 2026
+                if parsed_date.year < today.year - 1:
+                    logger.warning(f"DATE_PARSING_FIX | LLM provided old date '{q}' (year {parsed_date.year}), adjusting to current year {today.year}")
+                    # Update to current year
                     parsed_date = datetime.date(today.year, parsed_date.month, parsed_date.day)
                     # If still in the past, move to next year
                     if parsed_date < today:
                         parsed_date = datetime.date(today.year + 1, parsed_date.month, parsed_date.day)
+                        logger.info(f"DATE_PARSING_FIX | adjusted to next year: {parsed_date}")
+                    else:
+                        logger.info(f"DATE_PARSING_FIX | adjusted to current year: {parsed_date}")
+                # If the parsed date is in the past (within last year), update to current year or next occurrence
+                elif parsed_date < today:
+                    # If it's a different year, update to current year
+                    if parsed_date.year < today.year:
+                        parsed_date = datetime.date(today.year, parsed_date.month, parsed_date.day)
+                        # If still in the past, move to next year
+                        if parsed_date < today:
+                            parsed_date = datetime.date(today.year + 1, parsed_date.month, parsed_date.day)
+                    else:
+                        # Same year but past date, move to next year
+                        parsed_date = datetime.date(today.year + 1, parsed_date.month, parsed_date.day)
+                    logger.debug("DATE_PARSING_DEBUG | matched ISO: %s -> %s (adjusted from past date)", q, parsed_date)
                 else:
-                    # Same year but past date, move to next year
-                    parsed_date = datetime.date(today.year + 1, parsed_date.month, parsed_date.day)
-                self.logger.info(f"DATE_PARSING_DEBUG | matched ISO: {q} -> {parsed_date} (adjusted from past date)")
-            else:
-                self.logger.info(f"DATE_PARSING_DEBUG | matched ISO: {q} -> {parsed_date}")
-            return parsed_date
-        except Exception:
-            pass
+                    logger.debug("DATE_PARSING_DEBUG | matched ISO: %s -> %s", q, parsed_date)
+                return parsed_date
+            except Exception:
+                pass
         
         # Numeric formats (MM/DD, DD/MM, MM-DD, DD-MM, MM DD, DD MM)
-        import re
-        m = re.match(r"^\s*(\d{1,2})[\/\-\s](\d{1,2})\s*$", q)
+        m = NUMERIC_DATE_RE.match(q) if leading_digit else None
         if m:
             a, b = int(m.group(1)), int(m.group(2))
             for (d, mo) in [(a, b), (b, a)]:
@@ -671,26 +761,21 @@ class UnifiedAgent(Agent):
                     parsed_date = datetime.date(today.year, mo, d)
                     if parsed_date < today:
                         parsed_date = datetime.date(today.year + 1, mo, d)
-                    self.logger.info(f"DATE_PARSING_DEBUG | matched numeric: {q} -> {parsed_date}")
+                    logger.debug("DATE_PARSING_DEBUG | matched numeric: %s -> %s", q, parsed_date)
                     return parsed_date
                 except Exception:
                     pass
         
         # Month name formats (November 1st, 1 November, Nov 1st, 1 Nov, etc.)
-        months = {m.lower(): i for i, m in enumerate(
-            ["January", "February", "March", "April", "May", "June", 
-             "July", "August", "September", "October", "November", "December"], 1)}
-        short = {k[:3]: v for k, v in months.items()}
-        
-        toks = re.split(r"\s+", q)
+        toks = WHITESPACE_RE.split(q)
         if len(toks) == 2:
             a, b = toks
             
             def tom(s): 
-                return months.get(s.lower()) or short.get(s[:3].lower())
+                return MONTH_INDEX.get(s.lower()) or MONTH_ABBR_INDEX.get(s[:3].lower())
             
             def clean_day(day_str):
-                return re.sub(r'(\d+)(st|nd|rd|th)', r'\1', day_str)
+                return ORDINAL_SUFFIX_RE.sub(r'\1', day_str)
             
             # Try "Day Month" format (e.g., "1 November", "1st Nov")
             try:
@@ -700,7 +785,7 @@ class UnifiedAgent(Agent):
                     parsed_date = datetime.date(today.year, mo, day)
                     if parsed_date < today:
                         parsed_date = datetime.date(today.year + 1, mo, day)
-                    self.logger.info(f"DATE_PARSING_DEBUG | matched day-month: {q} -> {parsed_date}")
+                    logger.debug("DATE_PARSING_DEBUG | matched day-month: %s -> %s", q, parsed_date)
                     return parsed_date
             except Exception:
                 pass
@@ -713,51 +798,42 @@ class UnifiedAgent(Agent):
                     parsed_date = datetime.date(today.year, mo, day)
                     if parsed_date < today:
                         parsed_date = datetime.date(today.year + 1, mo, day)
-                    self.logger.info(f"DATE_PARSING_DEBUG | matched month-day: {q} -> {parsed_date}")
+                    logger.debug("DATE_PARSING_DEBUG | matched month-day: %s -> %s", q, parsed_date)
                     return parsed_date
             except Exception:
                 pass
         
         # Handle ordinal words like "first", "second", "third"
-        ordinal_words = {
-            "first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5,
-            "sixth": 6, "seventh": 7, "eighth": 8, "ninth": 9, "tenth": 10,
-            "eleventh": 11, "twelfth": 12, "thirteenth": 13, "fourteenth": 14, "fifteenth": 15,
-            "sixteenth": 16, "seventeenth": 17, "eighteenth": 18, "nineteenth": 19, "twentieth": 20,
-            "twenty-first": 21, "twenty-second": 22, "twenty-third": 23, "twenty-fourth": 24, "twenty-fifth": 25,
-            "twenty-sixth": 26, "twenty-seventh": 27, "twenty-eighth": 28, "twenty-ninth": 29, "thirtieth": 30, "thirty-first": 31
-        }
-        
         if len(toks) == 2:
             a, b = toks
             
             # Try "Month Ordinal" format (e.g., "November first", "Nov second")
             try:
                 mo = tom(a)
-                ordinal_day = ordinal_words.get(b)
+                ordinal_day = ORDINAL_DAYS.get(b)
                 if mo and ordinal_day: 
                     parsed_date = datetime.date(today.year, mo, ordinal_day)
                     if parsed_date < today:
                         parsed_date = datetime.date(today.year + 1, mo, ordinal_day)
-                    self.logger.info(f"DATE_PARSING_DEBUG | matched month-ordinal: {q} -> {parsed_date}")
+                    logger.debug("DATE_PARSING_DEBUG | matched month-ordinal: %s -> %s", q, parsed_date)
                     return parsed_date
             except Exception:
                 pass
             
             # Try "Ordinal Month" format (e.g., "first November", "second Nov")
             try:
-                ordinal_day = ordinal_words.get(a)
+                ordinal_day = ORDINAL_DAYS.get(a)
                 mo = tom(b)
                 if ordinal_day and mo: 
                     parsed_date = datetime.date(today.year, mo, ordinal_day)
                     if parsed_date < today:
                         parsed_date = datetime.date(today.year + 1, mo, ordinal_day)
-                    self.logger.info(f"DATE_PARSING_DEBUG | matched ordinal-month: {q} -> {parsed_date}")
+                    logger.debug("DATE_PARSING_DEBUG | matched ordinal-month: %s -> %s", q, parsed_date)
                     return parsed_date
             except Exception:
                 pass
         
-        self.logger.warning(f"DATE_PARSING_DEBUG | no match found for: {q}")
+        logger.warning(f"DATE_PARSING_DEBUG | no match found for: {q}")
         return None
 
     @function_tool(name="list_slots_on_day")
@@ -775,10 +851,11 @@ class UnifiedAgent(Agent):
         if msg:
             return msg
         
-        self.logger.info(f"list_slots_on_day START | day={day} | calendar={self.calendar is not None}")
+        self.logger.info(f"list_slots_on_day START | day={day} | calendar={self.has_calendar}")
         
         try:
-            if not day or len(day.strip()) < 2:
+            day = (day or "").strip()
+            if len(day) < 2:
                 return "Please tell me the date you'd like to schedule your appointment."
             
             # Parse the date using comprehensive parser
@@ -786,8 +863,8 @@ class UnifiedAgent(Agent):
             if not parsed_date:
                 return "Please say the day like 'today', 'tomorrow', 'Friday', or '2026-01-21'."
             
-            # Get available slots from real calendar API
-            calendar_result = await self._get_available_slots(day, max_options)
+            # Get available slots from real calendar API (reusing the parsed date)
+            calendar_result = await self._get_available_slots(day, max_options, parsed_date=parsed_date)
             
             if calendar_result.is_calendar_unavailable:
                 return "I'm having trouble connecting to the calendar right now. Would you like me to try another day, or should I notify someone to help you?"
@@ -805,40 +882,29 @@ class UnifiedAgent(Agent):
                 self._slots_map[key] = slot
             
             # Get calendar timezone for display
-            display_tz = None
-            if self.calendar and hasattr(self.calendar, 'tz'):
-                display_tz = self.calendar.tz
-            else:
-                cal_timezone = os.getenv("CAL_TIMEZONE", "UTC")
-                try:
-                    display_tz = ZoneInfo(cal_timezone)
-                except Exception:
-                    display_tz = ZoneInfo("UTC")
+            display_tz = self._tz
             
-            # Only show first max_options to user for brevity
+            # Only show first max_options to user for brevity; format each slot
+            # and its numbered line in the same pass
             display_slots = all_slots[:max_options]
-            lines = []
             slot_strings = []
+            lines = [f"Available slots for {day}:"]
             for i, slot in enumerate(display_slots, 1):
-                local_time = slot.start_time.astimezone(display_tz)
-                formatted_time = local_time.strftime('%I:%M %p')
-                lines.append(f"{i}. {formatted_time}")
+                formatted_time = slot.start_time.astimezone(display_tz).strftime(TIME_FMT)
                 slot_strings.append(formatted_time)
-            
-            # Build response with total count information
-            response_parts = [f"Available slots for {day}:\n" + "\n".join(lines)]
+                lines.append(f"{i}. {formatted_time}")
             
             # Inform user if there are more slots available
             if len(all_slots) > max_options:
-                response_parts.append(f"\nI'm showing you {len(display_slots)} of {len(all_slots)} total available slots. You can choose any time slot from the list above, or ask me to show more options.")
+                lines.append(f"I'm showing you {len(display_slots)} of {len(all_slots)} total available slots. You can choose any time slot from the list above, or ask me to show more options.")
             
             # Store slots for selection (following sass-livekit pattern)
-            self.booking_state['available_slots'] = display_slots
-            self.booking_state['available_slot_strings'] = slot_strings
-            self.booking_state['date'] = parsed_date.strftime("%A, %B %d") if parsed_date else day
+            self.booking_state.available_slots = display_slots
+            self.booking_state.available_slot_strings = slot_strings
+            self.booking_state.date = parsed_date.strftime(DAY_FMT) if parsed_date else day
             
             self.logger.info(f"SLOTS_LISTED | total={len(all_slots)} | displayed={len(display_slots)} | day={day}")
-            return "".join(response_parts)
+            return "\n".join(lines)
             
         except asyncio.TimeoutError:
             self.logger.warning(f"list_slots_on_day TIMEOUT | day={day}")
@@ -855,12 +921,12 @@ class UnifiedAgent(Agent):
         # We'll return empty list here since the real slots are fetched in the main function
         return []
 
-    async def _get_available_slots(self, date_str: str, max_options: int = 6) -> CalendarResult:
+    async def _get_available_slots(self, date_str: str, max_options: int = 6, parsed_date: Optional[datetime.date] = None, today: Optional[datetime.date] = None) -> CalendarResult:
         """Get available slots from the real calendar API (following sass-livekit pattern)."""
         try:
-            self.logger.info(f"CALENDAR_SLOTS_DEBUG | Starting slots request for date: {date_str}")
+            self.logger.debug("CALENDAR_SLOTS_DEBUG | Starting slots request for date: %s", date_str)
             
-            if not self.calendar:
+            if not self.has_calendar:
                 self.logger.warning("CALENDAR_SLOTS_DEBUG | No calendar service available")
                 return CalendarResult(
                     slots=[],
@@ -871,22 +937,14 @@ class UnifiedAgent(Agent):
                     )
                 )
             
-            self.logger.info(f"CALENDAR_SLOTS_DEBUG | Calendar service available: {type(self.calendar)}")
+            self.logger.debug("CALENDAR_SLOTS_DEBUG | Calendar service available: %s", type(self.calendar))
             
             # Get timezone from calendar if available, otherwise use UTC
-            tz = None
-            if self.calendar and hasattr(self.calendar, 'tz'):
-                tz = self.calendar.tz
-            else:
-                # Try to get timezone from calendar config
-                cal_timezone = os.getenv("CAL_TIMEZONE", "UTC")
-                try:
-                    tz = ZoneInfo(cal_timezone)
-                except Exception:
-                    tz = ZoneInfo("UTC")
+            tz = self._tz
             
-            # Parse the date string (following sass-livekit pattern)
-            parsed_date = self._parse_day_comprehensive(date_str)
+            # Parse the date string unless the caller already did (following sass-livekit pattern)
+            if parsed_date is None:
+                parsed_date = self._parse_day_comprehensive(date_str, today=today)
             if not parsed_date:
                 self.logger.warning(f"CALENDAR_SLOTS_DEBUG | Failed to parse date: {date_str}")
                 return CalendarResult(
@@ -909,7 +967,7 @@ class UnifiedAgent(Agent):
             # Call the real calendar API with timezone-aware datetimes
             # The calendar API will handle timezone conversion internally
             # Add timeout like sass-livekit (2.5 seconds)
-            self.logger.info(f"CALENDAR_SLOTS_DEBUG | Calling calendar.list_available_slots...")
+            self.logger.debug("CALENDAR_SLOTS_DEBUG | Calling calendar.list_available_slots...")
             try:
                 result = await asyncio.wait_for(
                     self.calendar.list_available_slots(start_time=start_time, end_time=end_time),
@@ -948,22 +1006,18 @@ class UnifiedAgent(Agent):
 
     def _find_slot_by_time_string(self, time_str: str):
         """Find a slot by parsing a time string like '8am', '3:30pm', etc. (following sass-livekit pattern)."""
-        import re
-        
-        # Parse time string like "8am", "8:30am", "3pm", "10:00am", "12:00pm"
-        time_str = time_str.strip().lower().replace(" ", "")
-        
-        # Match patterns: 8am, 8:30am, 3:00pm, 10:15am
-        match = re.match(r"(\d{1,2})(?::(\d{2}))?(am|pm)", time_str)
+        # Parse time string like "8am", "8:30am", "3pm", "10:00am", "12:00 PM" in one
+        # case-insensitive pass that tolerates spaces (no strip/lower/replace copies)
+        match = TIME_STRING_RE.match(time_str)
         if not match:
             return None
         
         hour = int(match.group(1))
         minute = int(match.group(2) or "0")
-        period = match.group(3)
+        period = match.group(3).lower()
         
         # Convert to 24-hour format
-        if period == "am":
+        if period == "a":
             if hour == 12:
                 hour_24 = 0
             else:
@@ -978,15 +1032,7 @@ class UnifiedAgent(Agent):
         target_time = datetime.time(hour_24, minute)
         
         # Find matching slot in _slots_map
-        display_tz = None
-        if self.calendar and hasattr(self.calendar, 'tz'):
-            display_tz = self.calendar.tz
-        else:
-            cal_timezone = os.getenv("CAL_TIMEZONE", "UTC")
-            try:
-                display_tz = ZoneInfo(cal_timezone)
-            except Exception:
-                display_tz = ZoneInfo("UTC")
+        display_tz = self._tz
         
         for key, slot in self._slots_map.items():
             local_time = slot.start_time.astimezone(display_tz)
@@ -1017,29 +1063,21 @@ class UnifiedAgent(Agent):
         if not slot:
             return f"Option {option_id} isn't available. Say 'list slots' to refresh."
         
-        self.booking_state['selected_slot'] = slot
+        self.booking_state.selected_slot = slot
         self.logger.info(f"SLOT_SELECTED | option_id={option_id}")
         
         # Get calendar timezone for display
-        display_tz = None
-        if self.calendar and hasattr(self.calendar, 'tz'):
-            display_tz = self.calendar.tz
-        else:
-            cal_timezone = os.getenv("CAL_TIMEZONE", "UTC")
-            try:
-                display_tz = ZoneInfo(cal_timezone)
-            except Exception:
-                display_tz = ZoneInfo("UTC")
+        display_tz = self._tz
         
         local_time = slot.start_time.astimezone(display_tz)
-        formatted_time = local_time.strftime('%A, %B %d at %I:%M %p')
+        formatted_time = local_time.strftime(DAY_TIME_FMT)
         
         missing_fields = []
-        if not self.booking_state.get('name'):
+        if not self.booking_state.name:
             missing_fields.append("name")
-        if not self.booking_state.get('email'):
+        if not self.booking_state.email:
             missing_fields.append("email")
-        if not self.booking_state.get('phone'):
+        if not self.booking_state.phone:
             missing_fields.append("phone")
         
         if missing_fields:
@@ -1052,57 +1090,53 @@ class UnifiedAgent(Agent):
     async def _complete_booking(self) -> str:
         """Complete the booking process with all collected information (following sass-livekit pattern)."""
         try:
-            self.logger.info(f"_complete_booking CALLED | booking_state keys: {list(self.booking_state.keys())}")
-            self.logger.info(f"_complete_booking | has_selected_slot: {bool(self.booking_state.get('selected_slot'))} | has_name: {bool(self.booking_state.get('name'))} | has_email: {bool(self.booking_state.get('email'))} | has_phone: {bool(self.booking_state.get('phone'))}")
+            if self.logger.isEnabledFor(logging.INFO):
+                self.logger.info(
+                    "_complete_booking | has_selected_slot: %s | has_name: %s | has_email: %s | has_phone: %s",
+                    bool(self.booking_state.selected_slot), bool(self.booking_state.name),
+                    bool(self.booking_state.email), bool(self.booking_state.phone),
+                )
             
-            selected_slot = self.booking_state.get('selected_slot')
+            selected_slot = self.booking_state.selected_slot
             if not selected_slot:
                 self.logger.warning("_complete_booking FAILED | no selected slot")
                 return "No time slot selected. Please choose a time slot first."
             
             # Validate all required fields
-            if not self.booking_state.get('name'):
+            if not self.booking_state.name:
                 self.logger.warning("_complete_booking FAILED | missing name")
                 return "Missing name. Please provide your name."
-            if not self.booking_state.get('email'):
+            if not self.booking_state.email:
                 self.logger.warning("_complete_booking FAILED | missing email")
                 return "Missing email. Please provide your email."
-            if not self.booking_state.get('phone'):
+            if not self.booking_state.phone:
                 self.logger.warning("_complete_booking FAILED | missing phone")
                 return "Missing phone. Please provide your phone number."
             
             # Get calendar timezone for formatting
-            display_tz = None
-            if self.calendar and hasattr(self.calendar, 'tz'):
-                display_tz = self.calendar.tz
-            else:
-                cal_timezone = os.getenv("CAL_TIMEZONE", "UTC")
-                try:
-                    display_tz = ZoneInfo(cal_timezone)
-                except Exception:
-                    display_tz = ZoneInfo("UTC")
+            display_tz = self._tz
             
             # Format time from slot
             local_time = selected_slot.start_time.astimezone(display_tz)
-            formatted_time = local_time.strftime('%I:%M %p')
-            formatted_date = local_time.strftime('%A, %B %d')
+            formatted_time = local_time.strftime(TIME_FMT)
+            formatted_date = local_time.strftime(DAY_FMT)
             
             # All information collected, book the appointment
-            self.logger.info(f"APPOINTMENT_BOOKING | name={self.booking_state['name']} | email={self.booking_state['email']} | phone={self.booking_state['phone']} | date={formatted_date} | time={formatted_time}")
+            self.logger.info(f"APPOINTMENT_BOOKING | name={self.booking_state.name} | email={self.booking_state.email} | phone={self.booking_state.phone} | date={formatted_date} | time={formatted_time}")
             
             # Book the appointment using the real calendar API
-            if self.calendar:
+            if self.has_calendar:
                 try:
                     await self.calendar.schedule_appointment(
                         start_time=selected_slot.start_time,
-                        attendee_name=self.booking_state['name'],
-                        attendee_email=self.booking_state['email'],
-                        attendee_phone=self.booking_state['phone'],
-                        notes=self.booking_state.get('notes', '')
+                        attendee_name=self.booking_state.name,
+                        attendee_email=self.booking_state.email,
+                        attendee_phone=self.booking_state.phone,
+                        notes=self.booking_state.notes
                     )
                     
                     # Generate appointment ID
-                    appointment_id = f"apt_{int(datetime.datetime.now().timestamp())}"
+                    appointment_id = f"apt_{time.time_ns() // 1_000_000_000}"
                     
                     self.logger.info(f"BOOKING_SUCCESS | appointment scheduled successfully | id={appointment_id}")
                     
@@ -1116,36 +1150,24 @@ class UnifiedAgent(Agent):
                             "booking_details": {
                                 "date": formatted_date,
                                 "time": formatted_time,
-                                "name": self.booking_state['name'],
-                                "email": self.booking_state['email']
+                                "name": self.booking_state.name,
+                                "email": self.booking_state.email
                             }
                         }
                     ))
                     
-                    # Store email before resetting
-                    attendee_email = self.booking_state['email']
-                    
-                    # Reset booking state (following sass-livekit pattern)
-                    self.booking_state = {
-                        'name': None,
-                        'email': None,
-                        'phone': None,
-                        'date': None,
-                        'time': None,
-                        'selected_slot': None,
-                        'available_slots': [],
-                        'available_slot_strings': []
-                    }
+                    # Reset booking state (following sass-livekit pattern); keep the booked state for the reply
+                    booked, self.booking_state = self.booking_state, BookingState()
                     self._slots_map.clear()
                     
-                    return f"Perfect! I've successfully booked your appointment for {formatted_date} at {formatted_time}. Your appointment ID is {appointment_id}. You'll receive a confirmation email at {attendee_email}. Is there anything else I can help you with?"
+                    return f"Perfect! I've successfully booked your appointment for {formatted_date} at {formatted_time}. Your appointment ID is {appointment_id}. You'll receive a confirmation email at {booked.email}. Is there anything else I can help you with?"
                     
                 except Exception as booking_error:
                     self.logger.error(f"CALENDAR_BOOKING_ERROR | error={str(booking_error)}")
                     return f"I encountered an issue booking that appointment. The time slot may no longer be available. Let's try selecting a different time."
             else:
                 # Fallback to mock booking if calendar is not available
-                appointment_id = f"apt_{int(datetime.datetime.now().timestamp())}"
+                appointment_id = f"apt_{time.time_ns() // 1_000_000_000}"
                 
                 # Send outcome to backend (even for mock)
                 asyncio.create_task(self._send_outcome_to_backend(
@@ -1157,29 +1179,17 @@ class UnifiedAgent(Agent):
                         "booking_details": {
                             "date": formatted_date,
                             "time": formatted_time,
-                            "name": self.booking_state['name'],
-                            "email": self.booking_state['email']
+                            "name": self.booking_state.name,
+                            "email": self.booking_state.email
                         }
                     }
                 ))
                 
-                # Store email before resetting
-                attendee_email = self.booking_state['email']
-                
-                # Reset booking state
-                self.booking_state = {
-                    'name': None,
-                    'email': None,
-                    'phone': None,
-                    'date': None,
-                    'time': None,
-                    'selected_slot': None,
-                    'available_slots': [],
-                    'available_slot_strings': []
-                }
+                # Reset booking state; keep the booked state for the reply
+                booked, self.booking_state = self.booking_state, BookingState()
                 self._slots_map.clear()
                 
-                return f"Perfect! I've booked your appointment for {formatted_date} at {formatted_time}. Your appointment ID is {appointment_id}. We'll send you a confirmation email at {attendee_email}. Is there anything else I can help you with?"
+                return f"Perfect! I've booked your appointment for {formatted_date} at {formatted_time}. Your appointment ID is {appointment_id}. We'll send you a confirmation email at {booked.email}. Is there anything else I can help you with?"
             
         except Exception as e:
             self.logger.error(f"BOOKING_COMPLETION_ERROR | error={str(e)}")
@@ -1226,7 +1236,7 @@ class UnifiedAgent(Agent):
             
             # In a real implementation, you would store this data
             # For now, just log it
-            self.logger.info(f"DATA_COLLECTED | data={collected_data}")
+            self.logger.info("DATA_COLLECTED | data=%s", collected_data)
             
             return "Thank you for providing that information. I've noted it down."
             
@@ -1255,7 +1265,7 @@ class UnifiedAgent(Agent):
             }
             
             # In a real implementation, you would store this data
-            self.logger.info(f"CALL_OUTCOME_RECORDED | data={outcome_data}")
+            self.logger.info("CALL_OUTCOME_RECORDED | data=%s", outcome_data)
             
             # Send to backend
             asyncio.create_task(self._send_outcome_to_backend(
@@ -1284,7 +1294,7 @@ class UnifiedAgent(Agent):
         """
         try:
             # Import rag_service here to avoid circular imports
-            from services.rag_service import rag_service
+            from services.rag_service import rag_service, normalize_query
             
             self.logger.info(f"QUERYING_KNOWLEDGE_BASE | query={query}")
             
@@ -1295,12 +1305,23 @@ class UnifiedAgent(Agent):
                 self.logger.warning("KNOWLEDGE_BASE_NO_ID | No knowledge base ID available")
                 return "I don't have access to a knowledge base for this assistant."
             
-            # Get enhanced context from RAG service
-            context = await rag_service.get_enhanced_context(
-                knowledge_base_id=knowledge_base_id,
-                query=query,
-                max_context_length=4000
-            )
+            # Get enhanced context from RAG service, unless this call already asked the same question
+            key = (knowledge_base_id, normalize_query(query))
+            if key in self._kb_cache:
+                self._kb_cache.move_to_end(key)
+                context = self._kb_cache[key]
+                self.logger.info("KNOWLEDGE_BASE_CACHE_HIT | query=%s", query)
+            else:
+                context = await rag_service.get_enhanced_context(
+                    knowledge_base_id=knowledge_base_id,
+                    query=query,
+                    max_context_length=4000
+                )
+                # get_enhanced_context returns None on RAG timeouts/errors; only keep real answers
+                if context:
+                    self._kb_cache[key] = context
+                    if len(self._kb_cache) > KB_CACHE_MAX:
+                        self._kb_cache.popitem(last=False)
             
             if context:
                 self.logger.info(f"KNOWLEDGE_BASE_RESULTS | found context for query: {query[:50]}...")
@@ -1343,30 +1364,92 @@ class UnifiedAgent(Agent):
 
 # ========== EXISTING CLASSES ==========
 
-try:
-    from supabase import create_client, Client  # type: ignore
-except Exception:  # pragma: no cover
-    create_client = None  # type: ignore
-    Client = object  # type: ignore
-
 # Calendar integration (your module)
 from cal_calendar_api import Calendar, CalComCalendar, AvailableSlot, SlotUnavailableError
 
 # Enhanced services
 from config.settings import get_settings, Settings
-from services.enhanced_assistant import EnhancedAssistantService, AssistantConfig, CallData
-from services.rag_service import rag_service
-from services.recording_service import recording_service
+from utils.metadata import parse_metadata, metadata_agent_id, call_sid_from
+from utils.transcript import transcript_from_history
+from utils.vad import get_vad
+from utils.supabase_client import AGENT_CONFIG_TTL, get_supabase_client, resolve_agent_id_by_phone, fetch_agent_config
+from utils.call_batcher import get_call_insert_batcher
 
 logging.basicConfig(level=logging.INFO)
 
 # ===================== Utilities =====================
 
-def sha256_text(s: str) -> str:
-    return hashlib.sha256(s.encode("utf-8")).hexdigest()
+@functools.lru_cache(maxsize=512)
+def prompt_trace_hash(s: str) -> str:
+    # Fingerprint only (logging/caching), not a security boundary; BLAKE2b is
+    # faster than SHA-256 on multi-KB prompts and 128 bits is plenty for tracing
+    return hashlib.blake2b(s.encode("utf-8"), digest_size=16, usedforsecurity=False).hexdigest()
 
 def preview(s: str, n: int = 160) -> str:
-    return s[:n] + "..." if len(s) > n else s
+    return s if len(s) <= n else f"{s[:n]}..."
+
+UTC_TZ = ZoneInfo("UTC")
+
+@functools.lru_cache(maxsize=64)
+def zone_for(name: Optional[str]) -> ZoneInfo:
+    # Resolve an IANA name once per process; unknown/empty names fall back to UTC
+    try:
+        return ZoneInfo(name)
+    except Exception:
+        return UTC_TZ
+
+# Stand-in for a missing config dict; read-only so it can be shared safely
+EMPTY_MAPPING = MappingProxyType({})
+
+# Display names admins type into the openai_llm_model setting -> OpenAI model ids
+LLM_MODEL_ALIASES = MappingProxyType({
+    "GPT-4o Mini": "gpt-4o-mini",
+    "GPT-4o mini": "gpt-4o-mini",
+    "GPT-4o": "gpt-4o",
+    "GPT-4": "gpt-4",
+})
+
+# Appended to every agent prompt so the LLM knows what "today" and "tomorrow" mean
+DATE_CONTEXT_TEMPLATE = """
+
+IMPORTANT DATE CONTEXT:
+- Today is {today}
+- Tomorrow is {tomorrow}
+- Current year is {year}
+
+CRITICAL: When calling date-related functions (list_slots_on_day, provide_date):
+- If user says "tomorrow", pass "tomorrow" (NOT a specific date like "2026-01-21")
+- If user says "next Monday", pass "next Monday" (NOT a specific date)
+- If user says "January 21st", you can pass "January 21st" or "2026-01-21"
+- DO NOT convert relative dates like "tomorrow" to specific dates - the functions parse natural language automatically
+- Only convert to ISO format (YYYY-MM-DD) if the user explicitly provides a full date with year
+"""
+
+@functools.lru_cache(maxsize=8)
+def date_context_block(today: datetime.date) -> str:
+    """Render the date context block; it only changes once a day, whatever the prompt."""
+    return DATE_CONTEXT_TEMPLATE.format(
+        today=today.strftime("%A, %B %d, %Y"),
+        tomorrow=(today + datetime.timedelta(days=1)).strftime("%A, %B %d, %Y"),
+        year=today.year,
+    )
+
+@functools.lru_cache(maxsize=256)
+def with_date_context(instructions: str, today: datetime.date) -> str:
+    """
+    Append the date context block to an agent prompt.
+    Memoized per (prompt, day) so hot assistants reuse the built string.
+    """
+    return instructions + date_context_block(today)
+
+SUCCESS_OUTCOMES = frozenset({"Booked Appointment", "Qualified"})
+
+def classify_call(analysis: Any) -> Tuple[str, bool, str]:
+    """Return (outcome, success, notes) for a call from its outcome analysis."""
+    if analysis is None:
+        return "Qualified", False, "Call ended."
+    outcome = getattr(analysis, 'outcome', "Qualified")
+    return outcome, outcome in SUCCESS_OUTCOMES, getattr(analysis, 'reasoning', "Call ended.")
 
 def extract_phone_from_room(room_name: str) -> Optional[str]:
     """
@@ -1376,14 +1459,10 @@ def extract_phone_from_room(room_name: str) -> Optional[str]:
     if not room_name:
         return None
     
-    import re
     # Look for patterns like +17164194270
     # We find any sequence of 10+ digits with an optional + prefix
-    match = re.search(r'(\+?\d{10,15})', room_name)
-    if match:
-        return match.group(0)
-    
-    return None
+    match = ROOM_PHONE_RE.search(room_name)
+    return match.group(0) if match else None
 
 async def fetch_system_settings() -> Dict[str, Any]:
     """Fetch global system settings from Supabase."""
@@ -1391,20 +1470,14 @@ async def fetch_system_settings() -> Dict[str, Any]:
     settings = {}
     
     try:
-        supabase_url = os.getenv('SUPABASE_URL')
-        supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
-        
-        if not supabase_url or not supabase_key:
+        supabase = get_supabase_client()
+        if supabase is None:
             logger.warning("FETCH_SYSTEM_SETTINGS_SKIPPED | missing Supabase credentials")
             return settings
-            
-        from supabase import create_client
-        supabase = create_client(supabase_url, supabase_key)
         
-        def get_settings():
-            return supabase.table('system_settings').select('*').execute()
-            
-        result = await asyncio.to_thread(get_settings)
+        result = await asyncio.to_thread(
+            lambda: supabase.table('system_settings').select('*').execute()
+        )
         if result.data:
             for item in result.data:
                 settings[item['key']] = item['value']
@@ -1414,6 +1487,129 @@ async def fetch_system_settings() -> Dict[str, Any]:
         
     return settings
 
+# ===================== HTTP Session =====================
+
+BACKEND_HTTP_TIMEOUT = 10
+
+_http_session: Optional[aiohttp.ClientSession] = None
+
+async def get_http_session() -> aiohttp.ClientSession:
+    """Get or create the shared aiohttp session for backend calls."""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        timeout = aiohttp.ClientTimeout(total=BACKEND_HTTP_TIMEOUT)
+        _http_session = aiohttp.ClientSession(timeout=timeout)
+    return _http_session
+
+# ===================== OpenAI Client =====================
+
+# One keep-alive pool per API key for the whole job process, so each call's
+# LLM reuses warm TLS connections instead of opening its own. Clients are bound
+# to the event loop that created them (httpx pools cannot cross loops), so they
+# are built lazily on the running loop and closed when the job shuts down.
+_openai_clients: Dict[str, Tuple[asyncio.AbstractEventLoop, openai.AsyncClient]] = {}
+
+def get_openai_client(api_key: str) -> openai.AsyncClient:
+    """Get or create the shared OpenAI client for an API key on the running loop."""
+    loop = asyncio.get_running_loop()
+    entry = _openai_clients.get(api_key)
+    if entry is None or entry[0] is not loop:
+        # Same pool/timeouts the LiveKit OpenAI plugin uses for its own clients
+        client = openai.AsyncClient(
+            api_key=api_key,
+            max_retries=0,
+            http_client=httpx.AsyncClient(
+                timeout=httpx.Timeout(connect=15.0, read=5.0, write=5.0, pool=5.0),
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=50, keepalive_expiry=120),
+            ),
+        )
+        entry = _openai_clients[api_key] = (loop, client)
+    return entry[1]
+
+async def close_openai_clients() -> None:
+    """Close the shared OpenAI clients created on the running loop (job shutdown hook)."""
+    loop = asyncio.get_running_loop()
+    for api_key, (client_loop, client) in list(_openai_clients.items()):
+        if client_loop is loop:
+            del _openai_clients[api_key]
+            try:
+                await client.close()
+            except Exception as e:
+                logging.getLogger(__name__).warning(f"OPENAI_CLIENT_CLOSE_FAILED | error={str(e)}")
+
+# ===================== First Message Audio =====================
+
+# The greeting is the same text for every call to an agent, so its synthesized
+# audio is kept per (agent, TTS provider, text) and replayed on later calls,
+# skipping the TTS round-trip on the first turn. Entries expire with the agent
+# config TTL, so a changed voice/model is heard once the new config is read
+FIRST_MESSAGE_AUDIO_CACHE_MAX = 64
+
+_first_message_audio: "OrderedDict[Tuple[str, str, str], Tuple[float, Tuple[rtc.AudioFrame, ...]]]" = OrderedDict()
+
+# Strong references to in-flight synthesis tasks; the event loop only keeps weak ones
+_first_message_audio_tasks: "set[asyncio.Task[None]]" = set()
+
+def first_message_audio_key(agent_id: str, tts: Any, text: str) -> Tuple[str, str, str]:
+    return (agent_id, type(tts).__qualname__, text)
+
+def get_first_message_audio(key: Tuple[str, str, str]) -> Optional[Tuple[rtc.AudioFrame, ...]]:
+    entry = _first_message_audio.get(key)
+    if entry is None:
+        return None
+    if time.monotonic() - entry[0] >= AGENT_CONFIG_TTL:
+        del _first_message_audio[key]
+        return None
+    _first_message_audio.move_to_end(key)
+    return entry[1]
+
+async def cache_first_message_audio(key: Tuple[str, str, str], tts: Any, text: str) -> None:
+    """Synthesize the greeting once in the background and keep its frames (LRU)."""
+    logger = logging.getLogger(__name__)
+    try:
+        frames = []
+        async with tts.synthesize(text) as stream:
+            async for audio in stream:
+                frames.append(audio.frame)
+        if frames:
+            _first_message_audio[key] = (time.monotonic(), tuple(frames))
+            _first_message_audio.move_to_end(key)
+            while len(_first_message_audio) > FIRST_MESSAGE_AUDIO_CACHE_MAX:
+                _first_message_audio.popitem(last=False)
+    except Exception as e:
+        logger.warning(f"FIRST_MESSAGE_AUDIO_CACHE_FAILED | error={str(e)}")
+
+def schedule_first_message_audio(key: Tuple[str, str, str], tts: Any, text: str) -> None:
+    task = asyncio.create_task(cache_first_message_audio(key, tts, text))
+    _first_message_audio_tasks.add(task)
+    task.add_done_callback(_first_message_audio_tasks.discard)
+
+async def replay_audio(frames: Iterable[rtc.AudioFrame]):
+    for frame in frames:
+        yield frame
+
+# ===================== Call History Batching =====================
+
+# Full `calls` row shape with defaults; a bulk insert needs every row to carry the same keys
+CALL_ROW_TEMPLATE: Dict[str, Any] = {
+    "agent_id": None,  # Use agent_id, not assistant_id
+    "user_id": None,  # Can be None for web calls
+    "status": "completed",  # Use status, not call_status
+    "contact_name": "Voice Call",  # Default for web calls
+    "contact_phone": None,
+    "duration_seconds": 0,  # Use duration_seconds, not call_duration
+    "outcome": "completed",
+    "notes": None,
+    "started_at": None,  # Use started_at, not start_time
+    "ended_at": None,  # Use ended_at, not end_time
+    "success": False,  # Use success (bool), not success_evaluation
+    "transcription": None,
+    "call_sid": None,
+    "call_type": "inbound",
+}
+
+
 # ===================== Main Entry Point =====================
 
 
@@ -1425,11 +1621,16 @@ def create_agent(instructions: Optional[str] = None, first_message: Optional[str
     """
     logger = logging.getLogger(__name__)
     
+    # Read every agent_data field once; a frozen empty mapping stands in when there is none
+    agent_data = agent_data or EMPTY_MAPPING
+    agent_elevenlabs_api_key = agent_data.get("elevenlabs_api_key")
+    agent_cal_api_key = agent_data.get('cal_api_key')
+    
     # Get instructions - use provided or from environment
-    instructions = instructions or os.getenv("AGENT_INSTRUCTIONS", "You are a helpful assistant. You can help users book appointments and answer questions.")
-    first_message = first_message or os.getenv("AGENT_FIRST_MESSAGE", None)
-    sms_prompt = sms_prompt or os.getenv("AGENT_SMS_PROMPT", None)
-    knowledge_base_id = knowledge_base_id or os.getenv("KNOWLEDGE_BASE_ID", None)
+    instructions = instructions or CFG.agent_instructions
+    first_message = first_message or CFG.agent_first_message
+    sms_prompt = sms_prompt or CFG.agent_sms_prompt
+    knowledge_base_id = knowledge_base_id or CFG.knowledge_base_id
     
     # If agent_data is provided, it takes precedence over environment
     if agent_data:
@@ -1440,46 +1641,25 @@ def create_agent(instructions: Optional[str] = None, first_message: Optional[str
     
     # Add current date context to instructions so LLM knows what "today" and "tomorrow" mean
     # Get timezone from calendar config or default to UTC
-    cal_timezone = (agent_data.get('cal_timezone') if agent_data else None) or os.getenv("CAL_TIMEZONE", "UTC")
-    try:
-        tz = ZoneInfo(cal_timezone)
-    except Exception:
-        tz = ZoneInfo("UTC")
+    cal_timezone = agent_data.get('cal_timezone') or CFG.cal_timezone
+    tz = zone_for(cal_timezone)
     
-    current_date = datetime.datetime.now(tz)
-    current_date_str = current_date.strftime("%A, %B %d, %Y")
-    tomorrow_date_str = (current_date + datetime.timedelta(days=1)).strftime("%A, %B %d, %Y")
-    
-    # Append date context to instructions
-    date_context = f"""
-
-IMPORTANT DATE CONTEXT:
-- Today is {current_date_str}
-- Tomorrow is {tomorrow_date_str}
-- Current year is {current_date.year}
-
-CRITICAL: When calling date-related functions (list_slots_on_day, provide_date):
-- If user says "tomorrow", pass "tomorrow" (NOT a specific date like "2026-01-21")
-- If user says "next Monday", pass "next Monday" (NOT a specific date)
-- If user says "January 21st", you can pass "January 21st" or "2026-01-21"
-- DO NOT convert relative dates like "tomorrow" to specific dates - the functions parse natural language automatically
-- Only convert to ISO format (YYYY-MM-DD) if the user explicitly provides a full date with year
-"""
-    instructions = instructions + date_context
+    instructions = with_date_context(instructions, datetime.datetime.now(tz).date())
     
     # Initialize TTS and STT
-    system_settings = system_settings or {}
+    system_settings = system_settings or EMPTY_MAPPING
     
     # Get API keys with fallback: system_settings (from DB) -> environment variables
-    openai_api_key = system_settings.get("openai_api_key") or os.getenv("OPENAI_API_KEY")
-    deepgram_api_key = system_settings.get("deepgram_api_key") or os.getenv("DEEPGRAM_API_KEY")
+    openai_api_key = system_settings.get("openai_api_key") or CFG.openai_api_key
+    deepgram_api_key = system_settings.get("deepgram_api_key") or CFG.deepgram_api_key
     # Cascading fallback: Agent Settings -> Admin Dashboard (DB) -> Environment Variable (.env)
-    elevenlabs_api_key = (agent_data.get("elevenlabs_api_key") if agent_data else None) or \
+    elevenlabs_api_key = agent_elevenlabs_api_key or \
                          system_settings.get("elevenlabs_api_key") or \
-                         os.getenv("ELEVENLABS_API_KEY")
+                         CFG.elevenlabs_api_key
     
     # Get LLM model with fallback
-    llm_model = system_settings.get("openai_llm_model") or os.getenv("OPENAI_LLM_MODEL", "gpt-4o-mini")
+    llm_model = system_settings.get("openai_llm_model") or CFG.openai_llm_model
+    llm_model = LLM_MODEL_ALIASES.get(llm_model, llm_model)
     
     # Validate API keys are set
     if not elevenlabs_api_key and not deepgram_api_key and not openai_api_key:
@@ -1501,7 +1681,7 @@ CRITICAL: When calling date-related functions (list_slots_on_day, provide_date):
             tts = elevenlabs.TTS(api_key=elevenlabs_api_key)
             tts_provider = "elevenlabs"
             tts_model = "eleven_monolingual_v1"
-            key_source = "agent" if agent_data and agent_data.get("elevenlabs_api_key") else \
+            key_source = "agent" if agent_elevenlabs_api_key else \
                          "db" if system_settings.get("elevenlabs_api_key") else "env"
             logger.info(f"ELEVENLABS_TTS_CONFIGURED | source={key_source} | voice_id=Rachel")
         except Exception as e:
@@ -1546,21 +1726,25 @@ CRITICAL: When calling date-related functions (list_slots_on_day, provide_date):
             "Note: The API key must have 'model.request' scope enabled. "
             "Check your OpenAI API key permissions at https://platform.openai.com/api-keys"
         )
-    llm = lk_openai.LLM(model=llm_model, api_key=openai_api_key)
+    llm = lk_openai.LLM(model=llm_model, client=get_openai_client(openai_api_key))
     logger.info(f"OPENAI_LLM_CONFIGURED | model={llm_model} | provider={'db' if system_settings.get('openai_api_key') else 'env'}")
     
     logger.info(f"TTS_STT_LLM_CONFIGURED | tts_provider={tts_provider} | tts_model={tts_model} | stt_provider={stt_provider} | stt_model={stt_model} | llm_model={llm_model}")
     
     # Initialize calendar if configured
     calendar = None
-    cal_api_key = (agent_data.get('cal_api_key') if agent_data else None) or os.getenv("CAL_API_KEY")
-    cal_event_type_id = (agent_data.get('cal_event_type_id') if agent_data else None) or os.getenv("CAL_EVENT_TYPE_ID")
-    cal_timezone = (agent_data.get('cal_timezone') if agent_data else None) or os.getenv("CAL_TIMEZONE", "UTC")
-    cal_event_type_slug = (agent_data.get('cal_event_type_slug') if agent_data else None) or os.getenv("CAL_EVENT_TYPE_SLUG")
+    # cal_timezone was resolved above for the date context
+    cal_api_key = agent_cal_api_key or CFG.cal_api_key
+    cal_event_type_id = agent_data.get('cal_event_type_id') or CFG.cal_event_type_id
+    cal_event_type_slug = agent_data.get('cal_event_type_slug') or CFG.cal_event_type_slug
     
     if cal_api_key and cal_event_type_id:
         try:
-            logger.info(f"CALENDAR_CONFIG | from_db={bool(agent_data and agent_data.get('cal_api_key'))} | api_key={'***' if cal_api_key else None} | event_type_id={cal_event_type_id} | timezone={cal_timezone}")
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(
+                    "CALENDAR_CONFIG | from_db=%s | api_key=*** | event_type_id=%s | timezone=%s",
+                    bool(agent_cal_api_key), cal_event_type_id, cal_timezone,
+                )
             calendar = CalComCalendar(
                 api_key=cal_api_key,
                 timezone=cal_timezone,
@@ -1570,8 +1754,13 @@ CRITICAL: When calling date-related functions (list_slots_on_day, provide_date):
         except Exception as e:
             logger.error(f"Failed to create calendar instance: {e}")
             calendar = None
+    has_calendar = calendar is not None
     
-    logger.info(f"CREATING_UNIFIED_AGENT | instructions_length={len(instructions)} | has_first_message={bool(first_message)} | knowledge_base_id={knowledge_base_id} | calendar_configured={calendar is not None}")
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(
+            "CREATING_UNIFIED_AGENT | instructions_length=%d | prompt_hash=%s | has_first_message=%s | knowledge_base_id=%s | calendar_configured=%s",
+            len(instructions), prompt_trace_hash(instructions), bool(first_message), knowledge_base_id, has_calendar,
+        )
     
     return UnifiedAgent(
         instructions=instructions,
@@ -1591,48 +1780,47 @@ async def entrypoint(ctx: JobContext):
     """
     logger = logging.getLogger(__name__)
     logger.info(f"ENTRYPOINT_CALLED | job_id={ctx.job.id} | room={ctx.room.name}")
+    ctx.add_shutdown_callback(close_openai_clients)
     
     try:
         # Connect to the room first
         await ctx.connect(auto_subscribe=agents.AutoSubscribe.AUDIO_ONLY)
         logger.info(f"CONNECTED_TO_ROOM | room={ctx.room.name}")
         
+        # Parse job/room metadata once; reused for call type, agent id, phone and call SID
+        job_metadata = parse_metadata(ctx.job.metadata)
+        room_metadata = parse_metadata(ctx.room.metadata)
+        
         # Determine call type
         call_type = "inbound"  # default
         room_name = ctx.room.name.lower()
         
         # Check job metadata first (most reliable for web calls)
-        if ctx.job.metadata:
-            try:
-                job_metadata = json.loads(ctx.job.metadata)
-                # Check for various web call indicators
-                if (job_metadata.get("source") == "web" or 
-                    job_metadata.get("callType") == "web" or 
-                    job_metadata.get("callType") == "webcall" or
-                    job_metadata.get("callType") == "livekit" or  # LiveKit web calls use 'livekit'
-                    job_metadata.get("webcall") == True or
-                    job_metadata.get("webcall") == "true" or
-                    job_metadata.get("webcall") is True):
-                    call_type = "web"
-                elif job_metadata.get("source") == "outbound" or job_metadata.get("callType") == "outbound":
-                    call_type = "outbound"
-                logger.info(f"JOB_METADATA_CHECK | metadata={job_metadata} | detected_call_type={call_type}")
-            except (json.JSONDecodeError, KeyError) as e:
-                logger.debug(f"JOB_METADATA_PARSE_ERROR | error={e}")
+        if job_metadata:
+            # Check for various web call indicators
+            if (job_metadata.get("source") == "web" or 
+                job_metadata.get("callType") == "web" or 
+                job_metadata.get("callType") == "webcall" or
+                job_metadata.get("callType") == "livekit" or  # LiveKit web calls use 'livekit'
+                job_metadata.get("webcall") == True or
+                job_metadata.get("webcall") == "true" or
+                job_metadata.get("webcall") is True):
+                call_type = "web"
+            elif job_metadata.get("source") == "outbound" or job_metadata.get("callType") == "outbound":
+                call_type = "outbound"
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("JOB_METADATA_CHECK | metadata=%s | detected_call_type=%s", job_metadata, call_type)
         
         # Check room metadata for call type
-        if ctx.room.metadata:
-            try:
-                room_metadata = json.loads(ctx.room.metadata)
-                if (room_metadata.get("source") == "web" or 
-                    room_metadata.get("callType") == "web" or
-                    room_metadata.get("callType") == "webcall"):
-                    call_type = "web"
-                elif room_metadata.get("source") == "outbound" or room_metadata.get("callType") == "outbound":
-                    call_type = "outbound"
-                logger.info(f"ROOM_METADATA_CHECK | metadata={room_metadata} | detected_call_type={call_type}")
-            except (json.JSONDecodeError, KeyError) as e:
-                logger.debug(f"ROOM_METADATA_PARSE_ERROR | error={e}")
+        if room_metadata:
+            if (room_metadata.get("source") == "web" or 
+                room_metadata.get("callType") == "web" or
+                room_metadata.get("callType") == "webcall"):
+                call_type = "web"
+            elif room_metadata.get("source") == "outbound" or room_metadata.get("callType") == "outbound":
+                call_type = "outbound"
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("ROOM_METADATA_CHECK | metadata=%s | detected_call_type=%s", room_metadata, call_type)
         
         # Fall back to room name patterns (least reliable)
         if call_type == "inbound":  # Only use name patterns if we haven't determined type yet
@@ -1646,19 +1834,21 @@ async def entrypoint(ctx: JobContext):
                 call_type = "web"
                 logger.info(f"ROOM_NAME_PATTERN_DETECTED | room_name={ctx.room.name} | detected_as_web_call")
         
-        logger.info(f"CALL_TYPE_DETERMINED | call_type={call_type} | room={ctx.room.name} | job_metadata={ctx.job.metadata} | room_metadata={ctx.room.metadata}")
+        logger.info(
+            "CALL_TYPE_DETERMINED | call_type=%s | room=%s | job_metadata=%s | room_metadata=%s",
+            call_type, ctx.room.name, ctx.job.metadata, ctx.room.metadata,
+        )
         
         # Prepare agent configuration
         agent_id = None
         agent_data = None
         
+        # System settings don't depend on the agent, so fetch them while the agent
+        # is resolved below (fetch_system_settings never raises)
+        system_settings_task = asyncio.create_task(fetch_system_settings())
+        
         # 1. Try to get agent_id from job metadata
-        if ctx.job.metadata:
-            try:
-                job_metadata = json.loads(ctx.job.metadata)
-                agent_id = job_metadata.get('agentId') or job_metadata.get('assistantId')
-            except:
-                pass
+        agent_id = metadata_agent_id(job_metadata)
         
         # 2. If no agent_id, try to resolve by phone number (for inbound phone calls)
         if not agent_id and call_type != "web":
@@ -1666,62 +1856,38 @@ async def entrypoint(ctx: JobContext):
                 called_phone = None
                 
                 # Check job metadata for phone number (following sass-livekit pattern)
-                if ctx.job.metadata:
-                    try:
-                        job_metadata = json.loads(ctx.job.metadata)
-                        called_phone = (job_metadata.get("called_number") or 
-                                       job_metadata.get("to_number") or 
-                                       job_metadata.get("phoneNumber"))
-                        if called_phone:
-                            logger.info(f"PHONE_FROM_METADATA | phone={called_phone}")
-                    except:
-                        pass
+                called_phone = (job_metadata.get("called_number") or 
+                               job_metadata.get("to_number") or 
+                               job_metadata.get("phoneNumber"))
+                if called_phone:
+                    logger.info(f"PHONE_FROM_METADATA | phone={called_phone}")
                 
                 # If not in metadata, extract from room name
                 if not called_phone:
                     called_phone = extract_phone_from_room(ctx.room.name)
                 
-                if called_phone:
+                supabase = get_supabase_client()
+                if called_phone and supabase is not None:
                     logger.info(f"LOOKING_UP_AGENT_BY_PHONE | phone={called_phone}")
                     # Look up in phone_number table
-                    supabase_url = os.getenv('SUPABASE_URL')
-                    supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
-                    if supabase_url and supabase_key:
-                        from supabase import create_client
-                        supabase = create_client(supabase_url, supabase_key)
-                        
-                        def lookup_phone():
-                            return supabase.table('phone_number').select('inbound_assistant_id').eq('number', called_phone).execute()
-                        
-                        phone_result = await asyncio.to_thread(lookup_phone)
-                        if phone_result.data:
-                            agent_id = phone_result.data[0].get('inbound_assistant_id')
-                            logger.info(f"AGENT_RESOLVED_FROM_PHONE | phone={called_phone} | agent_id={agent_id}")
+                    agent_id = await resolve_agent_id_by_phone(supabase, called_phone)
+                    if agent_id:
+                        logger.info(f"AGENT_RESOLVED_FROM_PHONE | phone={called_phone} | agent_id={agent_id}")
             except Exception as e:
                 logger.error(f"FAILED_TO_RESOLVE_AGENT_BY_PHONE | error={str(e)}")
 
         # 3. Fetch full agent configuration from Supabase if we have an agent_id
         if agent_id:
             try:
-                supabase_url = os.getenv('SUPABASE_URL')
-                supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
-                
-                if supabase_url and supabase_key:
-                    from supabase import create_client
-                    supabase = create_client(supabase_url, supabase_key)
-                    
-                    def fetch_agent_config():
-                        return supabase.table('agents').select('*').eq('id', agent_id).single().execute()
-                    
-                    agent_result = await asyncio.to_thread(fetch_agent_config)
-                    if agent_result.data:
-                        agent_data = agent_result.data
-                        logger.info(f"AGENT_CONFIG_FETCHED | agent_id={agent_id} | name={agent_data.get('name')}")
+                supabase = get_supabase_client()
+                agent_data = await fetch_agent_config(supabase, agent_id) if supabase is not None else None
+                if agent_data:
+                    logger.info(f"AGENT_CONFIG_FETCHED | agent_id={agent_id} | name={agent_data.get('name')}")
             except Exception as e:
                 logger.error(f"FAILED_TO_LOAD_AGENT_CONFIG | agent_id={agent_id} | error={str(e)}")
 
-        # 4. Fetch system settings (global API keys)
-        system_settings = await fetch_system_settings()
+        # 4. System settings (global API keys), fetched concurrently since step 1
+        system_settings = await system_settings_task
 
         # Create the agent instance with resolved config
         agent = create_agent(agent_data=agent_data, system_settings=system_settings)
@@ -1742,9 +1908,9 @@ async def entrypoint(ctx: JobContext):
 
         
         # Get API keys for session components
-        openai_api_key = system_settings.get("openai_api_key") or os.getenv("OPENAI_API_KEY")
-        deepgram_api_key = system_settings.get("deepgram_api_key") or os.getenv("DEEPGRAM_API_KEY")
-        elevenlabs_api_key = system_settings.get("elevenlabs_api_key") or os.getenv("ELEVENLABS_API_KEY")
+        openai_api_key = system_settings.get("openai_api_key") or CFG.openai_api_key
+        deepgram_api_key = system_settings.get("deepgram_api_key") or CFG.deepgram_api_key
+        elevenlabs_api_key = system_settings.get("elevenlabs_api_key") or CFG.elevenlabs_api_key
 
         
         # Create TTS instance - use same provider as agent
@@ -1784,12 +1950,21 @@ async def entrypoint(ctx: JobContext):
                 "Check your OpenAI API key permissions at https://platform.openai.com/api-keys"
             )
         
-        llm_model = os.getenv("OPENAI_LLM_MODEL", "gpt-4o-mini")
-        session_llm = lk_openai.LLM(model=llm_model, api_key=openai_api_key)
+        llm_model = LLM_MODEL_ALIASES.get(CFG.openai_llm_model, CFG.openai_llm_model)
+        session_llm = lk_openai.LLM(model=llm_model, client=get_openai_client(openai_api_key))
         logger.info(f"SESSION_OPENAI_LLM_CONFIGURED | model={llm_model} | Note: API key must have 'model.request' scope")
         
+        # VAD is loaded once per worker process in prewarm(); loading it here
+        # would cost a model load per call
+        vad = ctx.proc.userdata.get("vad") if use_vad else None
+        if use_vad and vad is None:
+            logger.warning("VAD_NOT_PREWARMED | loading per-call instance")
+            # ONNX model load is blocking I/O; keep it off the event loop shared with other sessions
+            vad = await asyncio.to_thread(get_vad)
+            ctx.proc.userdata["vad"] = vad
+        
         session = AgentSession(
-            vad=silero.VAD.load() if use_vad else None,  # VAD recommended for better interruption handling
+            vad=vad,  # VAD recommended for better interruption handling
             stt=session_stt,
             llm=session_llm,
             tts=session_tts,
@@ -1814,13 +1989,24 @@ async def entrypoint(ctx: JobContext):
         # Trigger first message immediately if configured (following sass-livekit pattern)
         # We do this BEFORE waiting for participant to reduce perceived latency
         first_message = agent.first_message or "Hello! I'm your AI assistant. How can I help you today?"
-        force_first = os.getenv("FORCE_FIRST_MESSAGE", "true").lower() != "false"
+        force_first = CFG.force_first_message
         
         if force_first and first_message:
-            logger.info(f"SENDING_FIRST_MESSAGE | message='{first_message[:60]}{'...' if len(first_message) > 60 else ''}'")
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("SENDING_FIRST_MESSAGE | message='%s'", preview(first_message, 60))
             try:
-                await session.say(first_message)
-                logger.info("FIRST_MESSAGE_SENT")
+                # Without an agent id there is no stable key to share the greeting audio under
+                greeting_tts = agent.tts if CFG.cache_first_message_audio and agent_id else None
+                audio_key = first_message_audio_key(agent_id, greeting_tts, first_message) if greeting_tts else None
+                cached_audio = get_first_message_audio(audio_key) if audio_key else None
+                if cached_audio is not None:
+                    await session.say(first_message, audio=replay_audio(cached_audio))
+                    logger.info("FIRST_MESSAGE_SENT | audio=cached")
+                else:
+                    await session.say(first_message)
+                    logger.info("FIRST_MESSAGE_SENT")
+                    if audio_key:
+                        schedule_first_message_audio(audio_key, greeting_tts, first_message)
             except Exception as msg_error:
                 logger.error(f"FIRST_MESSAGE_ERROR | error={str(msg_error)}")
         
@@ -1834,7 +2020,7 @@ async def entrypoint(ctx: JobContext):
                 logger.info(f"WEB_PARTICIPANT_ALREADY_CONNECTED | participant_id={participant.identity}")
             else:
                 # Wait for participant to connect (with longer timeout for web calls)
-                participant_timeout = float(os.getenv("WEB_PARTICIPANT_TIMEOUT_SECONDS", "60.0"))
+                participant_timeout = CFG.web_participant_timeout
                 try:
                     logger.info(f"WEB_WAITING_FOR_PARTICIPANT | room={ctx.room.name} | timeout={participant_timeout}s")
                     participant = await asyncio.wait_for(
@@ -1881,7 +2067,7 @@ async def entrypoint(ctx: JobContext):
                 logger.info(f"PHONE_PARTICIPANT_ALREADY_CONNECTED | participant_id={participant.identity}")
             else:
                 # Wait for participant (phone calls)
-                participant_timeout = float(os.getenv("PARTICIPANT_TIMEOUT_SECONDS", "35.0"))
+                participant_timeout = CFG.participant_timeout
                 try:
                     participant = await asyncio.wait_for(
                         ctx.wait_for_participant(),
@@ -1892,8 +2078,10 @@ async def entrypoint(ctx: JobContext):
                     logger.error(f"PARTICIPANT_TIMEOUT | room={ctx.room.name} | timeout={participant_timeout}s")
                     return
         
-        # Track start time for duration calculation (before shutdown callback)
+        # Track start time for duration calculation (before shutdown callback).
+        # Duration comes from the monotonic clock so wall-clock adjustments can't skew it
         start_time = datetime.datetime.now()
+        start_monotonic = time.monotonic()
         
         async def save_call_on_shutdown():
             """
@@ -1901,8 +2089,9 @@ async def entrypoint(ctx: JobContext):
             This runs when the user disconnects or the room closes.
             """
             try:
-                end_time = datetime.datetime.now()
-                call_duration = int((end_time - start_time).total_seconds())
+                elapsed = time.monotonic() - start_monotonic
+                end_time = start_time + datetime.timedelta(seconds=elapsed)
+                call_duration = int(elapsed)
                 
                 logger.info(f"SHUTDOWN_CALLBACK | analyzing call outcome | room={ctx.room.name} | duration={call_duration}s")
                 
@@ -1912,31 +2101,42 @@ async def entrypoint(ctx: JobContext):
                     # Try to get transcript from the authoritative source (like sass-livekit)
                     if hasattr(session, 'transcript') and session.transcript:
                         if hasattr(session.transcript, 'to_dict'):
-                            transcript_dict = session.transcript.to_dict()
-                            session_history = transcript_dict.get("items", [])
+                            # Serialize off the event loop (long calls have hundreds of items), then
+                            # take the items list out and drop the rest of the dict right away
+                            transcript_dict = await asyncio.to_thread(session.transcript.to_dict)
+                            session_history = transcript_dict.pop("items", [])
                             logger.info(f"TRANSCRIPT_FROM_SESSION | items={len(session_history)}")
                         else:
                             # Fallback: try iterating
-                            for event in session.transcript:
-                                if hasattr(event, 'role') and hasattr(event, 'content'):
-                                    session_history.append({
-                                        'role': str(event.role),
-                                        'content': str(event.content)
-                                    })
+                            session_history = [
+                                {'role': str(event.role), 'content': str(event.content)}
+                                for event in session.transcript
+                                if hasattr(event, 'role') and hasattr(event, 'content')
+                            ]
                             logger.info(f"TRANSCRIPT_FROM_ITERATION | items={len(session_history)}")
                     elif hasattr(session, 'history') and session.history:
-                        if hasattr(session.history, 'to_dict'):
-                            history_dict = session.history.to_dict()
-                            session_history = history_dict.get("items", [])
+                        history_items = getattr(session.history, 'items', None)
+                        if isinstance(history_items, list):
+                            # Read chat messages straight off the ChatContext instead of
+                            # serializing every item (tool calls included) with to_dict();
+                            # only text parts are kept, as to_dict() drops images/audio
+                            session_history = [
+                                {'role': item.role, 'content': [c for c in item.content if isinstance(c, str)]}
+                                for item in history_items
+                                if getattr(item, 'type', None) == 'message'
+                            ]
+                            logger.info(f"HISTORY_FROM_ITEMS | items={len(session_history)}")
+                        elif hasattr(session.history, 'to_dict'):
+                            history_dict = await asyncio.to_thread(session.history.to_dict)
+                            session_history = history_dict.pop("items", [])
                             logger.info(f"HISTORY_FROM_SESSION | items={len(session_history)}")
                         else:
                             # Fallback: try iterating
-                            for message in session.history:
-                                if hasattr(message, 'role') and hasattr(message, 'content'):
-                                    session_history.append({
-                                        'role': str(message.role),
-                                        'content': str(message.content)
-                                    })
+                            session_history = [
+                                {'role': str(message.role), 'content': str(message.content)}
+                                for message in session.history
+                                if hasattr(message, 'role') and hasattr(message, 'content')
+                            ]
                             logger.info(f"HISTORY_FROM_ITERATION | items={len(session_history)}")
                     else:
                         logger.warning("NO_SESSION_TRANSCRIPT_AVAILABLE")
@@ -1945,26 +2145,8 @@ async def entrypoint(ctx: JobContext):
                     session_history = []
                 
                 # Process session_history into transcription format (like sass-livekit)
-                session_transcript = []
-                for item in session_history:
-                    if isinstance(item, dict) and "role" in item and "content" in item:
-                        content = item["content"]
-                        # Handle different content formats
-                        if isinstance(content, list):
-                            content_parts = []
-                            for c in content:
-                                if c and str(c).strip():
-                                    content_parts.append(str(c).strip())
-                            content = " ".join(content_parts)
-                        elif not isinstance(content, str):
-                            content = str(content)
-                        
-                        # Only add non-empty content
-                        if content and content.strip():
-                            session_transcript.append({
-                                "role": item["role"],
-                                "content": content.strip()
-                            })
+                # Only items with non-empty content are kept
+                session_transcript = transcript_from_history(session_history)
                 
                 logger.info(f"TRANSCRIPTION_PREPARED | session_items={len(session_history)} | transcription_items={len(session_transcript)}")
                 
@@ -1979,15 +2161,13 @@ async def entrypoint(ctx: JobContext):
                 except Exception as analysis_error:
                     logger.error(f"CALL_ANALYSIS_ERROR | error={str(analysis_error)}")
                 
-                outcome = "Qualified"
-                success = False
-                notes = "Call ended."
+                outcome, success, notes = classify_call(analysis)
                 
                 if analysis:
-                    outcome = analysis.outcome if hasattr(analysis, 'outcome') else "Qualified"
-                    success = (outcome == "Booked Appointment" or outcome == "Qualified")
-                    notes = analysis.reasoning if hasattr(analysis, 'reasoning') else "Call ended."
-                    logger.info(f"CALL_ANALYSIS_RESULT | outcome={outcome} | success={success} | confidence={analysis.confidence if hasattr(analysis, 'confidence') else 'N/A'}")
+                    logger.info(
+                        "CALL_ANALYSIS_RESULT | outcome=%s | success=%s | confidence=%s",
+                        outcome, success, getattr(analysis, 'confidence', 'N/A'),
+                    )
                 else:
                     logger.warning("CALL_ANALYSIS_FAILED | using default outcome")
                 
@@ -2001,18 +2181,8 @@ async def entrypoint(ctx: JobContext):
                         identity = participant.identity
                         if identity and (identity.startswith('+') or any(c.isdigit() for c in identity)):
                             extracted_phone = identity
-                        
-                        # Try to get SIP attributes
-                        if hasattr(participant, 'attributes') and participant.attributes:
-                            extracted_sid = participant.attributes.get('sip.twilio.callSid')
                     
-                    # Fallback for SID from room metadata
-                    if not extracted_sid and ctx.room.metadata:
-                        try:
-                            rmeta = json.loads(ctx.room.metadata)
-                            extracted_sid = rmeta.get('call_sid') or rmeta.get('CallSid')
-                        except:
-                            pass
+                    extracted_sid = call_sid_from(participant, room_metadata, ctx.room.name)
 
                     await agent._save_call_to_database(
                         ctx=ctx,
@@ -2026,7 +2196,8 @@ async def entrypoint(ctx: JobContext):
                         analysis=analysis,
                         start_time=start_time,
                         end_time=end_time,
-                        call_type=call_type  # Pass the detected call type
+                        call_type=call_type,  # Pass the detected call type
+                        job_metadata=job_metadata,
                     )
                 except Exception as save_error:
                     logger.error(f"DIRECT_DB_SAVE_ERROR | error={str(save_error)}", exc_info=True)
@@ -2074,11 +2245,32 @@ async def entrypoint(ctx: JobContext):
         logger.error(f"ENTRYPOINT_ERROR | job_id={ctx.job.id} | error={str(e)}", exc_info=True)
         raise
 
+def prewarm(proc: agents.JobProcess) -> None:
+    """
+    Warm per-process resources before the first job is assigned so the
+    first call does not pay the Silero VAD model load or DNS + TLS setup
+    for Supabase.
+    """
+    logger = logging.getLogger(__name__)
+    try:
+        proc.userdata["vad"] = get_vad()
+        logger.info("PREWARM_VAD_LOADED")
+    except Exception as e:
+        logger.warning(f"PREWARM_VAD_FAILED | error={str(e)}")
+    try:
+        supabase = get_supabase_client()
+        if supabase is not None:
+            supabase.table('agents').select('id').limit(1).execute()
+            logger.info("PREWARM_SUPABASE_CONNECTED")
+    except Exception as e:
+        logger.warning(f"PREWARM_SUPABASE_FAILED | error={str(e)}")
+
 if __name__ == "__main__":
     # Run the agent using WorkerOptions with entrypoint
-    agent_name = os.getenv("LK_AGENT_NAME", "ai")
+    agent_name = CFG.agent_name
     worker_options = WorkerOptions(
         entrypoint_fnc=entrypoint,
+        prewarm_fnc=prewarm,
         agent_name=agent_name,
     )
     cli.run_app(worker_options)
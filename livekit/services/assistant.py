@@ -8,17 +8,11 @@ from typing import Optional, Any
 from livekit.agents import Agent, RunContext, function_tool
 from cal_calendar_api import Calendar, AvailableSlot, SlotUnavailableError
 
+from utils.booking import UTC, build_booking_instructions
 
-class Assistant(Agent):
-    def __init__(self, instructions: str, calendar: Calendar | None = None) -> None:
-        # Enhanced instructions for step-by-step booking
-        # Add current date context to instructions
-        current_date = datetime.datetime.now().strftime("%Y-%m-%d")
-        current_year = datetime.datetime.now().year
-        
-        enhanced_instructions = instructions
-        if calendar:
-            enhanced_instructions += f"""
+
+# Date context + step-by-step booking rules appended when a calendar is configured
+BOOKING_INSTRUCTIONS_TEMPLATE = """
 
 CURRENT DATE CONTEXT:
 Today's date is {current_date} (year {current_year}). Always use the current year {current_year} when discussing dates or booking appointments.
@@ -37,6 +31,24 @@ When a user explicitly expresses interest in booking an appointment (says things
 8. confirm_details - Confirm and book the appointment
 
 IMPORTANT: Only start the booking process when the user explicitly expresses booking intent. Do NOT automatically start booking after the first message. Wait for the user to say they want to book an appointment. Always use the current year {current_year} for any date references."""
+
+
+class Assistant(Agent):
+    # "2", "option 2", "option_2", "Option2" -> 2
+    _OPTION_RE = re.compile(r"^\s*(?:option[_\s]*)?(\d+)\s*$", re.IGNORECASE)
+    # Weekday names/abbreviations -> date.weekday() index for _parse_day
+    _WEEKDAY_IDX = {
+        "mon":0,"monday":0,"tue":1,"tues":1,"tuesday":1,"wed":2,"wednesday":2,
+        "thu":3,"thur":3,"thurs":3,"thursday":3,"fri":4,"friday":4,"sat":5,"saturday":5,"sun":6,"sunday":6
+    }
+
+    def __init__(self, instructions: str, calendar: Calendar | None = None) -> None:
+        # Enhanced instructions for step-by-step booking
+        # Add current date context to instructions
+        if calendar:
+            enhanced_instructions = build_booking_instructions(BOOKING_INSTRUCTIONS_TEMPLATE, instructions, datetime.date.today())
+        else:
+            enhanced_instructions = instructions
         
         super().__init__(instructions=enhanced_instructions)
         self.calendar = calendar
@@ -45,7 +57,9 @@ IMPORTANT: Only start the booking process when the user explicitly expresses boo
         self._booking_intent: bool = False
         self._notes: str = ""
         self._preferred_day: Optional[datetime.date] = None
-        self._slots_map: dict[str, AvailableSlot] = {}
+        # Offered slots in presentation order (option N -> index N-1), plus by unique_hash
+        self._slots_by_index: list[AvailableSlot] = []
+        self._slots_by_hash: dict[str, AvailableSlot] = {}
         self._selected_slot: Optional[AvailableSlot] = None
 
         self._name: Optional[str] = None
@@ -64,8 +78,7 @@ IMPORTANT: Only start the booking process when the user explicitly expresses boo
 
     # ---------- Helpers ----------
     def _tz(self):
-        from zoneinfo import ZoneInfo
-        return getattr(self.calendar, "tz", None) or ZoneInfo("UTC")
+        return getattr(self.calendar, "tz", None) or UTC
 
     def _turn_gate(self, ctx: RunContext) -> Optional[str]:
         sid = getattr(ctx, "speech_id", None) or getattr(ctx, "speechId", None)
@@ -122,12 +135,9 @@ IMPORTANT: Only start the booking process when the user explicitly expresses boo
         if q in {"tomorrow", "tmrw", "tomorow", "tommorow"}:
             return today + datetime.timedelta(days=1)
 
-        wk = {
-            "mon":0,"monday":0,"tue":1,"tues":1,"tuesday":1,"wed":2,"wednesday":2,
-            "thu":3,"thur":3,"thurs":3,"thursday":3,"fri":4,"friday":4,"sat":5,"saturday":5,"sun":6,"sunday":6
-        }
-        if q in wk:
-            delta = (wk[q] - today.weekday()) % 7
+        weekday = self._WEEKDAY_IDX.get(q)
+        if weekday is not None:
+            delta = (weekday - today.weekday()) % 7
             return today + datetime.timedelta(days=delta)
 
         # EN short "9/8" or "8-9"
@@ -198,6 +208,18 @@ IMPORTANT: Only start the booking process when the user explicitly expresses boo
         except Exception:
             return d, False
 
+    def _remember_slots(self, slots: list[AvailableSlot]) -> None:
+        self._slots_by_index = slots
+        self._slots_by_hash = {s.unique_hash: s for s in slots}
+
+    def _lookup_slot(self, option_id: Optional[str]) -> Optional[AvailableSlot]:
+        key = (option_id or "").strip()
+        m = self._OPTION_RE.match(key)
+        if m:
+            idx = int(m.group(1)) - 1
+            return self._slots_by_index[idx] if 0 <= idx < len(self._slots_by_index) else None
+        return self._slots_by_hash.get(key)
+
     def _extract_booking_ref(self, result: Any) -> tuple[Optional[str], Optional[str]]:
         if result is None:
             return None, None
@@ -215,7 +237,8 @@ IMPORTANT: Only start the booking process when the user explicitly expresses boo
         self._booking_intent = False
         self._notes = ""
         self._preferred_day = None
-        self._slots_map = {}
+        self._slots_by_index = []
+        self._slots_by_hash = {}
         self._selected_slot = None
         self._name = None
         self._email = None
@@ -280,16 +303,15 @@ IMPORTANT: Only start the booking process when the user explicitly expresses boo
         tz = self._tz()
         start_local = datetime.datetime.combine(d, datetime.time(0,0,tzinfo=tz))
         end_local = start_local + datetime.timedelta(days=1)
-        from zoneinfo import ZoneInfo
-        start_utc = start_local.astimezone(ZoneInfo("UTC"))
-        end_utc = end_local.astimezone(ZoneInfo("UTC"))
+        start_utc = start_local.astimezone(UTC)
+        end_utc = end_local.astimezone(UTC)
 
         try:
             slots = await self.calendar.list_available_slots(start_time=start_utc, end_time=end_utc)
 
             def present(slots_list: list[AvailableSlot], label: str) -> str:
-                self._slots_map.clear()
                 top = slots_list[:max_options]
+                self._remember_slots(top)
                 if not top:
                     return f"I don't see any open times {label}."
                 lines = []
@@ -299,10 +321,6 @@ IMPORTANT: Only start the booking process when the user explicitly expresses boo
                 for i, s in enumerate(top, 1):
                     local = s.start_time.astimezone(tz)
                     lines.append(f"Option {i}: {local.strftime('%a %b %d, %I:%M %p')}")
-                    self._slots_map[str(i)] = s
-                    self._slots_map[f"option {i}"] = s
-                    self._slots_map[f"option_{i}"] = s
-                    self._slots_map[getattr(s, "unique_hash", local.isoformat())] = s
                 lines.append("Which option would you like to choose?")
                 return "\n".join(lines)
 
@@ -336,22 +354,19 @@ IMPORTANT: Only start the booking process when the user explicitly expresses boo
         if not self.calendar:
             return "I can't take bookings right now."
         tz = self._tz()
-        from zoneinfo import ZoneInfo
         now = datetime.datetime.now(tz)
-        start_utc = now.astimezone(ZoneInfo("UTC"))
-        end_utc = (now + datetime.timedelta(days=max(1, int(range_days)))).astimezone(ZoneInfo("UTC"))
+        start_utc = now.astimezone(UTC)
+        end_utc = (now + datetime.timedelta(days=max(1, int(range_days)))).astimezone(UTC)
         try:
             slots = await self.calendar.list_available_slots(start_time=start_utc, end_time=end_utc)
-            self._slots_map.clear()
-            if not slots:
+            top = slots[:6] if slots else []
+            self._remember_slots(top)
+            if not top:
                 return "I don't see anything in the next few days. Try a specific day like 'Monday' or '2025-09-08'."
             lines = ["Here are the next available times:"]
-            for i, s in enumerate(slots[:6], 1):
+            for i, s in enumerate(top, 1):
                 local = s.start_time.astimezone(tz)
                 lines.append(f"Option {i}: {local.strftime('%a %b %d, %I:%M %p')}")
-                self._slots_map[str(i)] = s
-                self._slots_map[f"option {i}"] = s
-                self._slots_map[f"option_{i}"] = s
                 self._preferred_day = local.date()
             lines.append("Which option would you like to choose?")
             return "\n".join(lines)
@@ -364,13 +379,9 @@ IMPORTANT: Only start the booking process when the user explicitly expresses boo
     async def choose_slot(self, ctx: RunContext, option_id: str) -> str:
         gate = self._turn_gate(ctx)
         if gate: return gate
-        if not self._booking_intent or not self._slots_map:
+        if not self._booking_intent or not self._slots_by_index:
             return "Let's pick a day or list upcoming options first."
-        key = (option_id or "").strip().lower()
-        slot = (self._slots_map.get(key)
-                or self._slots_map.get(f"option {key}")
-                or self._slots_map.get(f"option_{key}")
-                or (self._slots_map.get(key.replace("option", "").strip()) if key.startswith("option") else None))
+        slot = self._lookup_slot(option_id)
         if not slot:
             return "I couldn't find that option. Please say the option number again."
         self._selected_slot = slot
@@ -383,8 +394,8 @@ IMPORTANT: Only start the booking process when the user explicitly expresses boo
         if gate: return gate
         if not self._selected_slot:
             # tiny mercy: if exactly one slot exists and user proceeds, auto-pick it
-            if len(self._slots_map) == 1:
-                self._selected_slot = next(iter(self._slots_map.values()))
+            if len(self._slots_by_index) == 1:
+                self._selected_slot = self._slots_by_index[0]
             else:
                 return "Please choose a time option first."
         if self._looks_like_prompt(name) or len((name or "").strip()) < 2:
@@ -461,13 +472,9 @@ IMPORTANT: Only start the booking process when the user explicitly expresses boo
             return "I can't take bookings right now."
 
         # Map slot id like "option1" → selected slot
-        key = (slot_id or "").strip().lower()
-        slot = (self._slots_map.get(key)
-                or self._slots_map.get(f"option {key}")
-                or self._slots_map.get(f"option_{key}")
-                or (self._slots_map.get(key.replace("option", "").strip()) if key.startswith("option") else None))
-        if not slot and len(self._slots_map) == 1:
-            slot = next(iter(self._slots_map.values()))
+        slot = self._lookup_slot(slot_id)
+        if not slot and len(self._slots_by_index) == 1:
+            slot = self._slots_by_index[0]
         if not slot:
             return "Let's pick a time option first."
 
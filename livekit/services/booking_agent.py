@@ -14,19 +14,11 @@ from typing import Optional
 from livekit.agents import Agent, RunContext, function_tool
 from cal_calendar_api import Calendar, AvailableSlot, SlotUnavailableError, CalendarResult, CalendarError
 
+from utils.booking import UTC, build_booking_instructions
 
-class BookingAgent(Agent):
-    """LiveKit Agent for handling booking appointments."""
-    
-    def __init__(self, instructions: str, calendar: Calendar | None = None, first_message: Optional[str] = None) -> None:
-        # Enhanced instructions for step-by-step booking
-        # Add current date context to instructions
-        current_date = datetime.datetime.now().strftime("%Y-%m-%d")
-        current_year = datetime.datetime.now().year
-        
-        enhanced_instructions = instructions
-        if calendar:
-            enhanced_instructions += f"""
+
+# Date context + step-by-step booking rules appended when a calendar is configured
+BOOKING_INSTRUCTIONS_TEMPLATE = """
 
 CURRENT DATE CONTEXT:
 Today's date is {current_date} (year {current_year}). Always use the current year {current_year} when discussing dates or booking appointments.
@@ -50,6 +42,28 @@ IMPORTANT:
 - Always use the current year {current_year} for any date references
 - Ask for information ONE AT A TIME, not all at once
 - Wait for the user to respond before asking for the next piece of information"""
+
+
+class BookingAgent(Agent):
+    """LiveKit Agent for handling booking appointments."""
+
+    # "2", "option 2", "option_2", "Option2" -> "2"
+    _OPTION_RE = re.compile(r"^\s*(?:option[_\s]*)?(\d+)\s*$", re.IGNORECASE)
+    # Weekday names/abbreviations -> date.weekday() index for _parse_day
+    _WEEKDAY_IDX = {
+        "mon":0,"monday":0,"tue":1,"tues":1,"tuesday":1,"wed":2,"wednesday":2,
+        "thu":3,"thur":3,"thurs":3,"thursday":3,"fri":4,"friday":4,"sat":5,"saturday":5,"sun":6,"sunday":6
+    }
+    # Spoken times for choose_slot: "3pm", "3:00", "15:00"
+    _SLOT_TIME_RE = re.compile(r"(\d{1,2})(?::(\d{2}))?\s*(am|pm)?", re.IGNORECASE)
+    
+    def __init__(self, instructions: str, calendar: Calendar | None = None, first_message: Optional[str] = None) -> None:
+        # Enhanced instructions for step-by-step booking
+        # Add current date context to instructions
+        if calendar:
+            enhanced_instructions = build_booking_instructions(BOOKING_INSTRUCTIONS_TEMPLATE, instructions, datetime.date.today())
+        else:
+            enhanced_instructions = instructions
         
         super().__init__(instructions=enhanced_instructions)
         self.calendar = calendar
@@ -86,8 +100,7 @@ IMPORTANT:
 
     # ---------- Helper methods ----------
     def _tz(self):
-        from zoneinfo import ZoneInfo
-        return self.calendar.tz if self.calendar else ZoneInfo("UTC")
+        return self.calendar.tz if self.calendar else UTC
 
     def _parse_day(self, day_query: str) -> Optional[datetime.date]:
         if not day_query:
@@ -99,12 +112,9 @@ IMPORTANT:
             return today
         if q in {"tomorrow", "tmrw", "tomorow", "tommorow"}:
             return today + datetime.timedelta(days=1)
-        wk = {
-            "mon":0,"monday":0,"tue":1,"tues":1,"tuesday":1,"wed":2,"wednesday":2,
-            "thu":3,"thur":3,"thurs":3,"thursday":3,"fri":4,"friday":4,"sat":5,"saturday":5,"sun":6,"sunday":6
-        }
-        if q in wk:
-            delta = (wk[q] - today.weekday()) % 7
+        weekday = self._WEEKDAY_IDX.get(q)
+        if weekday is not None:
+            delta = (weekday - today.weekday()) % 7
             return today + datetime.timedelta(days=delta)
         try:
             parsed_date = datetime.date.fromisoformat(q)  # YYYY-MM-DD
@@ -253,6 +263,31 @@ IMPORTANT:
         logging.info(f"PHONE_COLLECTED | phone={self._phone}")
         return f"Excellent! I have your phone as {self._phone}. What date would you like for your appointment?"
 
+    async def _day_slots(self, day: datetime.date) -> CalendarResult:
+        """Fetch the calendar's slots for one local day."""
+        tz = self._tz()
+        start_local = datetime.datetime.combine(day, datetime.time(0,0,tzinfo=tz))
+        end_local = start_local + datetime.timedelta(days=1)
+        start_utc = start_local.astimezone(UTC)
+        end_utc = end_local.astimezone(UTC)
+
+        logging.info(f"CALENDAR_SLOTS_REQUEST | date={day} | start_utc={start_utc} | end_utc={end_utc}")
+        result = await self.calendar.list_available_slots(start_time=start_utc, end_time=end_utc)
+        logging.info(f"CALENDAR_SLOTS_RESPONSE | slots_count={len(result.slots) if result.is_success else 0}")
+        return result
+
+    def _present_slots(self, slots: list[AvailableSlot]) -> str:
+        """Number up to six slots as options for choose_slot and return them one per line."""
+        tz = self._tz()
+        self._slots_map.clear()
+        available_times = []
+        for i, slot in enumerate(slots[:6], 1):  # Show up to 6 options
+            slot_local = slot.start_time.astimezone(tz)
+            available_times.append(f"Option {i}: {slot_local.strftime('%I:%M %p')}")
+            self._slots_map[str(i)] = slot
+            self._slots_map[f"option {i}"] = slot
+        return "\n".join(available_times)
+
     @function_tool(name="provide_date")
     async def provide_date(self, ctx: RunContext, date: str) -> str:
         """Set the preferred date for the appointment."""
@@ -273,30 +308,13 @@ IMPORTANT:
         
         try:
             # Check availability for the day
-            tz = self._tz()
-            start_local = datetime.datetime.combine(parsed_date, datetime.time(0,0,tzinfo=tz))
-            end_local = start_local + datetime.timedelta(days=1)
-            from zoneinfo import ZoneInfo
-            start_utc = start_local.astimezone(ZoneInfo("UTC"))
-            end_utc = end_local.astimezone(ZoneInfo("UTC"))
-
-            logging.info(f"CALENDAR_SLOTS_REQUEST | date={parsed_date} | start_utc={start_utc} | end_utc={end_utc}")
-            result = await self.calendar.list_available_slots(start_time=start_utc, end_time=end_utc)
-            logging.info(f"CALENDAR_SLOTS_RESPONSE | slots_count={len(result.slots) if result.is_success else 0}")
+            result = await self._day_slots(parsed_date)
 
             if not result.is_success or not result.slots:
                 return f"I don't see any available times on {parsed_date.strftime('%A, %B %d')}. Would you like to try a different date?"
 
             # Show available slots
-            self._slots_map.clear()
-            available_times = []
-            for i, slot in enumerate(result.slots[:6], 1):  # Show up to 6 options
-                slot_local = slot.start_time.astimezone(tz)
-                available_times.append(f"Option {i}: {slot_local.strftime('%I:%M %p')}")
-                self._slots_map[str(i)] = slot
-                self._slots_map[f"option {i}"] = slot
-            
-            times_list = "\n".join(available_times)
+            times_list = self._present_slots(result.slots)
             logging.info(f"SLOTS_LISTED | date={parsed_date.strftime('%A, %B %d')} | slots_count={len(result.slots)}")
             return f"Great! Here are the available times on {parsed_date.strftime('%A, %B %d')}:\n{times_list}\nWhich option would you like to choose?"
                 
@@ -365,15 +383,7 @@ IMPORTANT:
         
         try:
             # Check availability for the day
-            start_local = datetime.datetime.combine(parsed_date, datetime.time(0,0,tzinfo=tz))
-            end_local = start_local + datetime.timedelta(days=1)
-            from zoneinfo import ZoneInfo
-            start_utc = start_local.astimezone(ZoneInfo("UTC"))
-            end_utc = end_local.astimezone(ZoneInfo("UTC"))
-
-            logging.info(f"CALENDAR_SLOTS_REQUEST | day={parsed_date} | start_utc={start_utc} | end_utc={end_utc}")
-            result = await self.calendar.list_available_slots(start_time=start_utc, end_time=end_utc)
-            logging.info(f"CALENDAR_SLOTS_RESPONSE | slots_count={len(result.slots) if result.is_success else 0}")
+            result = await self._day_slots(parsed_date)
 
             if not result.is_success or not result.slots:
                 return f"I don't see any available times on {parsed_date.strftime('%A, %B %d')}. Would you like to try a different date?"
@@ -401,15 +411,7 @@ IMPORTANT:
                 return f"Perfect! I found a slot close to your requested time. Please confirm: {formatted_time}. Name: {self._name}. Email: {self._email}. Phone: {self._phone}. Reason: {self._notes or 'General appointment'}. Is everything correct?"
             else:
                 # Show available times and let them choose
-                self._slots_map.clear()
-                available_times = []
-                for i, slot in enumerate(result.slots[:6], 1):  # Show up to 6 options
-                    slot_local = slot.start_time.astimezone(tz)
-                    available_times.append(f"Option {i}: {slot_local.strftime('%I:%M %p')}")
-                    self._slots_map[str(i)] = slot
-                    self._slots_map[f"option {i}"] = slot
-                
-                times_list = "\n".join(available_times)
+                times_list = self._present_slots(result.slots)
                 return f"I don't have {appointment_time.strftime('%I:%M %p')} available on {parsed_date.strftime('%A, %B %d')}. Here are the available times:\n{times_list}\nWhich option would you like to choose?"
                 
         except Exception as e:
@@ -427,7 +429,7 @@ IMPORTANT:
         # Handle time-based selection (e.g., "3pm", "3:00", "15:00")
         if not key.isdigit() and not key.startswith("option"):
             # Try to parse as time
-            time_match = re.search(r'(\d{1,2})(?::(\d{2}))?\s*(am|pm)?', key, re.IGNORECASE)
+            time_match = self._SLOT_TIME_RE.search(key)
             if time_match:
                 hour = int(time_match.group(1))
                 minute = int(time_match.group(2) or 0)
@@ -449,10 +451,9 @@ IMPORTANT:
                         break
         
         if not self._selected_slot:
-            slot = self._slots_map.get(key) \
-                or self._slots_map.get(f"option {key}") \
-                or self._slots_map.get(f"option_{key}") \
-                or (self._slots_map.get(key.replace("option","").strip()) if key.startswith("option") else None)
+            # Option numbers resolve to the "N" key set by the slot listing
+            option_match = self._OPTION_RE.match(key)
+            slot = self._slots_map.get(option_match.group(1)) if option_match else self._slots_map.get(key)
             if not slot:
                 return "I couldn't find that option. Please say the option number again."
             self._selected_slot = slot
@@ -11,6 +11,8 @@ import time
 from typing import Optional, Dict, List, Any, Tuple
 from dataclasses import dataclass
 
+from utils.json_utils import json_loads
+
 try:
     from openai import AsyncOpenAI
 except ImportError:
@@ -18,6 +20,51 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Heuristic outcome rules for get_fallback_outcome, in priority order
+FALLBACK_OUTCOME_RULES: Tuple[Tuple[Tuple[str, ...], str], ...] = (
+    # Actual booking success indicators
+    ((
+        "appointment has been successfully booked",
+        "appointment scheduled successfully",
+        "successfully booked",
+        "appointment confirmed",
+        "booking confirmed",
+        "appointment is booked",
+        "your appointment is scheduled",
+    ), "Booked Appointment"),
+    # Booking failure indicators
+    ((
+        "booking failed",
+        "couldn't book",
+        "unable to book",
+        "booking error",
+        "appointment not booked",
+        "booking unsuccessful",
+    ), "Not Qualified"),
+    # Booking attempts without a clear success: interest shown but not booked
+    ((
+        "book an appointment",
+        "schedule an appointment",
+        "make an appointment",
+        "want to book",
+        "book the appointment",
+    ), "Qualified"),
+    (("spam", "unwanted", "robocall"), "Spam"),
+    (("not qualified", "not eligible", "outside service"), "Not Qualified"),
+    (("message", "franchise", "escalate"), "Escalated"),
+    (("thank you", "goodbye"), "Qualified"),
+)
+
+# A CallOutcomeService is built for every call; sharing the client per API key
+# keeps one connection pool per worker instead of one per call
+_clients: Dict[str, Any] = {}
+
+def _get_client(api_key: str):
+    client = _clients.get(api_key)
+    if client is None:
+        client = _clients[api_key] = AsyncOpenAI(api_key=api_key)
+    return client
+
 @dataclass
 class CallOutcomeAnalysis:
     """Result of call outcome analysis"""
@@ -37,7 +84,7 @@ class CallOutcomeService:
         api_key = os.getenv("OPENAI_API_KEY")
         if AsyncOpenAI and api_key:
             try:
-                self.client = AsyncOpenAI(api_key=api_key)
+                self.client = _get_client(api_key)
                 logger.info("OPENAI_CLIENT_INITIALIZED | Call outcome analysis enabled")
             except Exception as e:
                 logger.error(f"OPENAI_CLIENT_INIT_FAILED | error={str(e)}")
@@ -240,7 +287,7 @@ Respond with ONLY the JSON object, no additional text.
                 cleaned_response = cleaned_response[:-3]
             
             # Parse JSON
-            data = json.loads(cleaned_response)
+            data = json_loads(cleaned_response)
             
             return CallOutcomeAnalysis(
                 outcome=data.get('outcome', 'Qualified'),
@@ -273,69 +320,26 @@ Respond with ONLY the JSON object, no additional text.
         if call_duration < 10:
             return "Call Dropped"
         
-        # Extract content for analysis
-        all_content = ""
+        # Single streaming pass over the turns: keep the highest-priority rule
+        # matched so far and stop as soon as a booking success is seen
+        best = len(FALLBACK_OUTCOME_RULES)
         for turn in transcription:
             content = turn.get('content', '')
             if isinstance(content, list):
                 content = ' '.join(str(item) for item in content if item)
             elif not isinstance(content, str):
                 content = str(content)
-            all_content += content.lower() + " "
-        
-        # Simple keyword matching with more sophisticated logic
-        all_content_lower = all_content.lower()
+            text = content.lower()
+            for index in range(best):
+                if any(keyword in text for keyword in FALLBACK_OUTCOME_RULES[index][0]):
+                    best = index
+                    break
+            if best == 0:
+                break
         
-        # Check for actual booking success indicators
-        booking_success_keywords = [
-            "appointment has been successfully booked",
-            "appointment scheduled successfully", 
-            "successfully booked",
-            "appointment confirmed",
-            "booking confirmed",
-            "appointment is booked",
-            "your appointment is scheduled",
-            "perfect! your appointment has been successfully booked",
-            "appointment scheduled successfully"
-        ]
-        
-        booking_attempt_keywords = [
-            "book an appointment",
-            "schedule an appointment", 
-            "make an appointment",
-            "want to book",
-            "book the appointment"
-        ]
-        
-        booking_failure_keywords = [
-            "booking failed",
-            "couldn't book",
-            "unable to book",
-            "booking error",
-            "appointment not booked",
-            "booking unsuccessful"
-        ]
-        
-        # Check for actual success first
-        if any(keyword in all_content_lower for keyword in booking_success_keywords):
-            return "Booked Appointment"
-        # Check for failure indicators
-        elif any(keyword in all_content_lower for keyword in booking_failure_keywords):
-            return "Not Qualified"
-        # Check for booking attempts but no clear success
-        elif any(keyword in all_content_lower for keyword in booking_attempt_keywords):
-            # If they tried to book but we don't see success, it's likely not booked
-            return "Qualified"  # They showed interest but booking didn't complete
-        elif any(keyword in all_content_lower for keyword in ["spam", "unwanted", "robocall"]):
-            return "Spam"
-        elif any(keyword in all_content_lower for keyword in ["not qualified", "not eligible", "outside service"]):
-            return "Not Qualified"
-        elif any(keyword in all_content_lower for keyword in ["message", "franchise", "escalate"]):
-            return "Escalated"
-        elif any(keyword in all_content_lower for keyword in ["thank you", "goodbye"]):
-            return "Qualified"
-        else:
-            return "Qualified" if call_duration > 30 else "Call Dropped"
+        if best < len(FALLBACK_OUTCOME_RULES):
+            return FALLBACK_OUTCOME_RULES[best][1]
+        return "Qualified" if call_duration > 30 else "Call Dropped"
 
     async def evaluate_call_success(self, transcription: List[Dict[str, Any]], prompt: str = None) -> bool:
         """
@@ -5,12 +5,15 @@ RAG Assistant service using official LiveKit Agent patterns with booking capabil
 import logging
 import asyncio
 import datetime
+import re
+from collections import OrderedDict
 from typing import Optional, Dict, Any, List
 from livekit.agents import Agent, AgentSession, JobContext, AutoSubscribe, RoomInputOptions, RoomOutputOptions
 from livekit.agents.llm import function_tool, ChatContext, ChatMessage, ChatRole
 from livekit.agents.voice import RunContext
 from livekit.plugins import openai, silero
 
+from utils.booking import UTC, build_booking_instructions
 from utils.logging_config import get_logger
 from utils.latency_logger import (
     measure_latency, measure_latency_context, 
@@ -19,36 +22,12 @@ from utils.latency_logger import (
 )
 
 
-class RAGAssistant(Agent):
-    """RAG-enabled assistant using official LiveKit Agent patterns with booking capabilities."""
-    
-    def __init__(
-        self, 
-        instructions: str = "You are a helpful assistant.",
-        calendar: Optional[Any] = None,
-        knowledge_base_id: Optional[str] = None,
-        company_id: Optional[str] = None,
-        supabase: Optional[Any] = None,
-        first_message: Optional[str] = None,
-        assistant_id: Optional[str] = None,
-        user_id: Optional[str] = None
-    ):
-        # Store IDs for call history
-        self.assistant_id = assistant_id
-        self.user_id = user_id
-        
-        # Enhanced instructions for step-by-step booking
-        # Add current date context to instructions
-        current_date = datetime.datetime.now().strftime("%Y-%m-%d")
-        current_year = datetime.datetime.now().year
-        
-        enhanced_instructions = instructions
-        
-        # Knowledge base usage will be specified in the agent's prompt
-        # No additional instructions needed here - the prompt will contain the specific rules
-        
-        if calendar:
-            enhanced_instructions += f"""
+# Knowledge-base answers remembered per call (LRU), so a repeated question skips the RAG round-trip
+KB_CACHE_MAX = 128
+
+
+# Date context + step-by-step booking rules appended when a calendar is configured
+BOOKING_INSTRUCTIONS_TEMPLATE = """
 
 CURRENT DATE CONTEXT:
 Today's date is {current_date} (year {current_year}). Always use the current year {current_year} when discussing dates or booking appointments.
@@ -74,12 +53,67 @@ IMPORTANT:
 - Use the step-by-step functions to collect information gradually
 - Do NOT try to collect all information at once
 - Knowledge base usage rules will be specified in the agent's prompt"""
+
+
+DEFAULT_INSTRUCTIONS = "You are a helpful assistant."
+
+
+def rag_assistant_kwargs(assistant_config: Dict[str, Any]) -> Dict[str, Any]:
+    """Map an agent row to RAGAssistant keyword arguments, shared by the call handlers."""
+    get = assistant_config.get
+    return {
+        "instructions": get("prompt", DEFAULT_INSTRUCTIONS),
+        "knowledge_base_id": get("knowledge_base_id"),
+        "company_id": get("company_id"),
+        "first_message": get("first_message"),
+        "assistant_id": get("id"),
+        "user_id": get("user_id"),
+    }
+
+
+class RAGAssistant(Agent):
+    """RAG-enabled assistant using official LiveKit Agent patterns with booking capabilities."""
+
+    # "2", "option 2", "option_2", "Option2" -> "2"
+    _OPTION_RE = re.compile(r"^\s*(?:option[_\s]*)?(\d+)\s*$", re.IGNORECASE)
+    # Weekday names/abbreviations -> date.weekday() index for _parse_day
+    _WEEKDAY_IDX = {
+        "mon":0,"monday":0,"tue":1,"tues":1,"tuesday":1,"wed":2,"wednesday":2,
+        "thu":3,"thur":3,"thurs":3,"thursday":3,"fri":4,"friday":4,"sat":5,"saturday":5,"sun":6,"sunday":6
+    }
+    # Spoken times for choose_slot: "3pm", "3:00", "15:00"
+    _SLOT_TIME_RE = re.compile(r"(\d{1,2})(?::(\d{2}))?\s*(am|pm)?", re.IGNORECASE)
+    
+    def __init__(
+        self, 
+        instructions: str = "You are a helpful assistant.",
+        calendar: Optional[Any] = None,
+        knowledge_base_id: Optional[str] = None,
+        company_id: Optional[str] = None,
+        supabase: Optional[Any] = None,
+        first_message: Optional[str] = None,
+        assistant_id: Optional[str] = None,
+        user_id: Optional[str] = None
+    ):
+        # Store IDs for call history
+        self.assistant_id = assistant_id
+        self.user_id = user_id
+        
+        # Enhanced instructions for step-by-step booking
+        # Knowledge base usage will be specified in the agent's prompt
+        # No additional instructions needed here - the prompt will contain the specific rules
+        if calendar:
+            enhanced_instructions = build_booking_instructions(BOOKING_INSTRUCTIONS_TEMPLATE, instructions, datetime.date.today())
+        else:
+            enhanced_instructions = instructions
         
         super().__init__(instructions=enhanced_instructions)
         
         self.logger = get_logger(__name__)
         self.calendar = calendar
         self.knowledge_base_id = knowledge_base_id
+        # Knowledge-base context already fetched this call, least recently used first
+        self._kb_cache: "OrderedDict[str, str]" = OrderedDict()
         self.company_id = company_id
         self.supabase = supabase
         self.first_message = first_message
@@ -161,15 +195,25 @@ IMPORTANT:
             self.logger.info(f"QUERYING_KNOWLEDGE_BASE | query={query}")
             
             # Use the optimized RAG service with timeout
-            from services.rag_service import rag_service
-            
-            # Use parallel processing with timeout for faster response
-            rag_task = asyncio.create_task(
-                rag_service.get_enhanced_context(self.knowledge_base_id, query, timeout=8.0)
-            )
+            from services.rag_service import rag_service, normalize_query
             
+            key = normalize_query(query)
             try:
-                context_info = await asyncio.wait_for(rag_task, timeout=8.0)
+                if key in self._kb_cache:
+                    self._kb_cache.move_to_end(key)
+                    context_info = self._kb_cache[key]
+                    self.logger.info(f"KNOWLEDGE_BASE_CACHE_HIT | query={query}")
+                else:
+                    # Use parallel processing with timeout for faster response
+                    rag_task = asyncio.create_task(
+                        rag_service.get_enhanced_context(self.knowledge_base_id, query, timeout=8.0)
+                    )
+                    context_info = await asyncio.wait_for(rag_task, timeout=8.0)
+                    # get_enhanced_context returns None on RAG timeouts/errors; only keep real answers
+                    if context_info:
+                        self._kb_cache[key] = context_info
+                        if len(self._kb_cache) > KB_CACHE_MAX:
+                            self._kb_cache.popitem(last=False)
                 
                 if context_info:
                     self.logger.info(f"KNOWLEDGE_BASE_RESULTS | found context for query: '{query[:50]}...'")
@@ -253,12 +297,11 @@ IMPORTANT:
             return "Please say the day like 'today', 'tomorrow', 'Friday', or '2025-09-05'."
 
         self._booking_data['preferred_day'] = d
-        from zoneinfo import ZoneInfo
-        tz = self.calendar.tz if self.calendar else ZoneInfo("UTC")
+        tz = self.calendar.tz if self.calendar else UTC
         start_local = datetime.datetime.combine(d, datetime.time(0,0,tzinfo=tz))
         end_local = start_local + datetime.timedelta(days=1)
-        start_utc = start_local.astimezone(ZoneInfo("UTC"))
-        end_utc = end_local.astimezone(ZoneInfo("UTC"))
+        start_utc = start_local.astimezone(UTC)
+        end_utc = end_local.astimezone(UTC)
 
         try:
             self.logger.info(f"CHECKING_CALENDAR_AVAILABILITY | date={d} | duration=60")
@@ -346,8 +389,7 @@ IMPORTANT:
         # Handle time-based selection (e.g., "3pm", "3:00", "15:00")
         if not key.isdigit() and not key.startswith("option"):
             # Try to parse as time
-            import re
-            time_match = re.search(r'(\d{1,2})(?::(\d{2}))?\s*(am|pm)?', key, re.IGNORECASE)
+            time_match = self._SLOT_TIME_RE.search(key)
             if time_match:
                 hour = int(time_match.group(1))
                 minute = int(time_match.group(2) or 0)
@@ -368,10 +410,10 @@ IMPORTANT:
                         self.logger.info("SLOT_SELECTED_BY_TIME | time=%s | slot=%s", key, slot_key)
                         return "Great. What's your full name?"
         
-        slot = (self._booking_data['slots_map'].get(key) or 
-                self._booking_data['slots_map'].get(f"option {key}") or 
-                self._booking_data['slots_map'].get(f"option_{key}") or 
-                (self._booking_data['slots_map'].get(key.replace("option","").strip()) if key.startswith("option") else None))
+        # Option numbers resolve to the "N" key; anything else is tried as a slot hash
+        option_match = self._OPTION_RE.match(key)
+        slots_map = self._booking_data['slots_map']
+        slot = slots_map.get(option_match.group(1)) if option_match else slots_map.get((option_id or "").strip())
         
         if not slot:
             return "I couldn't find that option. Please say the option number again."
@@ -427,8 +469,7 @@ IMPORTANT:
         
         self._booking_data['phone'] = self._format_phone(phone)
         
-        from zoneinfo import ZoneInfo
-        tz = self.calendar.tz if self.calendar else ZoneInfo("UTC")
+        tz = self.calendar.tz if self.calendar else UTC
         local = self._booking_data['selected_slot'].start_time.astimezone(tz)
         day_s = local.strftime('%A, %B %d at %I:%M %p')
         notes_s = self._booking_data.get('notes', '') or "—"
@@ -501,8 +542,7 @@ IMPORTANT:
             self.logger.info("BOOKING_SUCCESS | appointment scheduled successfully")
             
             # Format confirmation message with details
-            from zoneinfo import ZoneInfo
-            tz = self.calendar.tz if self.calendar else ZoneInfo("UTC")
+            tz = self.calendar.tz if self.calendar else UTC
             local_time = self._booking_data['selected_slot'].start_time.astimezone(tz)
             formatted_time = local_time.strftime('%A, %B %d at %I:%M %p')
             
@@ -557,19 +597,15 @@ IMPORTANT:
         if not day_query:
             return None
         q = day_query.strip().lower()
-        from zoneinfo import ZoneInfo
-        tz = self.calendar.tz if self.calendar else ZoneInfo("UTC")
+        tz = self.calendar.tz if self.calendar else UTC
         today = datetime.datetime.now(tz).date()
         if q in {"today"}:
             return today
         if q in {"tomorrow", "tmrw", "tomorow", "tommorow"}:
             return today + datetime.timedelta(days=1)
-        wk = {
-            "mon":0,"monday":0,"tue":1,"tues":1,"tuesday":1,"wed":2,"wednesday":2,
-            "thu":3,"thur":3,"thurs":3,"thursday":3,"fri":4,"friday":4,"sat":5,"saturday":5,"sun":6,"sunday":6
-        }
-        if q in wk:
-            delta = (wk[q] - today.weekday()) % 7
+        weekday = self._WEEKDAY_IDX.get(q)
+        if weekday is not None:
+            delta = (weekday - today.weekday()) % 7
             return today + datetime.timedelta(days=delta)
         try:
             parsed_date = datetime.date.fromisoformat(q)  # YYYY-MM-DD
@@ -21,6 +21,16 @@ try:
 except ImportError:
     Pinecone = None
 
+# Sentence-ending marks dropped from the key, so "hours?" and "hours" share one.
+# Other punctuation is kept: "C++" / "C#" or "$100" / "100%" are different questions.
+_TRAILING_MARKS = "?!. "
+
+
+def normalize_query(query: str) -> str:
+    """Cache key for a knowledge-base query: lowercase, whitespace collapsed, trailing ?!. dropped."""
+    return " ".join(query.lower().split()).rstrip(_TRAILING_MARKS)
+
+
 @dataclass
 class RAGContext:
     """Context retrieved from knowledge base"""
@@ -406,7 +416,9 @@ class RAGService:
         
         try:
             logging.info(f"RAG_SERVICE | Querying Supabase for knowledge base: {knowledge_base_id}")
-            result = self.supabase.table("knowledge_bases").select("*").eq("id", knowledge_base_id).single().execute()
+            result = await asyncio.to_thread(
+                lambda: self.supabase.table("knowledge_bases").select("*").eq("id", knowledge_base_id).single().execute()
+            )
             
             if result.data:
                 logging.info(f"RAG_SERVICE | Knowledge base found: {list(result.data.keys())}")
@@ -0,0 +1,27 @@
+"""
+Tests for the knowledge-base query cache key.
+"""
+
+import pytest
+
+from services.rag_service import normalize_query
+
+
+class TestNormalizeQuery:
+    """normalize_query only folds differences that cannot change the answer."""
+
+    @pytest.mark.parametrize("a, b", [
+        ("What are your hours?", "what are your hours"),
+        ("  What   are your\thours ?! ", "What are your hours."),
+    ])
+    def test_equivalent_queries_share_a_key(self, a, b):
+        assert normalize_query(a) == normalize_query(b)
+
+    @pytest.mark.parametrize("a, b", [
+        ("Do you support C++?", "Do you support C#?"),
+        ("Do you support C++?", "Do you support C?"),
+        ("Do you support C#?", "Do you support C?"),
+        ("Is it $100?", "Is it 100%?"),
+    ])
+    def test_distinct_queries_keep_distinct_keys(self, a, b):
+        assert normalize_query(a) != normalize_query(b)
@@ -0,0 +1,20 @@
+"""
+Helpers shared by the booking-capable agents.
+"""
+
+import datetime
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+UTC = ZoneInfo("UTC")
+
+
+@lru_cache(maxsize=512)
+def build_booking_instructions(template: str, instructions: str, today: datetime.date) -> str:
+    """
+    Append an agent's booking template, filled with today's date context, to its prompt.
+    Memoized per (template, prompt, day) since assistants reuse the same prompt across calls.
+    """
+    return instructions + template.format(
+        current_date=today.strftime("%Y-%m-%d"), current_year=today.year
+    )
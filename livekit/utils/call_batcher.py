@@ -0,0 +1,98 @@
+"""
+Batched inserts into the Supabase `calls` table.
+"""
+
+import asyncio
+import logging
+from typing import Optional, Dict, Any
+
+from config.settings import Settings, get_settings
+from utils.supabase_client import Client
+
+
+class CallInsertBatcher:
+    """
+    Coalesce `calls` inserts from sessions sharing this worker process into a
+    single PostgREST request. Each caller still awaits its own inserted row, so
+    the shutdown callback only returns once the row is written.
+    """
+
+    def __init__(self, table: str = 'calls', batch_size: int = 50, max_wait: float = 0.5, max_queue: int = 1024):
+        self.table = table
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.logger = logging.getLogger(__name__)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    async def insert(self, supabase: Client, row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Queue a row for the next batch and wait for its inserted representation."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._worker = loop.create_task(self._run(supabase))
+        future = loop.create_future()
+        await self._queue.put((row, future))
+        return await future
+
+    async def _run(self, supabase: Client) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.batch_size:
+                if not self._queue.empty():
+                    # Drain what is already waiting without arming a timer per row
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._flush(supabase, batch)
+
+    async def _flush(self, supabase: Client, batch: list) -> None:
+        rows = [row for row, _ in batch]
+        try:
+            result = await asyncio.to_thread(
+                lambda: supabase.table(self.table).insert(rows).execute()
+            )
+        except Exception as e:
+            if len(batch) == 1:
+                if not batch[0][1].done():
+                    batch[0][1].set_exception(e)
+                return
+            # One bad row must not fail the others; retry them one by one
+            self.logger.warning(f"CALL_BATCH_INSERT_FAILED | rows={len(batch)} | error={str(e)} | retrying individually")
+            for item in batch:
+                await self._flush(supabase, [item])
+            return
+
+        data = result.data if isinstance(result.data, list) else []
+        self.logger.info(f"CALL_BATCH_INSERTED | rows={len(batch)}")
+        for i, (_, future) in enumerate(batch):
+            if not future.done():
+                future.set_result(data[i] if i < len(data) else None)
+
+
+# One batcher per worker process so inbound and outbound calls share flushes
+_batcher: Optional[CallInsertBatcher] = None
+
+
+def get_call_insert_batcher(settings: Optional[Settings] = None) -> CallInsertBatcher:
+    """Return the process-wide call insert batcher."""
+    global _batcher
+    if _batcher is None:
+        settings = settings or get_settings()
+        _batcher = CallInsertBatcher(
+            batch_size=settings.call_insert_batch_size,
+            max_wait=settings.call_insert_max_wait,
+            max_queue=settings.call_insert_queue_max,
+        )
+    return _batcher
@@ -0,0 +1,18 @@
+"""
+JSON helpers for the LiveKit voice agent.
+Uses orjson when it is installed and falls back to the standard library.
+"""
+
+import json
+
+# json_loads(data) decodes JSON from str/bytes. It is bound straight to the
+# decoder rather than wrapped, so metadata parsing pays no extra Python call.
+try:
+    import orjson  # type: ignore
+
+    json_loads = orjson.loads
+
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+    json_loads = json.loads
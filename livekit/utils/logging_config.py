@@ -2,13 +2,21 @@
 Logging configuration for the LiveKit voice agent.
 """
 
+import atexit
 import logging
+import logging.handlers
+import queue
 import sys
 from typing import Optional
 
 
+# Writes to stdout happen on the listener thread; the event loop only enqueues records
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
 def setup_logging(level: str = "INFO") -> None:
     """Setup logging configuration."""
+    global _listener
     
     # Convert string level to logging constant
     numeric_level = getattr(logging, level.upper(), logging.INFO)
@@ -32,8 +40,14 @@ def setup_logging(level: str = "INFO") -> None:
     console_handler.setLevel(numeric_level)
     console_handler.setFormatter(formatter)
     
+    # Route records through a queue so handler I/O never blocks the event loop
+    _stop_listener()
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, console_handler, respect_handler_level=True)
+    _listener.start()
+    
     # Add handler to root logger
-    root_logger.addHandler(console_handler)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
     
     # Set specific logger levels
     logging.getLogger("livekit").setLevel(logging.INFO)
@@ -46,6 +60,17 @@ def setup_logging(level: str = "INFO") -> None:
     logging.getLogger("urllib3").setLevel(logging.WARNING)
 
 
+def _stop_listener() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(_stop_listener)
+
+
 def get_logger(name: str) -> logging.Logger:
     """Get a logger instance."""
     return logging.getLogger(name)
\ No newline at end of file
@@ -0,0 +1,98 @@
+"""
+Helpers for LiveKit job/room/participant metadata.
+"""
+
+import re
+from typing import Optional, Union, Dict, Any, Mapping, Iterable
+
+from utils.json_utils import json_loads
+
+
+# Keys dispatchers use for the agent id, in lookup order
+AGENT_ID_KEYS = ("agentId", "assistantId", "assistant_id")
+
+# Keys carrying the provider call SID, in lookup order
+CALL_SID_ATTRIBUTE_KEYS = (
+    "sip.twilio.callSid", "sip.twilio.call_sid",
+    "twilio.callSid", "twilio.call_sid",
+    "callSid", "call_sid",
+)
+CALL_SID_METADATA_KEYS = ("call_sid", "CallSid", "provider_id", "twilio_call_sid", "twilioCallSid")
+# Twilio call SID pattern (CA followed by 32 hex characters)
+CALL_SID_RE = re.compile(r"CA[a-fA-F0-9]{32}")
+
+
+_OBJECT_START = ("{", b"{")
+
+
+def parse_metadata(raw: Union[str, bytes, None]) -> Dict[str, Any]:
+    """
+    Parse a job/room/participant metadata payload (str or bytes) into a dict.
+    Payloads that are obviously not a JSON object return {} without raising.
+    """
+    if not raw:
+        return {}
+    # Peek at the first character; only pay for lstrip() when there is leading
+    # whitespace. Both JSON decoders accept it, so raw is parsed as-is.
+    if raw[:1] not in _OBJECT_START and raw.lstrip()[:1] not in _OBJECT_START:
+        return {}
+    try:
+        data = json_loads(raw)
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def metadata_agent_id(meta: Dict[str, Any]) -> Optional[str]:
+    """Return the agent id from parsed metadata (agentId, assistantId, assistant_id or assistant.id)."""
+    for key in AGENT_ID_KEYS:
+        agent_id = meta.get(key)
+        if agent_id:
+            return agent_id
+    assistant = meta.get("assistant")
+    return assistant.get("id") if isinstance(assistant, dict) else None
+
+
+def first_value(meta: Mapping[str, Any], keys: Iterable[str]) -> Any:
+    """Return the first truthy value of meta[key] for key in keys, or None."""
+    for key in keys:
+        value = meta.get(key)
+        if value:
+            return value
+    return None
+
+
+def metadata_dict(raw: Any) -> Dict[str, Any]:
+    """Room/participant metadata as a dict, whether it arrives parsed or as a JSON payload."""
+    return raw if isinstance(raw, dict) else parse_metadata(raw)
+
+
+def attributes_call_sid(attrs: Any) -> Optional[str]:
+    """Return the call SID from participant attributes, or None."""
+    if not attrs:
+        return None
+    # Participant attributes are a flat dict in LiveKit (e.g. 'sip.twilio.callSid');
+    # the nested attribute form is only checked for non-dict objects
+    if isinstance(attrs, dict):
+        return first_value(attrs, CALL_SID_ATTRIBUTE_KEYS)
+    twilio_attrs = getattr(getattr(attrs, "sip", None), "twilio", None)
+    return getattr(twilio_attrs, "callSid", None) or getattr(twilio_attrs, "call_sid", None)
+
+
+def room_name_call_sid(room_name: Optional[str]) -> Optional[str]:
+    """Return a Twilio call SID embedded in the room name, or None."""
+    match = CALL_SID_RE.search(room_name) if room_name else None
+    return match.group(0) if match else None
+
+
+def call_sid_from(participant: Any, room_metadata: Any = None, room_name: Optional[str] = None) -> Optional[str]:
+    """
+    Return the provider call SID, checking SIP participant attributes, room
+    metadata, participant metadata, then the room name. Stops at the first hit.
+    """
+    return (
+        attributes_call_sid(getattr(participant, "attributes", None))
+        or first_value(metadata_dict(room_metadata), CALL_SID_METADATA_KEYS)
+        or first_value(metadata_dict(getattr(participant, "metadata", None)), CALL_SID_METADATA_KEYS)
+        or room_name_call_sid(room_name)
+    )
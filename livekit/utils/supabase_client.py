@@ -0,0 +1,128 @@
+"""
+Process-wide Supabase client shared by the call handlers.
+"""
+
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Optional, Dict, Any, List, Tuple
+
+try:
+    from supabase import create_client, Client, ClientOptions  # type: ignore
+except Exception:  # pragma: no cover
+    create_client = None  # type: ignore
+    Client = object  # type: ignore
+    ClientOptions = None  # type: ignore
+
+from config.settings import Settings, AGENT_CONFIG_COLUMNS, get_settings
+
+logger = logging.getLogger(__name__)
+
+SUPABASE_TIMEOUT = 10
+
+# One client per worker process so every lookup/save reuses the pooled HTTPS connections
+_supabase_client: Optional[Client] = None
+
+
+def get_supabase_client(settings: Optional[Settings] = None) -> Optional[Client]:
+    """Return the process-wide Supabase client, or None if it is not configured."""
+    global _supabase_client
+    if _supabase_client is None:
+        settings = settings or get_settings()
+        url = settings.supabase.url
+        key = settings.supabase.service_role_key
+        if not url or not key or create_client is None:
+            return None
+        _supabase_client = create_client(
+            url,
+            key,
+            options=ClientOptions(postgrest_client_timeout=SUPABASE_TIMEOUT),
+        )
+        logger.info("SUPABASE_CLIENT_CREATED")
+    return _supabase_client
+
+
+# Phone numbers and agent rows change rarely, so bursts of calls to the same
+# DID/agent reuse the last lookup instead of paying a Supabase round-trip each.
+PHONE_AGENT_TTL = 60.0
+AGENT_CONFIG_TTL = 30.0
+RESOLVER_CACHE_MAX = 1024
+_phone_agent_cache: Dict[str, Tuple[float, str]] = {}
+_agent_config_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+# One in-flight lookup per key; concurrent callers wait for it and hit the cache.
+# Each entry is [lock, users] and is dropped once no caller holds or awaits it.
+_resolver_locks: Dict[str, List[Any]] = {}
+
+
+def _cache_get(cache: Dict[str, Tuple[float, Any]], key: str, ttl: float) -> Any:
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    if time.monotonic() - entry[0] >= ttl:
+        cache.pop(key, None)
+        return None
+    return entry[1]
+
+
+def _cache_put(cache: Dict[str, Tuple[float, Any]], key: str, value: Any) -> None:
+    if key not in cache and len(cache) >= RESOLVER_CACHE_MAX:
+        # Dicts keep insertion order, so this evicts the oldest entry
+        cache.pop(next(iter(cache)))
+    cache[key] = (time.monotonic(), value)
+
+
+@contextlib.asynccontextmanager
+async def _resolver_lock(key: str):
+    entry = _resolver_locks.get(key)
+    if entry is None:
+        entry = _resolver_locks[key] = [asyncio.Lock(), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            _resolver_locks.pop(key, None)
+
+
+async def resolve_agent_id_by_phone(supabase: Client, phone: str) -> Optional[str]:
+    """Resolve the inbound assistant for a phone number (cached for PHONE_AGENT_TTL)."""
+    cached = _cache_get(_phone_agent_cache, phone, PHONE_AGENT_TTL)
+    if cached is not None:
+        return cached
+
+    async with _resolver_lock(f"phone:{phone}"):
+        cached = _cache_get(_phone_agent_cache, phone, PHONE_AGENT_TTL)
+        if cached is not None:
+            return cached
+
+        result = await asyncio.to_thread(
+            lambda: supabase.table("phone_number").select("inbound_assistant_id").eq("number", phone).execute()
+        )
+        agent_id = result.data[0].get("inbound_assistant_id") if result.data else None
+        if agent_id:
+            _cache_put(_phone_agent_cache, phone, agent_id)
+        return agent_id
+
+
+async def fetch_agent_config(supabase: Client, agent_id: str) -> Optional[Dict[str, Any]]:
+    """Fetch an agent's configuration row (cached for AGENT_CONFIG_TTL)."""
+    cached = _cache_get(_agent_config_cache, agent_id, AGENT_CONFIG_TTL)
+    if cached is not None:
+        return cached
+
+    async with _resolver_lock(f"agent:{agent_id}"):
+        cached = _cache_get(_agent_config_cache, agent_id, AGENT_CONFIG_TTL)
+        if cached is not None:
+            return cached
+
+        # maybe_single() returns no row instead of raising when the agent does not exist
+        result = await asyncio.to_thread(
+            lambda: supabase.table("agents").select(AGENT_CONFIG_COLUMNS).eq("id", agent_id).maybe_single().execute()
+        )
+        row = result.data if result is not None else None
+        if row:
+            _cache_put(_agent_config_cache, agent_id, row)
+        return row
@@ -0,0 +1,25 @@
+"""
+Helpers for turning session history into call transcripts.
+"""
+
+from typing import Any, Dict, List
+
+
+def content_to_text(content: Any) -> str:
+    """Flatten a chat item's content (str or list of parts) into stripped text."""
+    # Plain strings are by far the common case, so test for them first
+    if isinstance(content, str):
+        return content.strip()
+    if isinstance(content, list):
+        return " ".join(part for part in (str(c).strip() for c in content if c) if part)
+    return str(content).strip()
+
+
+def transcript_from_history(session_history: List[Any]) -> List[Dict[str, str]]:
+    """Role/content pairs from serialized history items; items with no text are skipped."""
+    return [
+        {"role": item["role"], "content": content}
+        for item in session_history
+        if isinstance(item, dict) and "role" in item and "content" in item
+        and (content := content_to_text(item["content"]))
+    ]
@@ -0,0 +1,18 @@
+"""
+Silero VAD shared by every call session in a worker process.
+"""
+
+from functools import lru_cache
+
+from livekit.plugins import silero
+
+
+@lru_cache(maxsize=1)
+def get_vad() -> silero.VAD:
+    """
+    Load the Silero VAD once per worker process and return the same instance
+    afterwards. The worker's prewarm hook calls this so the first call does
+    not pay the model load; force_cpu keeps the plugin on its single-threaded
+    ONNX CPU session even when a GPU provider is installed.
+    """
+    return silero.VAD.load(force_cpu=True)